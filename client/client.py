@@ -1,35 +1,79 @@
 import requests
 import sys
 import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import CONTROLLER_HOST, CONTROLLER_PORT
+from config import (CONTROLLER_URLS, READ_CONSISTENCY, READ_FROM, READ_HEDGE_MIN_MS,
+                    READ_HEDGE_PERCENTILE, READ_LATENCY_WINDOW, READ_LOAD_REFRESH,
+                    READ_MAX_STALENESS, READ_REPAIR, REPLICATION_FACTOR)
+from routing import RingRouter, RING_VERSION_HEADER
 
 class KVStoreClient:
-    def __init__(self):
-        self.controller_url = f"http://{CONTROLLER_HOST}:{CONTROLLER_PORT}"
+    def __init__(self, read_from=None, max_staleness=None):
+        # Routes keys locally; the ring is fetched once and refreshed only
+        # when a worker reports a newer version (from the standby controller
+        # if the primary is down)
+        self.router = RingRouter(CONTROLLER_URLS)
+        # Replica reads run in parallel; their latencies set the hedge delay
+        # (with headroom for reads still waiting on a paused replica)
+        self.pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix='kv-read')
+        self.read_latencies = deque(maxlen=READ_LATENCY_WINDOW)
+        self.hedged_reads = 0
+        self.read_repairs = 0
+        self._stats_lock = threading.Lock()
+        # 'primary' reads go to the primary first; 'replicas' spreads them
+        # over replicas whose lag behind the primary is within max_staleness
+        self.read_from = read_from or READ_FROM
+        self.max_staleness = max_staleness if max_staleness is not None else READ_MAX_STALENESS
+        self.in_flight = {}  # worker url -> reads this client has outstanding
+        self.reads_by_replica = {}  # worker url -> reads it answered
+    
+    def _primary_worker(self, key):
+        """Look up the primary worker URL for a key in the local ring"""
+        urls = self.router.get_replica_urls(key, REPLICATION_FACTOR)
+        return urls[0] if urls else None
+    
+    def _send(self, method, key, **kwargs):
+        """
+        Send a request to the key's primary worker. Retries once with a
+        refreshed ring if the worker says our ring is stale.
+        """
+        for attempt in range(2):
+            primary_worker = self._primary_worker(key)
+            if not primary_worker:
+                return None
+            
+            print(f"→ Primary worker for '{key}': {primary_worker}")
+            
+            headers = {RING_VERSION_HEADER: str(self.router.version)}
+            if method == 'put':
+                response = requests.post(f"{primary_worker}/put", headers=headers, **kwargs)
+            else:
+                response = requests.get(f"{primary_worker}/get", headers=headers, **kwargs)
+            
+            worker_version = response.headers.get(RING_VERSION_HEADER)
+            self.router.observe_version(int(worker_version) if worker_version else None)
+            if response.status_code != 421:
+                return response
+            
+            # Misdirected: refresh the ring and route again
+            self.router.refresh()
+        
+        return response
     
     def put(self, key, value):
         """PUT operation"""
         try:
-            # Step 1: Query controller for key location
-            response = requests.get(f"{self.controller_url}/query?key={key}")
-            if response.status_code != 200:
-                print(f"✗ Failed to query controller: {response.status_code}")
+            response = self._send('put', key, json={'key': key, 'value': value}, timeout=10)
+            if response is None:
+                print(f"✗ No workers available")
                 return False
             
-            data = response.json()
-            primary_worker = data['primary_worker']
-            
-            print(f"→ Primary worker for '{key}': {primary_worker}")
-            
-            # Step 2: PUT to primary worker
-            response = requests.post(
-                f"{primary_worker}/put",
-                json={'key': key, 'value': value},
-                timeout=10
-            )
-            
             if response.status_code == 200:
                 result = response.json()
                 print(f"✓ PUT successful: {key} = {value}")
@@ -43,38 +87,193 @@ class KVStoreClient:
             print(f"✗ Error: {str(e)}")
             return False
     
-    def get(self, key):
-        """GET operation"""
+    def get(self, key, consistency=None):
+        """
+        GET operation at a consistency level: 'one', 'quorum' or 'all'
+        replicas must answer (default READ_CONSISTENCY). The newest version
+        among the answers wins.
+        """
+        consistency = (consistency or READ_CONSISTENCY).lower()
         try:
-            # Step 1: Query controller for key location
-            response = requests.get(f"{self.controller_url}/query?key={key}")
-            if response.status_code != 200:
-                print(f"✗ Failed to query controller: {response.status_code}")
+            result = self._read(key, consistency)
+            if result is None:
+                print(f"✗ GET failed: not enough replicas answered for {consistency}")
                 return None
             
-            data = response.json()
-            primary_worker = data['primary_worker']
-            
-            print(f"→ Primary worker for '{key}': {primary_worker}")
-            
-            # Step 2: GET from primary worker
-            response = requests.get(f"{primary_worker}/get?key={key}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                value = result['value']
-                print(f"✓ GET successful: {key} = {value}")
-                return value
-            elif response.status_code == 404:
+            value, version = result
+            if version is None:
                 print(f"✗ Key not found: {key}")
                 return None
-            else:
-                print(f"✗ GET failed: {response.status_code}")
-                return None
-                
+            print(f"✓ GET successful: {key} = {value} (version {version})")
+            return value
+            
         except Exception as e:
             print(f"✗ Error: {str(e)}")
             return None
+    
+    def hedge_delay(self):
+        """READ_HEDGE_PERCENTILE of recent replica read latencies (seconds)"""
+        with self._stats_lock:
+            samples = sorted(self.read_latencies)
+        floor = READ_HEDGE_MIN_MS / 1000
+        if not samples:
+            return floor
+        index = min(len(samples) - 1, len(samples) * READ_HEDGE_PERCENTILE // 100)
+        return max(samples[index], floor)
+    
+    def _fetch(self, url, key):
+        """
+        Read a key from one replica: ('found', value, version), ('missing',),
+        ('stale',) if it rejected our ring, or None if it failed
+        """
+        started = time.perf_counter()
+        with self._stats_lock:
+            self.in_flight[url] = self.in_flight.get(url, 0) + 1
+        try:
+            response = requests.get(f"{url}/get", params={'key': key}, timeout=10,
+                                    headers={RING_VERSION_HEADER: str(self.router.version)})
+        except requests.RequestException:
+            return None
+        finally:
+            with self._stats_lock:
+                self.in_flight[url] -= 1
+        with self._stats_lock:
+            self.read_latencies.append(time.perf_counter() - started)
+            if response.status_code in (200, 404):
+                self.reads_by_replica[url] = self.reads_by_replica.get(url, 0) + 1
+        
+        worker_version = response.headers.get(RING_VERSION_HEADER)
+        self.router.observe_version(int(worker_version) if worker_version else None)
+        if response.status_code == 200:
+            result = response.json()
+            return ('found', result['value'], result.get('version'))
+        if response.status_code == 404:
+            return ('missing',)
+        if response.status_code == 421:
+            return ('stale',)
+        return None
+    
+    def _read_order(self, key, consistency):
+        """
+        Replica URLs in the order a read tries them. Reading from the
+        primary: ring order. Reading from replicas: power of two choices
+        over this client's outstanding reads, i.e. of two random eligible
+        replicas the one with fewer reads in flight goes first (either, on
+        a tie), followed by the rest, fewest first. The workers' load
+        reports can be READ_LOAD_REFRESH seconds old, so they only serve the
+        staleness bound: ONE reads leave out replicas the primary's
+        replication queue is further behind than max_staleness seconds (as
+        last reported); QUORUM and ALL reads still count every replica.
+        """
+        replica_ids = self.router.get_replicas(key, REPLICATION_FACTOR)
+        urls = [self.router.get_worker_url(replica_id) for replica_id in replica_ids]
+        if self.read_from != 'replicas' or len(urls) < 2:
+            return [url for url in urls if url]
+        
+        bounded = self.max_staleness is not None and consistency == 'one'
+        if bounded and self.router.load_age() >= READ_LOAD_REFRESH:
+            self.pool.submit(self.router.refresh_load)
+        loads = self.router.load
+        
+        primary_lags = loads.get(replica_ids[0], {}).get('replication_lags', {})
+        candidates = []
+        for i, (replica_id, url) in enumerate(zip(replica_ids, urls)):
+            if not url:
+                continue
+            if i and bounded:
+                if replica_ids[0] not in loads or primary_lags.get(url, 0) > self.max_staleness:
+                    continue
+            candidates.append((self.in_flight.get(url, 0), url))
+        
+        if len(candidates) < 2:
+            return [url for _, url in candidates]
+        # sample() picks the pair in random order, so a tie goes either way
+        first, second = random.sample(candidates, 2)
+        chosen = second if second[0] < first[0] else first
+        rest = sorted((candidate for candidate in candidates if candidate is not chosen),
+                      key=lambda candidate: candidate[0])
+        return [chosen[1]] + [url for _, url in rest]
+    
+    def _read(self, key, consistency):
+        """
+        Ask as many replicas as the consistency level needs, in _read_order,
+        and another one whenever a replica fails or nothing has answered
+        within the hedge delay. Returns (value, version) of the newest
+        answer ((None, None) if the key is missing), or None if too few
+        replicas answered. Retries once with a refreshed ring if replicas
+        say ours is stale.
+        """
+        for attempt in range(2):
+            urls = self._read_order(key, consistency)
+            if not urls:
+                return None
+            needed = {'one': 1, 'quorum': len(urls) // 2 + 1, 'all': len(urls)}.get(consistency)
+            if needed is None:
+                raise ValueError(f"Unknown consistency level: {consistency}")
+            
+            answers = {}  # url -> answer
+            in_flight = {}  # future -> url
+            untried = list(reversed(urls))  # next replica to ask at the end
+            stale = False
+            
+            def ask_next():
+                url = untried.pop()
+                in_flight[self.pool.submit(self._fetch, url, key)] = url
+            
+            for _ in range(needed):
+                ask_next()
+            while len(answers) < needed and in_flight:
+                done, _ = wait(in_flight, timeout=self.hedge_delay() if untried else None,
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    # Hedge: nothing answered in time, try one more replica
+                    with self._stats_lock:
+                        self.hedged_reads += 1
+                    ask_next()
+                    continue
+                for future in done:
+                    url = in_flight.pop(future)
+                    answer = future.result()
+                    if answer is not None and answer[0] != 'stale':
+                        answers[url] = answer
+                        continue
+                    stale = stale or answer is not None
+                    if untried:
+                        ask_next()
+            
+            if len(answers) >= needed:
+                return self._resolve(key, answers)
+            if not stale or attempt:
+                return None
+            # Misdirected: refresh the ring and read again
+            self.router.refresh()
+    
+    def _resolve(self, key, answers):
+        """Newest answer wins; replicas that answered with less get it (read repair)"""
+        found = [answer for answer in answers.values() if answer[0] == 'found']
+        if not found:
+            return None, None
+        newest = max(found, key=lambda answer: answer[2] or [])
+        _, value, version = newest
+        
+        if READ_REPAIR and version is not None:
+            behind = [url for url, answer in answers.items()
+                      if answer[0] == 'missing' or (answer[2] or []) < version]
+            for url in behind:
+                self.pool.submit(self._repair, url, key, value, version)
+        return value, version
+    
+    def _repair(self, url, key, value, version):
+        """Send a replica that answered with an older version the newest one"""
+        try:
+            response = requests.post(f"{url}/replicate", timeout=5,
+                                     json={'key': key, 'value': value, 'version': version})
+            if response.status_code == 200 and response.json().get('applied'):
+                with self._stats_lock:
+                    self.read_repairs += 1
+                print(f"  ↻ Read repair: {key} on {url}")
+        except requests.RequestException:
+            pass
 
 
 def interactive_mode():
@@ -86,7 +285,7 @@ def interactive_mode():
     print("=" * 60)
     print("Commands:")
     print("  put <key> <value>  - Store a key-value pair")
-    print("  get <key>          - Retrieve a value")
+    print("  get <key> [level]  - Retrieve a value (level: one, quorum, all)")
     print("  exit               - Exit client")
     print("=" * 60)
     
@@ -114,10 +313,10 @@ def interactive_mode():
             
             elif cmd == 'get':
                 if len(parts) < 2:
-                    print("Usage: get <key>")
+                    print("Usage: get <key> [one|quorum|all]")
                     continue
                 key = parts[1]
-                client.get(key)
+                client.get(key, parts[2] if len(parts) == 3 else None)
             
             else:
                 print(f"Unknown command: {cmd}")
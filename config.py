@@ -3,25 +3,125 @@
 # Controller configuration
 CONTROLLER_HOST = 'localhost'
 CONTROLLER_PORT = 5000
+STANDBY_CONTROLLER_PORT = 5001  # Hot standby (controller.py --standby)
+# Controllers in failover order; workers and clients move down the list
+# when one is unreachable or answers as a standby
+CONTROLLER_URLS = [f"http://{CONTROLLER_HOST}:{CONTROLLER_PORT}",
+                   f"http://{CONTROLLER_HOST}:{STANDBY_CONTROLLER_PORT}"]
 
 # Worker configuration
 WORKER_BASE_PORT = 6000  # Workers will use ports 6000, 6001, 6002, 6003
 NUM_WORKERS = 4
 REPLICATION_FACTOR = 3  # Total replicas per key
 SYNC_REPLICAS = 2       # Replicas needed for PUT success
+# Every replica write goes through a per-peer queue; PUT waits for the
+# first SYNC_REPLICAS - 1 peers and the rest are written in the background
+REPLICATION_BATCH_MAX = 500      # Queued writes sent to a peer per /replicate_batch
+REPLICATION_BATCH_MAX_BYTES = 1048576  # Max bytes of keys and values per batch
+REPLICATION_LINGER = 0.002       # seconds a batch waits for concurrent writes to join it
+REPLICATION_RETRY_BASE = 0.1     # seconds - first retry delay, doubled per failed batch
+REPLICATION_RETRY_MAX = 10       # seconds - retry delay cap
+REPLICATION_SYNC_TIMEOUT = 5     # seconds a PUT waits for its quorum acks
+REPLICATION_SEND_TIMEOUT = 1.5   # seconds per /replicate_batch; well under the sync timeout so a PUT can still turn to a hint holder
+REPLICATION_BACKLOG_DIR = 'worker_state'  # Queued writes survive restarts here (relative to the repository root; '' disables it)
+REPLICATION_LOG_SIZE = 100000    # Coordinated writes kept for peers catching up; older gaps need a range copy
+HINTED_HANDOFF = True            # Another worker holds writes for an unreachable replica and counts towards the quorum
+HINTED_HANDOFF_TTL = 3600        # seconds a hint is kept for a replica that does not come back
+HLC_MAX_DRIFT_MS = 60000         # Peer clocks further ahead than this are not followed
+# Client reads: how many replicas must answer, and when to hedge a slow one
+READ_CONSISTENCY = 'one'         # or 'quorum' / 'all' (per request: client.get(key, level))
+READ_HEDGE_PERCENTILE = 95       # Ask another replica after this percentile of read latency...
+READ_HEDGE_MIN_MS = 5            # ...but never sooner than this
+READ_LATENCY_WINDOW = 200        # Recent replica reads the percentile is taken over
+READ_REPAIR = True               # Send the newest version to replicas that answered with less
+READ_FROM = 'primary'            # or 'replicas': spread reads over replicas (power of two choices)
+READ_MAX_STALENESS = None        # seconds; with 'replicas', skip replicas the primary's replication lags further behind (None = any)
+READ_LOAD_REFRESH = 5            # seconds between fetches of the workers' load reports
+# Anti-entropy: each worker periodically compares Merkle trees with one
+# replica peer over the token ranges they share (hash partitioning only)
+ANTI_ENTROPY_INTERVAL = 30       # seconds between sessions (0 disables)
+ANTI_ENTROPY_BATCH_SIZE = 4096   # tree nodes or leaves per request
+MERKLE_LEAF_BITS = 16            # 2^16 leaf buckets over the hash ring
+MERKLE_FANOUT_BITS = 4           # 16 children per node (a 4-level tree)
 
 # Heartbeat configuration
 HEARTBEAT_INTERVAL = 5  # seconds
 HEARTBEAT_TIMEOUT = 15  # seconds - consider worker dead after this
+FAILURE_DETECTOR = 'timeout'  # or 'phi' (phi-accrual: adapts to heartbeat jitter)
+PHI_THRESHOLD = 8.0           # Fail a worker once phi reaches this (~1e-8 false-positive odds)
+PHI_WINDOW_SIZE = 100         # Heartbeat intervals kept per worker
+PHI_MIN_STD = 0.5             # seconds - floor on the interval deviation
+PHI_ACCEPTABLE_PAUSE = 1.0    # seconds - extra slack for GC pauses and network blips
+PHI_MIN_SAMPLES = 5           # Use HEARTBEAT_TIMEOUT until this many intervals are seen
+# Membership: with 'heartbeat' every worker heartbeats the controller, which
+# detects failures; with 'gossip' workers probe each other (SWIM) and only
+# report failures, sending their load to the controller far less often
+MEMBERSHIP = 'heartbeat'      # or 'gossip'
+GOSSIP_INTERVAL = 1.0         # seconds per protocol period (one probe per worker)
+GOSSIP_PING_TIMEOUT = 0.5     # seconds to wait for a direct ack
+GOSSIP_INDIRECT_PROBES = 3    # peers asked to probe a worker that missed its ack
+GOSSIP_SUSPECT_TIMEOUT = 5.0  # seconds a suspect has to refute before it is declared dead
+GOSSIP_PIGGYBACK = 8          # membership updates carried per message
+GOSSIP_RETRANSMIT_MULT = 3    # each update is sent this × log2(cluster size) times
+GOSSIP_REPORT_INTERVAL = 30   # seconds between worker load reports in gossip mode
+GOSSIP_REPORT_TIMEOUT = 90    # controller backstop: fail a worker that stopped reporting
+LATENCY_SAMPLE_SIZE = 1024    # GET/PUT latencies sampled per heartbeat for p99
+HOT_PARTITIONS_REPORTED = 8   # Busiest partitions listed in each heartbeat
+
+# Controller metadata persistence (registry and ring survive restarts)
+METADATA_DIR = 'controller_state'  # Relative to the repository root; '' disables it
+METADATA_FSYNC = True              # fsync every log record before acknowledging
+METADATA_SNAPSHOT_INTERVAL = 60    # seconds between snapshots (when the log has records)
+STANDBY_METADATA_DIR = 'controller_state_standby'  # Used by a standby once promoted
+STANDBY_POLL_WAIT = 5              # seconds a standby long-polls the primary's metadata log
+STANDBY_TAKEOVER_TIMEOUT = 10      # seconds without the primary before the standby promotes itself (0 = only POST /promote)
 
 # Partitioning configuration
 PARTITION_METHOD = 'hash'  # or 'range'
 VIRTUAL_NODES = 150  # For consistent hashing
+MAX_WORKER_WEIGHT = 100  # Largest capacity weight a worker may ask for (VIRTUAL_NODES × this vnodes)
+QUERY_BATCH_MAX_KEYS = 10000  # Max keys per /query_batch request
+PARTITION_BITS = 8  # Workers report key counts per fixed hash partition
+PARTITION_COUNT = 2 ** PARTITION_BITS
+
+# Range partitioning (PARTITION_METHOD = 'range')
+RANGE_SPLIT_MAX_KEYS = 100000  # Split a range holding more keys than this
+RANGE_SPLIT_MAX_QPS = 500      # Split a range serving more requests/s than this
+RANGE_MOVE_IMBALANCE = 1.5     # Move a range when max - min worker load > mean × (this - 1)
+RANGE_BALANCE_INTERVAL = 30    # seconds between split/move passes
+TRANSFER_BATCH_SIZE = 500      # Keys per /replicate_batch call when moving data
+TRANSFER_TIMEOUT = 600         # seconds a /transfer_range stream may take
+RING_SETTLE_TIMEOUT = 10       # seconds to wait for workers to route with a new ring before a move's catch-up pass
+
+# Load-driven vnode rebalancing (PARTITION_METHOD = 'hash')
+VNODE_REBALANCE_INTERVAL = 60       # seconds between passes (0 = off)
+VNODE_MOVE_IMBALANCE = 1.25         # Move vnodes when max - min worker load > mean × (this - 1)
+VNODE_MOVES_PER_PASS = 2            # Rate limit: vnodes moved per pass
+VNODE_MOVE_CANDIDATES = 64          # Hot-worker vnodes evaluated per move
+VNODE_MOVE_MAX_KEYS_PER_SEC = 5000  # Throttle on the data streamed for a move (0 = unlimited)
+
+# Re-replication after a worker failure
+REPAIR_PARALLELISM = 4           # Concurrent range streams
+REPAIR_RANGES_PER_TASK = 32      # Ranges per stream, so progress is reported in steps
+REPAIR_MAX_KEYS_PER_SEC = 20000  # Total repair throughput cap (0 = unlimited)
 
 # API endpoints
 CONTROLLER_QUERY_ENDPOINT = '/query'
+CONTROLLER_QUERY_BATCH_ENDPOINT = '/query_batch'
 CONTROLLER_REGISTER_ENDPOINT = '/register'
 CONTROLLER_HEARTBEAT_ENDPOINT = '/heartbeat'
+CONTROLLER_RING_ENDPOINT = '/ring'
+CONTROLLER_PARTITIONS_ENDPOINT = '/partitions'
+CONTROLLER_REPAIR_ENDPOINT = '/repair'
+CONTROLLER_CLUSTER_LOAD_ENDPOINT = '/cluster/load'
+CONTROLLER_METADATA_LOG_ENDPOINT = '/metadata/log'
+CONTROLLER_PROMOTE_ENDPOINT = '/promote'
+CONTROLLER_MEMBERSHIP_ENDPOINT = '/membership'
 WORKER_GET_ENDPOINT = '/get'
 WORKER_PUT_ENDPOINT = '/put'
-WORKER_REPLICATE_ENDPOINT = '/replicate'
\ No newline at end of file
+WORKER_REPLICATE_ENDPOINT = '/replicate'
+WORKER_REPLICATE_BATCH_ENDPOINT = '/replicate_batch'
+WORKER_TRANSFER_RANGE_ENDPOINT = '/transfer_range'
+WORKER_GOSSIP_PING_ENDPOINT = '/gossip/ping'
+WORKER_GOSSIP_PING_REQ_ENDPOINT = '/gossip/ping_req'
+WORKER_GOSSIP_MEMBERS_ENDPOINT = '/gossip/members'
\ No newline at end of file
@@ -1,39 +1,132 @@
 from flask import Flask, request, jsonify
 import threading
 import time
+import math
 import sys
 import os
 import requests
+import zlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import wraps
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import *
-from utils import ConsistentHash, WorkerRegistry
+from utils import (ConsistentHash, PhiAccrualDetector, RangePartitioner, RepairProgress,
+                   WorkerRegistry, diff_rings)
+from metadata import MetadataStore
+from routing import CONTROLLER_TERM_HEADER, RING_VERSION_HEADER, controller_term, encode_ring
 
 app = Flask(__name__)
 
 # Global state
-consistent_hash = ConsistentHash(NUM_WORKERS, VIRTUAL_NODES)
-worker_registry = WorkerRegistry(HEARTBEAT_TIMEOUT)
+if PARTITION_METHOD == 'range':
+    partitioner = RangePartitioner(REPLICATION_FACTOR)
+else:
+    partitioner = ConsistentHash(NUM_WORKERS, VIRTUAL_NODES, REPLICATION_FACTOR)
+if FAILURE_DETECTOR == 'phi':
+    phi_detector = PhiAccrualDetector(PHI_THRESHOLD, PHI_WINDOW_SIZE, PHI_MIN_STD,
+                                      PHI_ACCEPTABLE_PAUSE, PHI_MIN_SAMPLES)
+else:
+    phi_detector = None
+# With gossip membership workers detect each other's failures; the
+# controller's own timeout only backstops workers that stop reporting load
+worker_registry = WorkerRegistry(
+    HEARTBEAT_TIMEOUT if MEMBERSHIP == 'heartbeat' else GOSSIP_REPORT_TIMEOUT, phi_detector)
+# Routing and status reads use the ring and registry snapshots and never
+# take this lock; it only guards the worker-reported stats below
 lock = threading.Lock()
 
-# Track keys stored on each worker (for re-replication)
-worker_keys = {}  # worker_id -> set of keys
+# Durable registry and ring metadata (set up by recover_metadata, or by
+# promote on a standby)
+metadata_store = None
+metadata_dir = METADATA_DIR
+
+# Hot standby: a standby follows the primary's metadata log, serves
+# read-only routing and takes over if the primary goes away
+role = 'primary'  # or 'standby'
+primary_url = None  # the controller a standby follows
+term = 0  # failover term: bumped by each promotion (persisted); a standby takes its primary's
+standby_applied = {'ring': 0, 'registry': 0}  # primary's log position mirrored so far
+role_lock = threading.Lock()
+
+# Ring changes a metadata log record may replay
+RING_OPS = {'add_worker', 'remove_worker', 'set_weight', 'move_vnode',
+            'split_range', 'move_replica'}
+
+# Keys stored per hash partition, as reported by each worker's heartbeat.
+# Ownership itself comes from the ring, so this never grows with the data.
+partition_counts = {}  # worker_id -> list of PARTITION_COUNT key counts
+
+# Encoded /ring payload, cached as (etag, payload)
+ring_cache = (None, None)
+
+# Latest load summary reported by each worker's heartbeat
+worker_loads = {}  # worker_id -> {'keys', 'bytes', 'get_qps', ..., 'reported_at'}
+
+# Latest per-range stats reported by each worker (range partitioning)
+range_stats = {}  # worker_id -> {'ring_version': v, 'ranges': [...]}
+
+# Re-replication streams share one bounded pool across all failures
+repair_pool = ThreadPoolExecutor(max_workers=REPAIR_PARALLELISM,
+                                 thread_name_prefix='repair')
+repairs = {}  # failed worker_id -> RepairProgress of its latest repair
+joining = set()  # workers being streamed their ranges before they go on the ring
+repair_max_keys_per_sec = REPAIR_MAX_KEYS_PER_SEC  # settable via POST /repair
+
+
+@app.after_request
+def add_term(response):
+    """Tell callers which failover term this controller is in"""
+    response.headers[CONTROLLER_TERM_HEADER] = str(term)
+    return response
+
+
+def primary_only(endpoint):
+    """
+    Refuse changes on a standby; it only mirrors the primary's metadata.
+    A caller that has seen a higher term than ours is refused too: another
+    controller has been promoted since, so this one is deposed.
+    """
+    @wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        if role != 'primary':
+            return standby_refusal()
+        caller_term = request.headers.get(CONTROLLER_TERM_HEADER, type=int)
+        if caller_term is not None and caller_term > term:
+            return jsonify({
+                'success': False,
+                'error': f'Controller term {term} is stale (caller has seen {caller_term})'
+            }), 409
+        return endpoint(*args, **kwargs)
+    return wrapper
+
+
+def standby_refusal():
+    """Response telling a caller to use the primary controller"""
+    return jsonify({
+        'success': False,
+        'error': 'Controller is a standby',
+        'primary': primary_url
+    }), 503
 
 
 @app.route('/register', methods=['POST'])
+@primary_only
 def register_worker():
     """
     Register a new worker node
     POST /register
-    Body: {"worker_id": "worker_1", "host": "localhost", "port": 6000}
+    Body: {"worker_id": "worker_1", "host": "localhost", "port": 6000, "weight": 1.0}
     """
     try:
         data = request.get_json()
         worker_id = data.get('worker_id')
         host = data.get('host')
         port = data.get('port')
+        weight = parse_weight(data.get('weight', 1.0))
         
         if not all([worker_id, host, port]):
             return jsonify({
@@ -41,23 +134,36 @@ def register_worker():
                 'error': 'Missing required fields: worker_id, host, port'
             }), 400
         
-        with lock:
-            # Register worker in registry
-            worker_registry.register_worker(worker_id, host, port)
-            
-            # Add worker to consistent hash ring
-            consistent_hash.add_worker(worker_id)
-            
-            # Initialize key tracking for this worker
-            if worker_id not in worker_keys:
-                worker_keys[worker_id] = set()
+        if weight is None:
+            return jsonify({
+                'success': False,
+                'error': f'weight must be a positive number up to {MAX_WORKER_WEIGHT}'
+            }), 400
         
-        print(f"✓ Worker registered: {worker_id} at {host}:{port}")
+        # Register worker in registry
+        worker_registry.register_worker(worker_id, host, port, weight)
+        
+        # A worker registering again was restarted and lost its data: take it
+        # off the ring, as if it had failed, until it has its ranges again
+        repair = None
+        if partitioner.get_weight(worker_id) is not None:
+            with lock:
+                partition_counts.pop(worker_id, None)
+                worker_loads.pop(worker_id, None)
+            repair = apply_membership_change(lambda: partitioner.remove_worker(worker_id))
+            print(f"⚠ Worker {worker_id} re-registered; off the ring until it is caught up "
+                  f"(ring v{partitioner.version}: {len(repair)} ranges changed replicas)")
+        
+        # It joins the ring once it holds the ranges it will serve
+        start_join(worker_id, weight, repair=repair)
+        
+        print(f"✓ Worker registered: {worker_id} at {host}:{port} (weight {weight})")
         
         return jsonify({
             'success': True,
             'message': f'Worker {worker_id} registered successfully',
-            'worker_id': worker_id
+            'worker_id': worker_id,
+            'ring_version': partitioner.version
         }), 201
         
     except Exception as e:
@@ -68,12 +174,88 @@ def register_worker():
         }), 500
 
 
+@app.route('/weight', methods=['POST'])
+@primary_only
+def set_worker_weight():
+    """
+    Change a worker's capacity weight. With hash partitioning its vnodes
+    are added or removed so its share of the ring follows the new weight:
+    the ranges that move are streamed to their new replicas before the
+    ring cuts over and again once the workers route with it. With range
+    partitioning the range balancer uses it for placement
+    POST /weight
+    Body: {"worker_id": "worker_1", "weight": 2.0}
+    """
+    try:
+        data = request.get_json()
+        worker_id = data.get('worker_id')
+        weight = parse_weight(data.get('weight'))
+        
+        if not worker_id or weight is None:
+            return jsonify({
+                'success': False,
+                'error': 'Missing worker_id or invalid weight'
+            }), 400
+        
+        if worker_registry.get_worker(worker_id) is None:
+            return jsonify({
+                'success': False,
+                'error': f'Worker {worker_id} not registered'
+            }), 404
+        
+        ring = partitioner.snapshot
+        new_ring = partitioner.preview_set_weight(worker_id, weight)
+        if new_ring is None:
+            return jsonify({
+                'success': False,
+                'error': f'Worker {worker_id} is not on the ring (joining or failed)'
+            }), 409
+        
+        # Stream the moving vnodes before cutting over so reads never miss
+        transfers = diff_rings(ring, new_ring)
+        if not stream_transfers(transfers, repair_max_keys_per_sec):
+            return jsonify({
+                'success': False,
+                'error': 'Failed to stream the ranges that move to their new replicas'
+            }), 503
+        
+        # Registry only once the ring took the weight, so the two never disagree
+        if not partitioner.set_weight(worker_id, weight, if_version=ring.version):
+            return jsonify({
+                'success': False,
+                'error': 'The ring changed while streaming; retry'
+            }), 409
+        worker_registry.set_weight(worker_id, weight)
+        print(f"⚖ Worker {worker_id} weight set to {weight} "
+              f"(ring v{partitioner.version}: {len(transfers)} ranges changed replicas)")
+        
+        # Then bring over what was written to the old replicas in the meantime
+        if transfers and not catch_up_transfers(transfers, repair_max_keys_per_sec):
+            print(f"✗ Catch-up after reweighting {worker_id} failed")
+        
+        return jsonify({
+            'success': True,
+            'worker_id': worker_id,
+            'weight': weight,
+            'ring_version': partitioner.version
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error setting weight: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/heartbeat', methods=['POST'])
+@primary_only
 def heartbeat():
     """
     Receive heartbeat from worker
     POST /heartbeat
-    Body: {"worker_id": "worker_1"}
+    Body: {"worker_id": "worker_1", "partition_counts": [...], "load": {...},
+           "range_stats": {...}}   (partition_counts, load and range_stats optional)
     """
     try:
         data = request.get_json()
@@ -85,13 +267,29 @@ def heartbeat():
                 'error': 'Missing worker_id'
             }), 400
         
-        with lock:
-            success = worker_registry.update_heartbeat(worker_id)
+        previous_status = worker_registry.update_heartbeat(worker_id)
+        success = previous_status is not None
+        if success and (data.get('range_stats') or data.get('partition_counts')
+                        or data.get('load')):
+            with lock:
+                if data.get('range_stats'):
+                    range_stats[worker_id] = data['range_stats']
+                if data.get('partition_counts'):
+                    partition_counts[worker_id] = data['partition_counts']
+                if data.get('load'):
+                    worker_loads[worker_id] = dict(data['load'], reported_at=time.time())
+        
+        if previous_status == 'failed':
+            # Back from the dead: put it on the ring again once it has caught up
+            print(f"✓ Worker recovered: {worker_id}")
+            start_join(worker_id, worker_registry.get_worker(worker_id)['weight'], recovered=True)
         
         if success:
             return jsonify({
                 'success': True,
-                'message': 'Heartbeat received'
+                'message': 'Heartbeat received',
+                'ring_version': partitioner.version,
+                'rejoined': previous_status == 'failed'
             }), 200
         else:
             return jsonify({
@@ -107,6 +305,136 @@ def heartbeat():
         }), 500
 
 
+@app.route('/membership', methods=['POST'])
+@primary_only
+def report_membership():
+    """
+    Receive a failure detected by worker gossip (MEMBERSHIP = 'gossip')
+    POST /membership
+    Body: {"reporter": "worker_2", "worker_id": "worker_4", "status": "failed", "incarnation": 0}
+    """
+    try:
+        data = request.get_json()
+        worker_id = data.get('worker_id')
+        
+        if not worker_id or data.get('status') != 'failed':
+            return jsonify({
+                'success': False,
+                'error': 'Missing worker_id or status is not "failed"'
+            }), 400
+        
+        if worker_registry.get_worker(worker_id) is None:
+            return jsonify({
+                'success': False,
+                'error': f'Worker {worker_id} not registered'
+            }), 404
+        
+        # A peer acting on a stale rumour can report a worker that has
+        # already refuted it, so check for ourselves before failing it
+        if worker_reachable(worker_registry.get_worker_url(worker_id)):
+            print(f"⚠ Ignoring failure report for {worker_id} from {data.get('reporter')}: "
+                  f"it answers")
+        # Several peers may report the same failure; only the first acts
+        elif worker_registry.mark_worker_failed(worker_id):
+            print(f"⚠ Worker failed: {worker_id} (reported by {data.get('reporter')})")
+            retire_worker(worker_id)
+        
+        return jsonify({
+            'success': True,
+            'worker_id': worker_id,
+            'status': worker_registry.get_worker(worker_id)['status'],
+            'ring_version': partitioner.version
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error processing membership report: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/ring', methods=['GET'])
+def get_ring():
+    """
+    Get a compact, versioned snapshot of the hash ring for local routing
+    GET /ring   (supports If-None-Match)
+    """
+    global ring_cache
+    
+    try:
+        ring = partitioner.snapshot
+        urls = worker_registry.snapshot.urls
+        worker_urls = {worker_id: urls.get(worker_id) for worker_id in ring.workers}
+        
+        # Worker URLs can change without a ring change, so both go in the ETag
+        url_digest = zlib.crc32(repr(sorted(worker_urls.items())).encode())
+        etag = f"{term}-{ring.version}-{url_digest:08x}"
+        
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        cached_etag, payload = ring_cache
+        if cached_etag != etag:
+            payload = dict(encode_ring(ring, worker_urls), success=True)
+            ring_cache = (etag, payload)
+        
+        response = jsonify(payload)
+        response.set_etag(etag)
+        return response, 200
+        
+    except Exception as e:
+        print(f"✗ Error serving ring: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/ring/diff', methods=['GET'])
+def get_ring_diff():
+    """
+    Get the ranges whose replicas changed between two recent ring versions
+    GET /ring/diff?from=<version>&to=<version>   (to defaults to current)
+    """
+    try:
+        from_version = request.args.get('from', type=int)
+        to_version = request.args.get('to', default=partitioner.version, type=int)
+        
+        if from_version is None:
+            return jsonify({
+                'success': False,
+                'error': 'Missing from parameter'
+            }), 400
+        
+        old_ring = partitioner.get_snapshot(from_version)
+        new_ring = partitioner.get_snapshot(to_version)
+        
+        if old_ring is None or new_ring is None:
+            return jsonify({
+                'success': False,
+                'error': 'Ring version no longer in history'
+            }), 410
+        
+        transfers = diff_rings(old_ring, new_ring)
+        
+        return jsonify({
+            'success': True,
+            'from': from_version,
+            'to': to_version,
+            'transfers': [transfer.to_dict() for transfer in transfers]
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error diffing ring: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/query', methods=['GET'])
 def query_key():
     """
@@ -122,44 +450,37 @@ def query_key():
                 'error': 'Missing key parameter'
             }), 400
         
-        with lock:
-            # Get primary worker and replicas
-            replicas = consistent_hash.get_replicas(key, REPLICATION_FACTOR)
-            
-            if not replicas:
-                return jsonify({
-                    'success': False,
-                    'error': 'No workers available'
-                }), 503
-            
-            primary_worker_id = replicas[0]
-            primary_worker = worker_registry.get_worker(primary_worker_id)
-            
-            if not primary_worker:
-                return jsonify({
-                    'success': False,
-                    'error': f'Primary worker {primary_worker_id} not found'
-                }), 500
-            
-            # Get URLs for all replicas
-            replica_urls = []
-            for replica_id in replicas:
-                url = worker_registry.get_worker_url(replica_id)
-                if url:
-                    replica_urls.append(url)
-            
-            # Track that this key should be on these workers
-            for replica_id in replicas:
-                if replica_id in worker_keys:
-                    worker_keys[replica_id].add(key)
+        # Get primary worker and replicas from one immutable ring snapshot
+        ring = partitioner.snapshot
+        replicas = ring.get_replicas(key, REPLICATION_FACTOR)
+        
+        if not replicas:
+            return jsonify({
+                'success': False,
+                'error': 'No workers available'
+            }), 503
+        
+        urls = worker_registry.snapshot.urls
+        primary_worker_id = replicas[0]
+        primary_url = urls.get(primary_worker_id)
+        
+        if not primary_url:
+            return jsonify({
+                'success': False,
+                'error': f'Primary worker {primary_worker_id} not found'
+            }), 500
+        
+        # Get URLs for all replicas
+        replica_urls = [urls[replica_id] for replica_id in replicas if replica_id in urls]
         
         return jsonify({
             'success': True,
             'key': key,
-            'primary_worker': primary_worker['url'],
+            'primary_worker': primary_url,
             'primary_worker_id': primary_worker_id,
             'replicas': replica_urls,
-            'replica_ids': replicas
+            'replica_ids': replicas,
+            'ring_version': ring.version
         }), 200
         
     except Exception as e:
@@ -170,34 +491,84 @@ def query_key():
         }), 500
 
 
-@app.route('/notify_put', methods=['POST'])
-def notify_put():
+@app.route('/query_batch', methods=['POST'])
+def query_batch():
     """
-    Workers notify controller when they store a key
-    POST /notify_put
-    Body: {"worker_id": "worker_1", "key": "mykey", "replicas": ["worker_1", "worker_2"]}
+    Query which workers are responsible for many keys at once
+    POST /query_batch
+    Body: {"keys": ["key1", "key2", ...]}
     """
     try:
-        data = request.get_json()
-        worker_id = data.get('worker_id')
-        key = data.get('key')
-        replica_ids = data.get('replicas', [])
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({
+                'success': False,
+                'error': 'Request body must be a JSON object'
+            }), 400
         
-        if not all([worker_id, key]):
+        keys = data.get('keys')
+        if not isinstance(keys, list) or not keys:
             return jsonify({
                 'success': False,
-                'error': 'Missing required fields'
+                'error': 'Missing keys list'
             }), 400
         
+        if len(keys) > QUERY_BATCH_MAX_KEYS:
+            return jsonify({
+                'success': False,
+                'error': f'Too many keys: {len(keys)} (max {QUERY_BATCH_MAX_KEYS})'
+            }), 413
+        
+        keys = [str(key) for key in keys]
+        
+        ring = partitioner.snapshot
+        replica_sets = ring.get_replicas_many(keys, REPLICATION_FACTOR)
+        
+        if not replica_sets[0]:
+            return jsonify({
+                'success': False,
+                'error': 'No workers available'
+            }), 503
+        
+        # Worker URLs are sent once instead of per key
+        urls = worker_registry.snapshot.urls
+        worker_urls = {}
+        for replicas in set(replica_sets):
+            for replica_id in replicas:
+                if replica_id not in worker_urls:
+                    worker_urls[replica_id] = urls.get(replica_id)
+        
+        return jsonify({
+            'success': True,
+            'count': len(keys),
+            'routes': dict(zip(keys, replica_sets)),
+            'workers': worker_urls,
+            'ring_version': ring.version
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error querying key batch: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/partitions', methods=['GET'])
+def get_partitions():
+    """
+    Get per-partition key counts reported by workers
+    GET /partitions
+    """
+    try:
         with lock:
-            # Track this key on all replicas
-            for replica_id in replica_ids:
-                if replica_id in worker_keys:
-                    worker_keys[replica_id].add(key)
+            counts = {worker_id: list(c) for worker_id, c in partition_counts.items()}
         
         return jsonify({
             'success': True,
-            'message': 'Key tracking updated'
+            'partition_count': PARTITION_COUNT,
+            'workers': {worker_id: {'keys': sum(c), 'counts': c}
+                        for worker_id, c in counts.items()}
         }), 200
         
     except Exception as e:
@@ -207,6 +578,64 @@ def notify_put():
         }), 500
 
 
+@app.route('/repair', methods=['GET', 'POST'])
+def repair_status():
+    """
+    Get re-replication progress and ETA per failed worker, or set the
+    repair throughput cap
+    GET /repair
+    POST /repair   Body: {"max_keys_per_sec": 50000}   (0 = unlimited)
+    """
+    global repair_max_keys_per_sec
+    
+    try:
+        if request.method == 'POST':
+            data = request.get_json()
+            try:
+                rate = float(data.get('max_keys_per_sec'))
+            except (AttributeError, TypeError, ValueError):
+                rate = -1
+            if not (math.isfinite(rate) and rate >= 0):
+                return jsonify({
+                    'success': False,
+                    'error': 'max_keys_per_sec must be a finite non-negative number'
+                }), 400
+            repair_max_keys_per_sec = rate
+            print(f"⚙ Repair throughput set to {rate or 'unlimited'} keys/s")
+        
+        with lock:
+            progress = list(repairs.values())
+        
+        return jsonify({
+            'success': True,
+            'max_keys_per_sec': repair_max_keys_per_sec,
+            'parallelism': REPAIR_PARALLELISM,
+            'repairs': [p.to_dict() for p in progress]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/cluster/load', methods=['GET'])
+def get_cluster_load():
+    """
+    Get the latest load reported by every active worker, with cluster totals
+    GET /cluster/load
+    """
+    try:
+        return jsonify(dict(cluster_load(), success=True)), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/workers', methods=['GET'])
 def get_workers():
     """
@@ -214,8 +643,7 @@ def get_workers():
     GET /workers
     """
     try:
-        with lock:
-            workers = worker_registry.get_all_workers()
+        workers = worker_registry.get_all_workers()
         
         return jsonify({
             'success': True,
@@ -238,17 +666,22 @@ def get_status():
     GET /status
     """
     try:
-        with lock:
-            workers = worker_registry.get_all_workers()
-            active_workers = [w for w in workers.values() if w['status'] == 'active']
+        workers = worker_registry.snapshot
         
         return jsonify({
             'success': True,
             'status': 'running',
-            'total_workers': len(workers),
-            'active_workers': len(active_workers),
+            'total_workers': len(workers.workers),
+            'active_workers': len(workers.active),
             'replication_factor': REPLICATION_FACTOR,
-            'heartbeat_timeout': HEARTBEAT_TIMEOUT
+            'heartbeat_timeout': worker_registry.heartbeat_timeout,
+            'failure_detector': FAILURE_DETECTOR,
+            'membership': MEMBERSHIP,
+            'partition_method': PARTITION_METHOD,
+            'ring_version': partitioner.version,
+            'role': role,
+            'term': term,
+            'primary': primary_url if role == 'standby' else None
         }), 200
         
     except Exception as e:
@@ -258,168 +691,995 @@ def get_status():
         }), 500
 
 
-def get_key_from_worker(worker_url, key):
-    """Fetch a key's value from a worker"""
+@app.route('/metadata/log', methods=['GET'])
+@primary_only
+def get_metadata_log():
+    """
+    Ship the metadata log to a standby controller. Returns the records after
+    `after`, long-polling up to `wait` seconds for new ones; without `after`,
+    or once those records were compacted, returns a snapshot instead
+    GET /metadata/log?after=<lsn>&wait=<seconds>
+    """
     try:
-        response = requests.get(f"{worker_url}/get?key={key}", timeout=5)
-        if response.status_code == 200:
-            return response.json().get('value')
-    except:
-        pass
-    return None
+        if metadata_store is None:
+            return jsonify({
+                'success': False,
+                'error': 'Metadata persistence is disabled (METADATA_DIR)'
+            }), 503
+        
+        after = request.args.get('after', type=int)
+        wait = min(max(request.args.get('wait', 0, type=float), 0), 30)
+        records = metadata_store.records_after(after, wait) if after is not None else None
+        
+        if records is None:
+            return jsonify({
+                'success': True,
+                'snapshot': {'ring': partitioner.to_state(),
+                             'registry': worker_registry.to_state()}
+            }), 200
+        
+        # Log lines are JSON already; splice them in instead of re-encoding
+        body = '{"success":true,"records":[' + ','.join(records) + ']}'
+        return app.response_class(body, status=200, mimetype='application/json')
+        
+    except Exception as e:
+        print(f"✗ Error serving metadata log: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
 
-def replicate_key_to_worker(worker_url, key, value):
-    """Replicate a key to a worker"""
+@app.route('/promote', methods=['POST'])
+def promote_controller():
+    """
+    Make a standby controller the primary (manual failover)
+    POST /promote
+    """
     try:
-        response = requests.post(
-            f"{worker_url}/replicate",
-            json={'key': key, 'value': value},
-            timeout=5
-        )
-        return response.status_code == 200
-    except:
+        if not promote('manual promotion'):
+            return jsonify({
+                'success': False,
+                'error': 'Controller is already the primary'
+            }), 409
+        
+        return jsonify({
+            'success': True,
+            'role': role,
+            'ring_version': partitioner.version
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error promoting controller: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def request_rate(load):
+    """Total requests per second in a worker's load report"""
+    return load.get('get_qps', 0) + load.get('put_qps', 0) + load.get('replicate_qps', 0)
+
+
+def cluster_load():
+    """
+    Aggregate the active workers' heartbeat load reports: per-worker
+    stats, totals, imbalance (max / mean) and the hottest partitions
+    """
+    active = worker_registry.snapshot.active
+    with lock:
+        loads = {worker_id: load for worker_id, load in worker_loads.items()
+                 if worker_id in active}
+    
+    totals = {'keys': 0, 'bytes': 0, 'get_qps': 0.0, 'put_qps': 0.0, 'replicate_qps': 0.0,
+              'replication_backlog': 0, 'hints_pending': 0}
+    partition_qps = {}
+    for load in loads.values():
+        for field in totals:
+            totals[field] += load.get(field, 0)
+        for partition, qps in load.get('hot_partitions', []):
+            partition_qps[partition] = partition_qps.get(partition, 0.0) + qps
+    
+    def imbalance(values):
+        mean = sum(values) / len(values) if values else 0
+        return round(max(values) / mean, 3) if mean else None
+    
+    p99s = [load['p99_ms'] for load in loads.values() if load.get('p99_ms') is not None]
+    lags = [load.get('replication_lag', 0) for load in loads.values()]
+    hot = sorted(partition_qps.items(), key=lambda item: item[1], reverse=True)
+    
+    return {
+        'workers': loads,
+        'totals': dict(totals, p99_ms=max(p99s) if p99s else None,
+                       replication_lag=max(lags) if lags else 0),
+        'imbalance': {
+            'keys': imbalance([load.get('keys', 0) for load in loads.values()]),
+            'qps': imbalance([request_rate(load) for load in loads.values()])
+        },
+        'hot_partitions': [[p, round(qps, 2)] for p, qps in hot[:HOT_PARTITIONS_REPORTED]]
+    }
+
+
+def worker_reachable(worker_url):
+    """Whether a worker answers GET /status"""
+    try:
+        return requests.get(f"{worker_url}/status", timeout=2).status_code == 200
+    except requests.RequestException:
         return False
 
 
-def handle_worker_failure(failed_worker_id):
-    """Handle re-replication when a worker fails"""
+def parse_weight(value):
+    """
+    Validate a capacity weight; returns None unless it is a finite number
+    in (0, MAX_WORKER_WEIGHT]
+    """
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        return None
+    return weight if math.isfinite(weight) and 0 < weight <= MAX_WORKER_WEIGHT else None
+
+
+def handle_worker_failure(failed_worker_id, transfers, expected_keys=0):
+    """
+    Handle re-replication when a worker fails. `transfers` is the ring diff
+    caused by removing the worker: for each moved range a surviving replica
+    streams the range to the replicas that gained it. Streams run on the
+    bounded repair pool; `expected_keys` (the worker's last reported key
+    count) is only used for the progress ETA.
+    """
     print(f"🔄 Starting re-replication for failed worker: {failed_worker_id}")
     
+    active_workers = worker_registry.snapshot.active
+    
+    moves = [transfer for transfer in transfers if transfer.gained]
+    if not moves:
+        print(f"  No ranges to recover")
+        return
+    
+    print(f"  Ranges to recover: {len(moves)}")
+    
+    with lock:
+        source_qps = {worker_id: request_rate(load) for worker_id, load in worker_loads.items()}
+    
+    # Group ranges by (source, target) so each pair needs few scans and streams
+    streams = {}  # (source_id, target_id) -> [[start, end], ...]
+    assigned = {}  # source_id -> ranges it has been asked to stream
+    kind = moves[0].kind
+    unrecoverable = 0
+    for transfer in moves:
+        sources = [w for w in transfer.old_replicas
+                   if w != failed_worker_id and w in active_workers]
+        
+        if not sources:
+            print(f"  ✗ No surviving replica for range ({transfer.start}, {transfer.end}]")
+            unrecoverable += 1
+            continue
+        
+        # Spread the streams over the surviving replicas, busiest last
+        source_id = min(sources, key=lambda w: (assigned.get(w, 0), source_qps.get(w, 0)))
+        assigned[source_id] = assigned.get(source_id, 0) + 1
+        for new_replica_id in transfer.gained:
+            streams.setdefault((source_id, new_replica_id), []).append(
+                [transfer.start, transfer.end])
+    
+    tasks = [(source_id, target_id, ranges[i:i + REPAIR_RANGES_PER_TASK])
+             for (source_id, target_id), ranges in streams.items()
+             for i in range(0, len(ranges), REPAIR_RANGES_PER_TASK)]
+    progress = RepairProgress(failed_worker_id, len(tasks),
+                              len(moves) - unrecoverable, expected_keys)
+    with lock:
+        repairs[failed_worker_id] = progress
+    
+    def stream(source_id, target_id, ranges):
+        source_url = worker_registry.get_worker_url(source_id)
+        target_url = worker_registry.get_worker_url(target_id)
+        sent = transfer_range(source_url, target_url, ranges, kind,
+                              repair_max_keys_per_sec / REPAIR_PARALLELISM)
+        if sent is None:
+            print(f"  ✗ Failed to stream {len(ranges)} ranges from {source_id} to {target_id}")
+        progress.record(sent)
+    
+    wait([repair_pool.submit(stream, *task) for task in tasks])
+    
+    summary = progress.to_dict()
+    print(f"✓ Re-replication complete: {summary['tasks_done']} streams "
+          f"({summary['keys_sent']} keys in {summary['elapsed']:.1f}s), "
+          f"{summary['tasks_failed']} failed, "
+          f"{unrecoverable} ranges without a surviving replica")
+
+
+def start_join(worker_id, weight, recovered=False, repair=None):
+    """Hand a registering or recovering worker its ranges in the background, then add it to the ring"""
     with lock:
-        # Get keys that were on the failed worker
-        if failed_worker_id not in worker_keys:
-            print(f"  No keys tracked for {failed_worker_id}")
+        if worker_id in joining:
             return
+        joining.add(worker_id)
+    threading.Thread(target=join_worker, args=(worker_id, weight, recovered, repair),
+                     daemon=True).start()
+
+
+def join_worker(worker_id, weight, recovered=False, repair=None):
+    """
+    Add a worker to the ring without it serving ranges it holds no data
+    for. Once it answers, it is handed the ranges it is about to gain from
+    their current replicas: a recovered worker still holds its data and
+    only fetches the writes it missed from their replication logs, while a
+    registering worker notes where those logs stand and has the ranges
+    streamed to it (as handle_worker_failure does for the replicas standing
+    in for a failed worker). Then the ring cuts over and the worker fetches
+    the writes made in the meantime. `repair` is the ring diff of taking a
+    restarted worker off the ring; it is re-replicated first, like a
+    failure, so no replica it is handed ranges from is still empty.
+    """
+    try:
+        if repair:
+            handle_worker_failure(worker_id, repair)
+        worker_url = worker_registry.get_worker_url(worker_id)
+        while not worker_reachable(worker_url):
+            if worker_id not in worker_registry.snapshot.active:
+                return  # gone again; it rejoins through its next heartbeat
+            time.sleep(0.2)
         
-        keys_to_recover = list(worker_keys[failed_worker_id])
-        active_workers = worker_registry.get_active_workers()
+        transfers = diff_rings(partitioner.snapshot, partitioner.preview_add(worker_id, weight))
+        if recovered:
+            handed = catch_up_worker(worker_id, transfers)
+        else:
+            handed = catch_up_worker(worker_id, transfers, copy=False)
+            handed = stream_transfers(transfers, repair_max_keys_per_sec) and handed
+        if not handed:
+            print(f"⚠ Some ranges could not be handed to {worker_id} before it joined")
+        
+        transfers = apply_membership_change(lambda: partitioner.add_worker(worker_id, weight))
+        print(f"✓ Worker {worker_id} joined the ring "
+              f"(ring v{partitioner.version}: {len(transfers)} ranges changed replicas)")
+        
+        settle_ring(transfers)
+        if not catch_up_worker(worker_id, transfers):
+            print(f"⚠ {worker_id} could not catch up from the logs; streaming its ranges again")
+            if not stream_transfers(transfers, repair_max_keys_per_sec, from_primary=True):
+                print(f"✗ Catch-up of {worker_id} after joining the ring failed")
+    finally:
+        with lock:
+            joining.discard(worker_id)
+
+
+def catch_up_worker(worker_id, transfers, copy=True):
+    """
+    Have a joining worker fetch the writes in the ranges it gains from
+    every live replica that held them (worker POST /catch_up). With
+    copy=False the worker only notes where their logs stand.
+    Returns False if the worker could not catch up from some replica.
+    """
+    active = worker_registry.snapshot.active
+    sources = {}
+    for transfer in transfers:
+        if worker_id not in transfer.gained:
+            continue
+        for peer_id in transfer.old_replicas:
+            if peer_id in active:
+                source = sources.setdefault(peer_id, {
+                    'worker_id': peer_id,
+                    'url': worker_registry.get_worker_url(peer_id),
+                    'kind': transfer.kind,
+                    'ranges': []
+                })
+                source['ranges'].append([transfer.start, transfer.end])
+    if not sources:
+        return True
     
-    if not keys_to_recover:
-        print(f"  No keys to recover")
+    try:
+        response = requests.post(f"{worker_registry.get_worker_url(worker_id)}/catch_up",
+                                 json={'sources': list(sources.values()), 'copy': copy},
+                                 timeout=TRANSFER_TIMEOUT)
+        response.raise_for_status()
+        return response.json()['failed'] == 0
+    except (requests.RequestException, KeyError, ValueError) as e:
+        print(f"✗ Catch-up of {worker_id} failed: {str(e)}")
+        return False
+
+
+def apply_membership_change(change):
+    """
+    Apply a ring change (a callable on the partitioner) and diff the ring
+    before and after it
+    """
+    old_ring = partitioner.snapshot
+    change()
+    return diff_rings(old_ring, partitioner.snapshot)
+
+
+def transfer_range(source_url, target_url, ranges, kind='key', max_keys_per_sec=0):
+    """
+    Ask a worker to push every key in a list of [start, end] ranges to
+    another worker, optionally rate limited. Returns the number of keys
+    sent, or None on failure.
+    """
+    try:
+        response = requests.post(
+            f"{source_url}/transfer_range",
+            json={'target': target_url, 'kind': kind, 'ranges': ranges,
+                  'max_keys_per_sec': max_keys_per_sec},
+            timeout=(5, TRANSFER_TIMEOUT)
+        )
+        if response.status_code == 200:
+            return response.json().get('keys_sent', 0)
+    except:
+        pass
+    return None
+
+
+def await_ring(version, worker_ids, timeout=RING_SETTLE_TIMEOUT):
+    """
+    Have workers fetch ring `version` (a /status call carrying it makes
+    them refresh) and wait until they all route with it. Returns the
+    workers that did not confirm before the timeout.
+    """
+    pending = set(worker_ids)
+    deadline = time.time() + timeout
+    while pending:
+        for worker_id in list(pending):
+            worker_url = worker_registry.get_worker_url(worker_id)
+            try:
+                response = requests.get(f"{worker_url}/status", timeout=2,
+                                        headers={RING_VERSION_HEADER: str(version)})
+                if int(response.headers.get(RING_VERSION_HEADER, -1)) >= version:
+                    pending.discard(worker_id)
+            except (requests.RequestException, ValueError):
+                pass
+        if not pending or time.time() >= deadline:
+            break
+        time.sleep(0.2)
+    return pending
+
+
+def catch_up_transfers(transfers, max_keys_per_sec=0):
+    """
+    Second pass of a stream-then-cutover move. Once the workers route with
+    the new ring, stream the moved ranges again from their old primaries:
+    writes accepted under the old ring while the first pass ran, or before
+    the cutover reached every worker, land on the new replicas too. Last
+    writer wins, so keys that already arrived are left as they are.
+    Returns False if any stream failed.
+    """
+    settle_ring(transfers)
+    return stream_transfers(transfers, max_keys_per_sec, from_primary=True)
+
+
+def settle_ring(transfers):
+    """Wait for the workers of some moved ranges to route with the current ring"""
+    workers = {w for transfer in transfers for w in transfer.old_replicas + transfer.new_replicas}
+    late = await_ring(partitioner.version, workers & worker_registry.snapshot.active)
+    if late:
+        print(f"⚠ {', '.join(sorted(late))} did not pick up ring v{partitioner.version} "
+              f"within {RING_SETTLE_TIMEOUT}s; catching up anyway")
+
+
+def range_score(load):
+    """Range load as a fraction of the split thresholds (keys and QPS)"""
+    return load['keys'] / RANGE_SPLIT_MAX_KEYS + load['qps'] / RANGE_SPLIT_MAX_QPS
+
+
+def collect_range_load(ring):
+    """
+    Combine worker-reported range stats into per-range key counts, QPS and
+    split keys. Reports made against another map version are skipped.
+    """
+    with lock:
+        reports = list(range_stats.items())
+    
+    loads = {}  # range start -> {'keys', 'qps', 'split_key'}
+    for worker_id, report in reports:
+        if report.get('ring_version') != ring.version:
+            continue
+        for entry in report.get('ranges', []):
+            start = entry['start']
+            load = loads.setdefault(start, {'keys': 0, 'qps': 0.0, 'split_key': None})
+            # Every replica holds the range, but requests are spread over them
+            load['keys'] = max(load['keys'], entry.get('keys', 0))
+            load['qps'] += entry.get('qps', 0.0)
+            is_primary = ring.get_worker(start) == worker_id
+            if entry.get('split_key') and (is_primary or not load['split_key']):
+                load['split_key'] = entry['split_key']
+    return loads
+
+
+def balance_ranges_once():
+    """
+    One pass of the range balancer: split ranges that are too large or too
+    hot, otherwise move one range off the most loaded worker.
+    """
+    ring = partitioner.snapshot
+    loads = collect_range_load(ring)
+    
+    # Split first; stats for the halves arrive with the next heartbeats
+    split = False
+    for start, load in loads.items():
+        if load['keys'] > RANGE_SPLIT_MAX_KEYS or load['qps'] > RANGE_SPLIT_MAX_QPS:
+            if load['split_key'] and partitioner.split_range(start, load['split_key']):
+                print(f"✂ Split range [{start!r}, …) at {load['split_key']!r} "
+                      f"({load['keys']} keys, {load['qps']:.0f} qps)")
+                split = True
+    if split:
+        return
+    
+    # Per-worker load, normalised by capacity weight
+    active = worker_registry.snapshot.active
+    # Workers serving no range yet count too: they are the best targets
+    worker_load = {w: 0.0 for w in active if partitioner.get_weight(w)}
+    if len(worker_load) < 2:
+        return
+    for start, load in loads.items():
+        for worker_id in ring.get_replicas(start, REPLICATION_FACTOR):
+            if worker_id in worker_load:
+                worker_load[worker_id] += range_score(load)
+    for worker_id in worker_load:
+        worker_load[worker_id] /= partitioner.get_weight(worker_id) or 1.0
+    
+    mean = sum(worker_load.values()) / len(worker_load)
+    hot = max(worker_load, key=worker_load.get)
+    cold = min(worker_load, key=worker_load.get)
+    spread = worker_load[hot] - worker_load[cold]
+    if mean == 0 or spread <= mean * (RANGE_MOVE_IMBALANCE - 1):
+        return
+    
+    # Move the range that best halves the gap between hottest and coldest;
+    # anything at or above the full gap would just swap their roles
+    candidates = [start for start in loads
+                  if hot in ring.get_replicas(start, REPLICATION_FACTOR)
+                  and cold not in ring.get_replicas(start, REPLICATION_FACTOR)
+                  and 0 < range_score(loads[start]) < spread]
+    if not candidates:
         return
+    start = min(candidates, key=lambda s: abs(range_score(loads[s]) - spread / 2))
+    end = ring.range_end(ring.range_index(start))
+    
+    source_url = worker_registry.get_worker_url(hot)
+    target_url = worker_registry.get_worker_url(cold)
     
-    print(f"  Keys to recover: {len(keys_to_recover)}")
-    recovered = 0
-    failed = 0
+    # Stream the data before cutting over so reads never miss
+    if transfer_range(source_url, target_url, [[start, end]]) is None:
+        print(f"✗ Failed to move range [{start!r}, {end!r}) to {cold}")
+        return
+    
+    old_ring = partitioner.snapshot
+    if not partitioner.move_replica(start, hot, cold):
+        return
+    print(f"⇄ Moved range [{start!r}, {end!r}) from {hot} to {cold}")
+    
+    # Then bring over what was written to the old replicas in the meantime
+    if not catch_up_transfers(diff_rings(old_ring, partitioner.snapshot)):
+        print(f"✗ Catch-up of range [{start!r}, {end!r}) on {cold} failed")
+
+
+def balance_ranges():
+    """
+    Background thread that splits and moves ranges based on worker-reported
+    stats (range partitioning only)
+    """
+    print("✓ Range balancer started")
     
-    for key in keys_to_recover:
+    while True:
+        time.sleep(RANGE_BALANCE_INTERVAL)
         try:
-            # Find which workers should have this key
-            with lock:
-                target_replicas = consistent_hash.get_replicas(key, REPLICATION_FACTOR)
-            
-            # Find a surviving worker that has the data
-            source_value = None
-            source_worker = None
-            
-            for replica_id in target_replicas:
-                if replica_id == failed_worker_id:
-                    continue
-                
-                worker_url = worker_registry.get_worker_url(replica_id)
-                if worker_url:
-                    value = get_key_from_worker(worker_url, key)
-                    if value is not None:
-                        source_value = value
-                        source_worker = replica_id
-                        break
-            
-            if source_value is None:
-                print(f"  ✗ Could not find data for key: {key}")
-                failed += 1
-                continue
-            
-            # Count how many replicas currently exist
-            current_replicas = 0
-            for replica_id in target_replicas:
-                if replica_id == failed_worker_id:
-                    continue
-                worker_url = worker_registry.get_worker_url(replica_id)
-                if worker_url:
-                    value = get_key_from_worker(worker_url, key)
-                    if value is not None:
-                        current_replicas += 1
-            
-            # If we have enough replicas, no need to re-replicate
-            if current_replicas >= REPLICATION_FACTOR - 1:
-                recovered += 1
-                continue
-            
-            # Need to create a new replica on a different worker
-            # Find an active worker not in the current replica set
-            with lock:
-                available_workers = [w for w in active_workers 
-                                   if w not in target_replicas]
-            
-            if not available_workers:
-                print(f"  ⚠ No available workers for key: {key}")
-                failed += 1
+            balance_ranges_once()
+        except Exception as e:
+            print(f"✗ Range balancer error: {str(e)}")
+
+
+def token_range_partitions(start, end):
+    """(partition, fraction of it covered) for each hash partition a (start, end] token range overlaps"""
+    width = 1 << (64 - PARTITION_BITS)
+    pieces = [(start, 2 ** 64 - 1), (-1, end)] if start >= end else [(start, end)]
+    for low, high in pieces:
+        # Tokens low+1 .. high
+        for partition in range((low + 1) // width, high // width + 1):
+            first = max(low + 1, partition * width)
+            last = min(high, (partition + 1) * width - 1)
+            if last >= first:
+                yield partition, (last - first + 1) / width
+
+
+def range_load_estimator(worker_id, load, total_keys, total_rate):
+    """
+    Estimate of the share of cluster load a worker holds in any (start, end]
+    token range. Requests come from its hot vnodes where reported; the
+    rest, and keys, are spread over hash partitions by key count.
+    """
+    with lock:
+        counts = list(partition_counts.get(worker_id, [0] * PARTITION_COUNT))
+    hot_vnodes = load.get('hot_vnodes', [])
+    residual = max(request_rate(load) - sum(qps for _, qps in hot_vnodes), 0.0)
+    keys = sum(counts)
+    
+    shares = [(count / total_keys if total_keys else 0.0) +
+              (residual * count / keys / total_rate if keys and total_rate else 0.0)
+              for count in counts]
+    
+    def estimate(start, end):
+        share = sum(shares[p] * fraction for p, fraction in token_range_partitions(start, end))
+        for token, qps in hot_vnodes:
+            inside = start < token <= end if start < end else (token > start or token <= end)
+            if inside and total_rate:
+                share += qps / total_rate
+        return share
+    
+    return estimate
+
+
+def vnode_balance_scores(loads):
+    """
+    Worker load as its share of cluster keys plus its share of cluster
+    requests, divided by its capacity weight
+    """
+    total_keys = sum(load.get('keys', 0) for load in loads.values())
+    total_rate = sum(request_rate(load) for load in loads.values())
+    scores = {}
+    for worker_id, load in loads.items():
+        share = ((load.get('keys', 0) / total_keys if total_keys else 0.0) +
+                 (request_rate(load) / total_rate if total_rate else 0.0))
+        scores[worker_id] = share / (partitioner.get_weight(worker_id) or 1.0)
+    return scores, total_keys, total_rate
+
+
+def plan_vnode_move(ring, hot, cold, scores, range_share):
+    """
+    Pick the hot worker's vnode whose move to the cold worker leaves the
+    lowest peak load among the workers it affects. Returns (token, new
+    ring, transfers, projected scores), or None if no move helps.
+    """
+    # Evaluate the vnodes whose own range carries the most load
+    # (the vnode at index 0 wraps around from the last token)
+    owned = [i for i, owner in enumerate(ring.owners) if owner == hot]
+    owned.sort(key=lambda i: range_share(ring.tokens[i - 1], ring.tokens[i]), reverse=True)
+    tokens = [ring.tokens[i] for i in owned[:VNODE_MOVE_CANDIDATES]]
+    
+    best = None
+    for token in tokens:
+        new_ring = partitioner.preview_move(token, cold)
+        if new_ring is None:
+            continue
+        transfers = diff_rings(ring, new_ring)
+        projected = dict(scores)
+        for transfer in transfers:
+            if hot not in transfer.lost:
                 continue
-            
-            # Replicate to the first available worker
-            new_replica_id = available_workers[0]
-            new_replica_url = worker_registry.get_worker_url(new_replica_id)
-            
-            if replicate_key_to_worker(new_replica_url, key, source_value):
-                print(f"  ✓ Re-replicated {key} to {new_replica_id}")
-                with lock:
-                    worker_keys[new_replica_id].add(key)
-                recovered += 1
-            else:
-                print(f"  ✗ Failed to re-replicate {key}")
-                failed += 1
-                
+            moved = range_share(transfer.start, transfer.end)
+            for worker_id in transfer.lost:
+                if worker_id in projected:
+                    projected[worker_id] -= moved / (partitioner.get_weight(worker_id) or 1.0)
+            for worker_id in transfer.gained:
+                if worker_id in projected:
+                    projected[worker_id] += moved / (partitioner.get_weight(worker_id) or 1.0)
+        peak = max(projected.values())
+        if peak < scores[hot] and (best is None or peak < best[0]):
+            best = (peak, token, new_ring, transfers, projected)
+    
+    return best[1:] if best else None
+
+
+def stream_transfers(transfers, max_keys_per_sec, from_primary=False):
+    """
+    Stream every range in a ring diff from a current replica (the least
+    busy, or the old primary that coordinated its writes if `from_primary`
+    and it is up) to the replicas that gain it. Returns False if any
+    stream failed.
+    """
+    with lock:
+        source_qps = {worker_id: request_rate(load) for worker_id, load in worker_loads.items()}
+    
+    active = worker_registry.snapshot.active
+    streams = {}  # (source_id, target_id, kind) -> [[start, end], ...]
+    for transfer in transfers:
+        if not transfer.gained or not transfer.old_replicas:
+            continue  # nothing moves, or nobody held the range yet
+        sources = [w for w in transfer.old_replicas if w in active]
+        if not sources:
+            return False
+        if from_primary and sources[0] == transfer.old_replicas[0]:
+            source_id = sources[0]
+        else:
+            source_id = min(sources, key=lambda w: source_qps.get(w, 0))
+        for target_id in transfer.gained:
+            streams.setdefault((source_id, target_id, transfer.kind), []).append(
+                [transfer.start, transfer.end])
+    
+    for (source_id, target_id, kind), ranges in streams.items():
+        sent = transfer_range(worker_registry.get_worker_url(source_id),
+                              worker_registry.get_worker_url(target_id),
+                              ranges, kind, max_keys_per_sec)
+        if sent is None:
+            return False
+    return True
+
+
+def rebalance_vnodes_once():
+    """
+    One pass of the vnode rebalancer: while the gap between the most and
+    least loaded workers is too wide, move a vnode from the hottest to the
+    coldest, streaming its data before the ring cuts over and again once
+    the workers route with the new ring
+    """
+    with lock:
+        if any(p.finished_at is None for p in repairs.values()):
+            return  # Repairs come first
+    
+    loads = cluster_load()['workers']
+    loads = {w: load for w, load in loads.items() if partitioner.get_weight(w)}
+    if len(loads) < 2:
+        return
+    
+    scores, total_keys, total_rate = vnode_balance_scores(loads)
+    
+    for _ in range(VNODE_MOVES_PER_PASS):
+        mean = sum(scores.values()) / len(scores)
+        hot = max(scores, key=scores.get)
+        cold = min(scores, key=scores.get)
+        if mean == 0 or scores[hot] - scores[cold] <= mean * (VNODE_MOVE_IMBALANCE - 1):
+            return
+        
+        ring = partitioner.snapshot
+        range_share = range_load_estimator(hot, loads[hot], total_keys, total_rate)
+        plan = plan_vnode_move(ring, hot, cold, scores, range_share)
+        if plan is None:
+            return
+        token, new_ring, transfers, projected = plan
+        
+        # Stream the data before cutting over so reads never miss
+        if not stream_transfers(transfers, VNODE_MOVE_MAX_KEYS_PER_SEC):
+            print(f"✗ Failed to stream vnode {token} to {cold}")
+            return
+        
+        if not partitioner.move_vnode(token, cold, if_version=ring.version):
+            print(f"  Ring changed while moving vnode {token}; retrying next pass")
+            return
+        
+        print(f"⇄ Moved vnode {token} from {hot} to {cold} "
+              f"(ring v{partitioner.version}, load {scores[hot]:.2f} → {projected[hot]:.2f})")
+        
+        # Then bring over what was written to the old replicas in the meantime
+        if not catch_up_transfers(transfers, VNODE_MOVE_MAX_KEYS_PER_SEC):
+            print(f"✗ Catch-up of vnode {token} on {cold} failed")
+        scores = projected
+
+
+def rebalance_vnodes():
+    """
+    Background thread that moves vnodes off overloaded workers based on
+    their heartbeat load reports (hash partitioning only)
+    """
+    print("✓ Vnode rebalancer started")
+    
+    while True:
+        time.sleep(VNODE_REBALANCE_INTERVAL)
+        try:
+            rebalance_vnodes_once()
         except Exception as e:
-            print(f"  ✗ Error recovering {key}: {str(e)}")
-            failed += 1
+            print(f"✗ Vnode rebalancer error: {str(e)}")
+
+
+def metadata_path(directory):
+    """Metadata directories are relative to the repository root"""
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        directory)
+
+
+def apply_metadata_state(state):
+    """
+    Load a metadata snapshot into the ring and registry. Returns the log
+    position each of them now reflects, for apply_metadata_record.
+    """
+    applied = {'ring': 0, 'registry': 0}
+    if state['ring']['ring'].get('method') != PARTITION_METHOD:
+        print(f"⚠ Metadata snapshot uses {state['ring']['ring'].get('method')} partitioning; "
+              f"starting with an empty ring")
+    else:
+        partitioner.restore(state['ring'])
+        applied['ring'] = state['ring']['lsn']
+    worker_registry.restore(state['registry'])
+    applied['registry'] = state['registry']['lsn']
+    return applied
+
+
+def apply_metadata_record(record, applied):
+    """Replay one metadata log record unless its change is already applied"""
+    kind = record.get('kind')
+    if kind not in applied or record['lsn'] <= applied[kind]:
+        return False
+    if kind == 'registry':
+        worker_registry.apply(record['workers'])
+    elif record.get('op') in RING_OPS:
+        getattr(partitioner, record['op'])(**record['args'])
+    else:
+        return False
+    applied[kind] = record['lsn']
+    return True
+
+
+def recover_metadata(directory):
+    """
+    Load the last metadata snapshot and replay the log on top of it, then
+    start logging changes. Active workers get a full heartbeat timeout to
+    check in; unknown workers are told to re-register by their heartbeat.
+    """
+    global metadata_store, term
+    
+    started = time.perf_counter()
+    metadata_store = MetadataStore(metadata_path(directory), METADATA_FSYNC)
+    state, records = metadata_store.load()
+    term = metadata_store.term
+    
+    applied = apply_metadata_state(state) if state else {'ring': 0, 'registry': 0}
+    replayed = sum(apply_metadata_record(record, applied) for record in records)
     
-    print(f"✓ Re-replication complete: {recovered} recovered, {failed} failed")
+    worker_registry.reset_deadlines()
+    partitioner.journal = metadata_store
+    worker_registry.journal = metadata_store
+    
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"✓ Metadata recovered in {elapsed:.1f}ms: ring v{partitioner.version}, "
+          f"{len(worker_registry.workers)} workers, {replayed} log records replayed, term {term}")
+
+
+def checkpoint_metadata():
+    """Snapshot the registry and ring and cut the log back to what follows them"""
+    ring_state = partitioner.to_state()
+    registry_state = worker_registry.to_state()
+    metadata_store.save_snapshot({'ring': ring_state, 'registry': registry_state},
+                                 min(ring_state['lsn'], registry_state['lsn']))
+
+
+def snapshot_metadata():
+    """Background thread that periodically snapshots controller metadata"""
+    while True:
+        time.sleep(METADATA_SNAPSHOT_INTERVAL)
+        try:
+            if metadata_store.pending:
+                checkpoint_metadata()
+        except Exception as e:
+            print(f"✗ Metadata snapshot error: {str(e)}")
 
 
 def monitor_workers():
     """
     Background thread to monitor worker health
-    Runs continuously and checks for failed workers
+    Sleeps until the earliest heartbeat deadline passes, then handles the
+    workers that failed
     """
-    print("✓ Worker health monitor started")
+    print(f"✓ Worker health monitor started ({FAILURE_DETECTOR} detector)")
     
     while True:
-        time.sleep(HEARTBEAT_INTERVAL)
-        
-        with lock:
-            failed_workers = worker_registry.check_failed_workers()
+        failed_workers = worker_registry.wait_for_failures()
         
         if failed_workers:
             for worker_id in failed_workers:
                 print(f"⚠ Worker failed: {worker_id}")
-                # Start re-replication in a separate thread
-                replication_thread = threading.Thread(
-                    target=handle_worker_failure,
-                    args=(worker_id,),
-                    daemon=True
-                )
-                replication_thread.start()
+                retire_worker(worker_id)
+
+
+def retire_worker(worker_id):
+    """Take a worker that was marked failed off the ring and re-replicate its ranges"""
+    with lock:
+        counts = partition_counts.pop(worker_id, None)
+        worker_loads.pop(worker_id, None)
+    # Take the worker off the ring; the diff says which ranges moved
+    transfers = apply_membership_change(
+        lambda: partitioner.remove_worker(worker_id))
+    print(f"  Ring v{partitioner.version}: {len(transfers)} ranges changed replicas")
+    # Start re-replication in a separate thread
+    replication_thread = threading.Thread(
+        target=handle_worker_failure,
+        args=(worker_id, transfers, sum(counts) if counts else 0),
+        daemon=True
+    )
+    replication_thread.start()
+
 
+def follow_primary():
+    """
+    Standby thread: long-poll the primary's metadata log and replay it so
+    the ring and registry stay warm. Promotes this controller once the
+    primary has been unreachable for STANDBY_TAKEOVER_TIMEOUT seconds.
+    A primary answering with a lower term than one already seen was
+    deposed; its log is not applied.
+    """
+    global standby_applied, term
+    
+    print(f"✓ Following primary controller at {primary_url}")
+    cursor = None  # primary's log position to read after (None = need a snapshot)
+    last_contact = time.time()
+    
+    while role == 'standby':
+        try:
+            params = {'wait': STANDBY_POLL_WAIT}
+            if cursor is not None:
+                params['after'] = cursor
+            response = requests.get(f"{primary_url}{CONTROLLER_METADATA_LOG_ENDPOINT}",
+                                    params=params, timeout=STANDBY_POLL_WAIT + 5,
+                                    headers={CONTROLLER_TERM_HEADER: str(term)})
+            leader_term = controller_term(response)
+            if leader_term is not None and leader_term < term:
+                print(f"⚠ Ignoring metadata log of a deposed primary: term {leader_term} < {term}")
+                time.sleep(STANDBY_POLL_WAIT)
+                continue
+            last_contact = time.time()
+            term = max(term, leader_term or 0)
+            if response.status_code != 200:
+                print(f"⚠ Primary refused its metadata log: {response.status_code} "
+                      f"{response.json().get('error')}")
+                time.sleep(STANDBY_POLL_WAIT)
+                continue
+            data = response.json()
+            
+            with role_lock:
+                if role != 'standby':
+                    break
+                if 'snapshot' in data:
+                    standby_applied = apply_metadata_state(data['snapshot'])
+                    cursor = min(standby_applied.values())
+                    print(f"✓ Standby loaded primary snapshot: ring v{partitioner.version}, "
+                          f"{len(worker_registry.workers)} workers")
+                for record in data.get('records', []):
+                    apply_metadata_record(record, standby_applied)
+                    cursor = record['lsn']
+                    
+        except requests.RequestException as e:
+            silent = time.time() - last_contact
+            if cursor is None:
+                # Never synced: taking over would serve an empty ring
+                print(f"⚠ Waiting for primary controller: {str(e)}")
+            elif STANDBY_TAKEOVER_TIMEOUT and silent >= STANDBY_TAKEOVER_TIMEOUT:
+                promote(f"primary unreachable for {silent:.0f}s")
+                break
+            time.sleep(1)
+        except Exception as e:
+            print(f"✗ Standby replication error: {str(e)}")
+            time.sleep(1)
 
-def start_controller():
-    """Start the controller server"""
+
+def promote(reason):
+    """
+    Turn a standby into the primary: start a new term above every term seen
+    (persisted before anything is served under it), start its own metadata
+    log from the state it mirrored, give every active worker a full
+    heartbeat timeout and start the primary's background threads. Returns
+    False if this controller already is the primary.
+    """
+    global role, metadata_store, term
+    
+    with role_lock:
+        if role == 'primary':
+            return False
+        
+        new_term = term + 1
+        if metadata_dir:
+            # Continue the primary's numbering so the log positions stay comparable
+            lsn = max(standby_applied.values())
+            state = {'ring': partitioner.to_state(), 'registry': worker_registry.to_state()}
+            state['ring']['lsn'] = state['registry']['lsn'] = lsn
+            store = MetadataStore(metadata_path(metadata_dir), METADATA_FSYNC)
+            new_term = max(new_term, store.term + 1)
+            store.save_term(new_term)
+            store.reset(state, lsn)
+            metadata_store = store
+            partitioner.journal = store
+            worker_registry.journal = store
+        term = new_term
+        role = 'primary'
+        
+        worker_registry.reset_deadlines()
+    
+    print(f"⚡ Promoted to primary ({reason}): term {term}, ring v{partitioner.version}, "
+          f"{len(worker_registry.snapshot.active)} active workers")
+    start_background_tasks()
+    return True
+
+
+def start_background_tasks():
+    """Start the threads only the primary runs"""
+    if metadata_store is not None:
+        snapshot_thread = threading.Thread(target=snapshot_metadata, daemon=True)
+        snapshot_thread.start()
+    
+    # Start health monitoring thread
+    monitor_thread = threading.Thread(target=monitor_workers, daemon=True)
+    monitor_thread.start()
+    
+    if PARTITION_METHOD == 'range':
+        balancer_thread = threading.Thread(target=balance_ranges, daemon=True)
+        balancer_thread.start()
+    elif VNODE_REBALANCE_INTERVAL:
+        rebalancer_thread = threading.Thread(target=rebalance_vnodes, daemon=True)
+        rebalancer_thread.start()
+
+
+def find_newer_primary(port):
+    """URL of another controller in CONTROLLER_URLS that is the primary in a higher term, if any"""
+    for url in CONTROLLER_URLS:
+        if url.rstrip('/').endswith(f":{port}"):
+            continue  # ourselves
+        try:
+            status = requests.get(f"{url}/status", timeout=2).json()
+        except (requests.RequestException, ValueError):
+            continue
+        if status.get('role') == 'primary' and status.get('term', 0) > term:
+            print(f"⚠ {url} is the primary in term {status['term']} (ours is {term})")
+            return url
+    return None
+
+
+def step_down(url):
+    """Become a standby of the controller at `url`, dropping our own metadata log"""
+    global role, primary_url, metadata_store
+    if metadata_store is not None:
+        metadata_store.close()
+        metadata_store = None
+    partitioner.journal = None
+    worker_registry.journal = None
+    role = 'standby'
+    primary_url = url.rstrip('/')
+    print(f"✓ Starting as a standby of {primary_url}")
+    follower_thread = threading.Thread(target=follow_primary, daemon=True)
+    follower_thread.start()
+
+
+def start_controller(port=CONTROLLER_PORT, standby_of=None, directory=METADATA_DIR):
+    """
+    Start the controller server, as the primary or as a hot standby of the
+    controller at `standby_of`
+    """
+    global role, primary_url, metadata_dir
+    metadata_dir = directory
+    
     print("=" * 60)
     print("🚀 Starting Distributed KV Store Controller")
     print("=" * 60)
-    print(f"Controller URL: http://{CONTROLLER_HOST}:{CONTROLLER_PORT}")
+    print(f"Controller URL: http://{CONTROLLER_HOST}:{port}")
+    print(f"Role: {'standby of ' + standby_of if standby_of else 'primary'}")
     print(f"Replication Factor: {REPLICATION_FACTOR}")
+    print(f"Partitioning: {PARTITION_METHOD}")
     print(f"Expected Workers: {NUM_WORKERS}")
     print(f"Heartbeat Timeout: {HEARTBEAT_TIMEOUT}s")
+    print(f"Failure Detector: {FAILURE_DETECTOR}")
+    print(f"Membership: {MEMBERSHIP}")
     print("=" * 60)
     
-    # Start health monitoring thread
-    monitor_thread = threading.Thread(target=monitor_workers, daemon=True)
-    monitor_thread.start()
+    if standby_of:
+        role = 'standby'
+        primary_url = standby_of.rstrip('/')
+        follower_thread = threading.Thread(target=follow_primary, daemon=True)
+        follower_thread.start()
+    else:
+        if metadata_dir:
+            recover_metadata(metadata_dir)
+        newer = find_newer_primary(port)
+        if newer:
+            # We were failed over while down: follow the new primary instead
+            step_down(newer)
+        else:
+            start_background_tasks()
     
     # Start Flask server
-    app.run(host=CONTROLLER_HOST, port=CONTROLLER_PORT, debug=False)
+    app.run(host=CONTROLLER_HOST, port=port, debug=False)
 
 
 if __name__ == '__main__':
-    start_controller()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Distributed KV Store controller')
+    parser.add_argument('--standby', nargs='?', const=CONTROLLER_URLS[0], metavar='PRIMARY_URL',
+                        help='run as a hot standby of the primary controller '
+                             f'(default {CONTROLLER_URLS[0]})')
+    parser.add_argument('--port', type=int,
+                        help=f'port to listen on (default {CONTROLLER_PORT}, '
+                             f'or {STANDBY_CONTROLLER_PORT} for a standby)')
+    parser.add_argument('--metadata-dir',
+                        help=f'metadata directory, relative to the repository root '
+                             f'(default {METADATA_DIR}, or {STANDBY_METADATA_DIR} '
+                             f'for a standby; empty disables persistence)')
+    args = parser.parse_args()
+    
+    if args.port is None:
+        args.port = STANDBY_CONTROLLER_PORT if args.standby else CONTROLLER_PORT
+    if args.metadata_dir is None:
+        args.metadata_dir = STANDBY_METADATA_DIR if args.standby else METADATA_DIR
+    start_controller(args.port, args.standby, args.metadata_dir)
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class MetadataStore:
+    """
+    Durable controller metadata: a write-ahead log of registry and ring
+    changes plus periodic snapshots. Each change is appended (and fsynced)
+    before the request that made it returns; a snapshot lets the log be
+    cut back so recovery only replays the changes made since. It also
+    keeps the controller's failover term, which only ever grows.
+    """
+    
+    SNAPSHOT_FILE = 'snapshot.json'
+    LOG_FILE = 'wal.log'
+    TERM_FILE = 'term'
+    
+    def __init__(self, directory: str, fsync: bool = True):
+        self.directory = directory
+        self.fsync = fsync
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_FILE)
+        self.log_path = os.path.join(directory, self.LOG_FILE)
+        self.term_path = os.path.join(directory, self.TERM_FILE)
+        self.lsn = 0  # sequence number of the last record appended
+        self.tail = []  # (lsn, line) of every record still in the log
+        self.base_lsn = 0  # sequence number the snapshot covers; older records are gone
+        self._log = None
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        os.makedirs(directory, exist_ok=True)
+        
+        self.term = 0  # failover term, bumped by every promotion to primary
+        if os.path.exists(self.term_path):
+            with open(self.term_path) as f:
+                self.term = int(f.read())
+    
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+    
+    def load(self) -> Tuple[Optional[Dict], List[Dict]]:
+        """
+        Read the latest snapshot and the logged records, then open the log
+        for appending. A torn record at the end of the log (a crash mid
+        write) is dropped.
+        """
+        with self._lock:
+            state = None
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path) as f:
+                    state = json.load(f)
+            
+            records = []
+            valid_bytes = 0
+            if os.path.exists(self.log_path):
+                with open(self.log_path, 'rb') as f:
+                    for raw in f:
+                        try:
+                            record = json.loads(raw)
+                        except ValueError:
+                            break
+                        if not raw.endswith(b'\n'):
+                            break
+                        records.append(record)
+                        self.tail.append((record['lsn'], raw.decode().rstrip('\n')))
+                        valid_bytes += len(raw)
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(valid_bytes)
+            
+            self.base_lsn = (state or {}).get('lsn', 0)
+            self.lsn = max([record['lsn'] for record in records] + [self.base_lsn])
+            self._log = open(self.log_path, 'a')
+            return state, records
+    
+    def append(self, record: Dict) -> int:
+        """Durably log one change; returns its sequence number (unchanged if the write fails)"""
+        with self._lock:
+            lsn = self.lsn + 1
+            line = json.dumps(dict(record, lsn=lsn), separators=(',', ':'))
+            self._log.write(line + '\n')
+            self._sync(self._log)
+            self.lsn = lsn
+            self.tail.append((self.lsn, line))
+            self._appended.notify_all()
+            return self.lsn
+    
+    def save_snapshot(self, state: Dict, covered_lsn: int):
+        """
+        Atomically replace the snapshot, then rewrite the log without the
+        records at or below `covered_lsn` (those already in the snapshot)
+        """
+        with self._lock:
+            state = dict(state, lsn=covered_lsn)
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f, separators=(',', ':'))
+                self._sync(f)
+            os.replace(tmp_path, self.snapshot_path)
+            
+            self.tail = [(lsn, line) for lsn, line in self.tail if lsn > covered_lsn]
+            tmp_path = self.log_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                for _, line in self.tail:
+                    f.write(line + '\n')
+                self._sync(f)
+            self._log.close()
+            os.replace(tmp_path, self.log_path)
+            self._log = open(self.log_path, 'a')
+            self.base_lsn = covered_lsn
+    
+    def reset(self, state: Dict, lsn: int):
+        """
+        Start over from `state` (covering everything up to `lsn`), e.g. when a
+        standby that followed another controller's log takes over
+        """
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+            # Empty the log first so a crash never pairs old records with the new snapshot
+            with open(self.log_path, 'w') as f:
+                self._sync(f)
+            self._log = open(self.log_path, 'a')
+            self.tail = []
+            self.lsn = lsn
+        self.save_snapshot(state, lsn)
+    
+    def save_term(self, term: int):
+        """Durably record a new failover term; it never goes backwards"""
+        with self._lock:
+            if term <= self.term:
+                raise ValueError(f"Term {term} does not follow {self.term}")
+            tmp_path = self.term_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(str(term))
+                self._sync(f)
+            os.replace(tmp_path, self.term_path)
+            self.term = term
+    
+    def close(self):
+        """Stop logging, e.g. when a restarted controller steps down to standby"""
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+    
+    def records_after(self, lsn: int, wait: float = 0) -> Optional[List[str]]:
+        """
+        Logged records (as JSON lines) with a sequence number above `lsn`,
+        waiting up to `wait` seconds for one to be appended. Returns None
+        if some of them were already compacted into the snapshot.
+        """
+        with self._appended:
+            if not self.base_lsn <= lsn <= self.lsn:
+                return None  # compacted, or a cursor from a different log
+            if self.lsn <= lsn and wait > 0:
+                self._appended.wait_for(lambda: self.lsn > lsn, wait)
+                if not self.base_lsn <= lsn <= self.lsn:
+                    return None
+            return [line for record_lsn, line in self.tail if record_lsn > lsn]
+    
+    @property
+    def pending(self) -> int:
+        """Records in the log that a new snapshot would absorb"""
+        return len(self.tail)
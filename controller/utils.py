@@ -1,146 +1,991 @@
-import hashlib
+import bisect
+import heapq
+import math
+import threading
 import time
-from typing import List, Dict, Optional
+import sys
+import os
+from array import array
+from collections import deque
+from statistics import NormalDist
+from typing import List, Dict, NamedTuple, Optional, Sequence, Tuple
 
-class ConsistentHash:
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routing import (RangeSnapshot, RingFormatError, RingSnapshot, decode_ring, encode_ring,
+                     hash_key, walk_replicas)
+
+
+class Journaled:
+    """
+    State whose changes are appended to the controller's metadata log.
+    `journal` is a MetadataStore, set once recovered state has been replayed.
+    """
+    
+    journal = None
+    
+    def _log(self, record: Dict):
+        """
+        Log a change before it is applied (caller holds the write lock, so
+        log order is apply order). If the append fails the change is not
+        applied, so nothing is ever served that a restart would lose.
+        """
+        if self.journal is not None:
+            self.journal.append(record)
+    
+    def _journal_position(self) -> int:
+        """Sequence number up to which this object's logged changes are applied (caller holds the write lock)"""
+        return self.journal.lsn if self.journal is not None else 0
+
+
+class ConsistentHash(Journaled):
     """Consistent hashing implementation for key partitioning"""
     
-    def __init__(self, num_workers: int, virtual_nodes: int = 150):
+    def __init__(self, num_workers: int, virtual_nodes: int = 150,
+                 replication_factor: int = 3, history_size: int = 16):
         self.num_workers = num_workers
         self.virtual_nodes = virtual_nodes
-        self.ring = {}  # hash_value -> worker_id
-        self.sorted_keys = []
+        self.replication_factor = replication_factor
+        # Current ring; replaced (never mutated) on every membership change
+        self.snapshot = RingSnapshot.build(0, array('Q'), [], replication_factor)
+        self.history = deque([self.snapshot], maxlen=history_size)  # recent rings
+        self.weights = {}  # worker_id -> capacity weight
+        self.adopted = {}  # worker_id -> tokens moved to it by the rebalancer
+        self._write_lock = threading.Lock()
         
     def _hash(self, key: str) -> int:
         """Generate hash value for a key"""
-        return int(hashlib.md5(key.encode()).hexdigest(), 16)
-    
-    def add_worker(self, worker_id: str):
-        """Add a worker to the hash ring"""
-        for i in range(self.virtual_nodes):
-            virtual_key = f"{worker_id}:vnode{i}"
-            hash_val = self._hash(virtual_key)
-            self.ring[hash_val] = worker_id
-        
-        # Keep sorted list of hash values for binary search
-        self.sorted_keys = sorted(self.ring.keys())
+        return hash_key(key)
     
-    def remove_worker(self, worker_id: str):
-        """Remove a worker from the hash ring"""
-        for i in range(self.virtual_nodes):
-            virtual_key = f"{worker_id}:vnode{i}"
-            hash_val = self._hash(virtual_key)
-            if hash_val in self.ring:
-                del self.ring[hash_val]
-        
-        self.sorted_keys = sorted(self.ring.keys())
+    @property
+    def version(self) -> int:
+        """Version of the current ring snapshot"""
+        return self.snapshot.version
     
-    def get_worker(self, key: str) -> Optional[str]:
-        """Get the primary worker responsible for a key"""
-        if not self.ring:
-            return None
+    def _publish(self, snapshot: RingSnapshot):
+        """Swap in a new ring and remember it for diffing"""
+        self.snapshot = snapshot
+        self.history.append(snapshot)
+    
+    def get_snapshot(self, version: int) -> Optional[RingSnapshot]:
+        """A recent ring by version, if it is still in the history"""
+        for snapshot in self.history:
+            if snapshot.version == version:
+                return snapshot
+        return None
+    
+    def vnode_count(self, weight: float) -> int:
+        """Number of virtual nodes for a capacity weight (at least one)"""
+        if not (math.isfinite(weight) and weight > 0):
+            raise ValueError(f"Invalid weight: {weight}")
+        return max(1, int(round(self.virtual_nodes * weight)))
+    
+    def get_weight(self, worker_id: str) -> Optional[float]:
+        """Capacity weight of a worker on the ring"""
+        return self.weights.get(worker_id)
+    
+    def _vnode_tokens(self, worker_id: str, start: int, stop: int) -> List[int]:
+        """Sorted ring tokens of a worker's virtual nodes start..stop-1"""
+        return sorted(self._hash(f"{worker_id}:vnode{i}")
+                      for i in range(start, stop))
+    
+    def _patched(self, old: RingSnapshot, tokens: array, owners: List[str],
+                 table: List, changed: List[int]) -> RingSnapshot:
+        """
+        Patch the replica table around changed positions and return the
+        next snapshot. Only entries whose clockwise walk reaches a changed
+        position are recomputed.
+        """
+        width = min(self.replication_factor, len(set(owners)))
         
-        key_hash = self._hash(key)
+        if width != old.width or not tokens:
+            return RingSnapshot.build(old.version + 1, tokens, owners,
+                                      self.replication_factor)
         
-        # Find the first worker clockwise from the key's position
-        for ring_hash in self.sorted_keys:
-            if ring_hash >= key_hash:
-                return self.ring[ring_hash]
+        n = len(tokens)
+        for pos in changed:
+            pos %= n
+            table[pos] = walk_replicas(owners, pos, width)
+            # Walk counter-clockwise while fewer than `width` distinct owners
+            # sit between the entry and the change: those walks cross it.
+            seen = set()
+            for step in range(1, n):
+                idx = (pos - step) % n
+                seen.add(owners[idx])
+                if len(seen) >= width:
+                    break
+                replicas = walk_replicas(owners, idx, width)
+                table[idx] = replicas if replicas != table[idx] else table[idx]
         
-        # Wrap around to the first worker
-        return self.ring[self.sorted_keys[0]]
+        return RingSnapshot(old.version + 1, tokens, owners, table,
+                            self.replication_factor)
     
-    def get_replicas(self, key: str, num_replicas: int) -> List[str]:
-        """Get the list of workers for replicas (including primary)"""
-        if not self.ring or num_replicas <= 0:
-            return []
+    def _with_tokens(self, old: RingSnapshot, worker_id: str,
+                     new_tokens: List[int]) -> RingSnapshot:
+        """Merge a worker's sorted vnode tokens into the ring"""
+        tokens, owners, table = array('Q'), [], []
+        inserted = []
+        prev = 0
+        for token in new_tokens:
+            pos = bisect.bisect_left(old.tokens, token, prev)
+            if pos < len(old.tokens) and old.tokens[pos] == token:
+                continue  # hash collision with an existing vnode
+            tokens.extend(old.tokens[prev:pos])
+            owners.extend(old.owners[prev:pos])
+            table.extend(old.replica_table[prev:pos])
+            inserted.append(len(tokens))
+            tokens.append(token)
+            owners.append(worker_id)
+            table.append(None)
+            prev = pos
+        tokens.extend(old.tokens[prev:])
+        owners.extend(old.owners[prev:])
+        table.extend(old.replica_table[prev:])
         
-        key_hash = self._hash(key)
-        replicas = []
-        seen_workers = set()
+        return self._patched(old, tokens, owners, table, inserted)
+    
+    def _without_tokens(self, old: RingSnapshot, worker_id: str,
+                        gone_tokens: List[int]) -> RingSnapshot:
+        """Drop a worker's sorted vnode tokens from the ring"""
+        tokens, owners, table = array('Q'), [], []
+        removed = []
+        prev = 0
+        for token in gone_tokens:
+            pos = bisect.bisect_left(old.tokens, token, prev)
+            if (pos >= len(old.tokens) or old.tokens[pos] != token or
+                    old.owners[pos] != worker_id):
+                continue
+            tokens.extend(old.tokens[prev:pos])
+            owners.extend(old.owners[prev:pos])
+            table.extend(old.replica_table[prev:pos])
+            # The gap left behind sits just before the next kept token
+            removed.append(len(tokens))
+            prev = pos + 1
+        tokens.extend(old.tokens[prev:])
+        owners.extend(old.owners[prev:])
+        table.extend(old.replica_table[prev:])
         
-        # Start from the key position and go clockwise
-        start_idx = 0
-        for i, ring_hash in enumerate(self.sorted_keys):
-            if ring_hash >= key_hash:
-                start_idx = i
-                break
+        return self._patched(old, tokens, owners, table, removed)
+    
+    def _with_owner(self, old: RingSnapshot, token: int,
+                    worker_id: str) -> Optional[RingSnapshot]:
+        """Hand one vnode token to another worker; None if the token is not on the ring"""
+        pos = bisect.bisect_left(old.tokens, token)
+        if pos >= len(old.tokens) or old.tokens[pos] != token:
+            return None
+        owners = list(old.owners)
+        owners[pos] = worker_id
+        return self._patched(old, old.tokens, owners, list(old.replica_table), [pos])
+    
+    def preview_move(self, token: int, worker_id: str) -> Optional[RingSnapshot]:
+        """The ring that move_vnode would publish, without publishing it"""
+        return self._with_owner(self.snapshot, token, worker_id)
+    
+    def preview_add(self, worker_id: str, weight: float = 1.0) -> RingSnapshot:
+        """The ring that add_worker would publish, without publishing it"""
+        return self._with_tokens(self.snapshot, worker_id,
+                                 self._vnode_tokens(worker_id, 0, self.vnode_count(weight)))
+    
+    def move_vnode(self, token: int, worker_id: str,
+                   if_version: Optional[int] = None) -> bool:
+        """
+        Move one vnode to another worker on the ring. With `if_version` the
+        move only happens if the ring is still at that version (its data was
+        streamed for that ring). Returns whether the ring changed.
+        """
+        with self._write_lock:
+            if worker_id not in self.weights:
+                return False
+            if if_version is not None and self.snapshot.version != if_version:
+                return False
+            
+            old = self.snapshot
+            new = self._with_owner(old, token, worker_id)
+            if new is None:
+                return False
+            previous_owner = old.owners[bisect.bisect_left(old.tokens, token)]
+            if previous_owner == worker_id:
+                return False
+            
+            self._log({'kind': 'ring', 'op': 'move_vnode',
+                       'args': {'token': token, 'worker_id': worker_id}})
+            self._publish(new)
+            self.adopted.get(previous_owner, set()).discard(token)
+            self.adopted.setdefault(worker_id, set()).add(token)
+            return True
+    
+    def add_worker(self, worker_id: str, weight: float = 1.0):
+        """Add a worker to the hash ring with vnodes proportional to its weight"""
+        with self._write_lock:
+            if worker_id in self.weights:
+                return
+            
+            count = self.vnode_count(weight)
+            new = self._with_tokens(self.snapshot, worker_id,
+                                    self._vnode_tokens(worker_id, 0, count))
+            self._log({'kind': 'ring', 'op': 'add_worker',
+                       'args': {'worker_id': worker_id, 'weight': weight}})
+            self._publish(new)
+            self.weights[worker_id] = weight
+    
+    def remove_worker(self, worker_id: str):
+        """Remove a worker from the hash ring"""
+        with self._write_lock:
+            if worker_id not in self.weights:
+                return
+            
+            count = self.vnode_count(self.weights[worker_id])
+            # Its own vnodes plus any the rebalancer moved to it
+            tokens = sorted(set(self._vnode_tokens(worker_id, 0, count)) |
+                            self.adopted.get(worker_id, set()))
+            new = self._without_tokens(self.snapshot, worker_id, tokens)
+            self._log({'kind': 'ring', 'op': 'remove_worker', 'args': {'worker_id': worker_id}})
+            self._publish(new)
+            del self.weights[worker_id]
+            self.adopted.pop(worker_id, None)
+    
+    def _reweighted(self, old: RingSnapshot, worker_id: str,
+                    weight: float) -> RingSnapshot:
+        """
+        The ring with a worker's vnode count changed for a new weight. Only
+        the vnodes above the smaller of the old and new counts move, so most
+        keys keep their owners.
+        """
+        old_count = self.vnode_count(self.weights[worker_id])
+        new_count = self.vnode_count(weight)
         
-        # Collect unique workers
-        idx = start_idx
-        while len(replicas) < num_replicas and len(seen_workers) < len(set(self.ring.values())):
-            worker_id = self.ring[self.sorted_keys[idx % len(self.sorted_keys)]]
-            if worker_id not in seen_workers:
-                replicas.append(worker_id)
-                seen_workers.add(worker_id)
-            idx += 1
+        if new_count > old_count:
+            return self._with_tokens(old, worker_id,
+                                     self._vnode_tokens(worker_id, old_count, new_count))
+        if new_count < old_count:
+            return self._without_tokens(old, worker_id,
+                                        self._vnode_tokens(worker_id, new_count, old_count))
+        return old
+    
+    def preview_set_weight(self, worker_id: str, weight: float) -> Optional[RingSnapshot]:
+        """The ring that set_weight would publish, without publishing it (None if the worker is not on the ring)"""
+        if worker_id not in self.weights:
+            return None
+        return self._reweighted(self.snapshot, worker_id, weight)
+    
+    def set_weight(self, worker_id: str, weight: float,
+                   if_version: Optional[int] = None) -> bool:
+        """
+        Change a worker's capacity weight. With `if_version` the change only
+        happens if the ring is still at that version (the data of the vnodes
+        that move was streamed for that ring). Returns False if the worker is
+        not on the ring or the ring has moved on.
+        """
+        with self._write_lock:
+            if worker_id not in self.weights:
+                return False
+            if if_version is not None and self.snapshot.version != if_version:
+                return False
+            
+            new = self._reweighted(self.snapshot, worker_id, weight)
+            self._log({'kind': 'ring', 'op': 'set_weight',
+                       'args': {'worker_id': worker_id, 'weight': weight}})
+            if new is not self.snapshot:
+                self._publish(new)
+            self.weights[worker_id] = weight
+            return True
+    
+    def to_state(self) -> Dict:
+        """Ring, weights and moved vnodes for a metadata snapshot"""
+        with self._write_lock:
+            return {
+                'lsn': self._journal_position(),
+                'ring': encode_ring(self.snapshot, {}),
+                'weights': dict(self.weights),
+                'adopted': {worker_id: sorted(tokens)
+                            for worker_id, tokens in self.adopted.items() if tokens}
+            }
+    
+    def restore(self, state: Dict):
+        """
+        Load the ring from a metadata snapshot. A ring saved with another
+        token width is rebuilt from the weights under a new version, so
+        routers fetch it again; moved vnodes go back to their workers.
+        """
+        with self._write_lock:
+            self.weights = dict(state['weights'])
+            self.adopted = {worker_id: set(tokens)
+                            for worker_id, tokens in state['adopted'].items()}
+            try:
+                ring, _ = decode_ring(state['ring'])
+            except RingFormatError as e:
+                print(f"⚠ {e}; rebuilding the ring from the worker weights")
+                ring = self._rebuilt(state['ring']['version'] + 1)
+                self.adopted = {}
+            self.snapshot = ring
+            self.history = deque([ring], maxlen=self.history.maxlen)
+    
+    def _rebuilt(self, version: int) -> RingSnapshot:
+        """A ring built from scratch from the current weights"""
+        vnodes = sorted((token, worker_id) for worker_id, weight in self.weights.items()
+                        for token in self._vnode_tokens(worker_id, 0, self.vnode_count(weight)))
+        return RingSnapshot.build(version, array('Q', [token for token, _ in vnodes]),
+                                  [worker_id for _, worker_id in vnodes], self.replication_factor)
+    
+    def get_worker(self, key: str) -> Optional[str]:
+        """Get the primary worker responsible for a key"""
+        return self.snapshot.get_worker(key)
+    
+    def get_replicas(self, key: str, num_replicas: int) -> Tuple[str, ...]:
+        """Get the workers for replicas (including primary), in ring order"""
+        return self.snapshot.get_replicas(key, num_replicas)
+    
+    def get_replicas_many(self, keys: Sequence[str],
+                          num_replicas: int) -> List[Tuple[str, ...]]:
+        """Get the replica sets for many keys in one pass"""
+        return self.snapshot.get_replicas_many(keys, num_replicas)
+
+
+
+class RangePartitioner(Journaled):
+    """
+    Ordered range partitioning: the key space is split into contiguous
+    ranges, each with its own replica set. Ranges are split and moved by
+    the controller as they grow or get hot.
+    """
+    
+    def __init__(self, replication_factor: int = 3, history_size: int = 16):
+        self.replication_factor = replication_factor
+        # Current range map; replaced (never mutated) on every change
+        self.snapshot = RangeSnapshot(0, [''], [()], replication_factor)
+        self.history = deque([self.snapshot], maxlen=history_size)  # recent maps
+        self.weights = {}  # worker_id -> capacity weight
+        self._write_lock = threading.Lock()
+    
+    @property
+    def version(self) -> int:
+        """Version of the current range map"""
+        return self.snapshot.version
+    
+    def get_weight(self, worker_id: str) -> Optional[float]:
+        """Capacity weight of a worker"""
+        return self.weights.get(worker_id)
+    
+    def _publish(self, bounds: List[str], replica_sets: List[Tuple[str, ...]]):
+        """Swap in the next range map and remember it for diffing"""
+        self.snapshot = RangeSnapshot(self.snapshot.version + 1, bounds,
+                                      replica_sets, self.replication_factor)
+        self.history.append(self.snapshot)
+    
+    def get_snapshot(self, version: int) -> Optional[RangeSnapshot]:
+        """A recent range map by version, if it is still in the history"""
+        for snapshot in self.history:
+            if snapshot.version == version:
+                return snapshot
+        return None
+    
+    def _filled(self, replica_sets: List[Tuple[str, ...]],
+                weights: Optional[Dict[str, float]] = None) -> List[Tuple[str, ...]]:
+        """
+        Top up under-replicated ranges with the workers holding the fewest
+        range replicas per unit of weight. Fully replicated ranges are left
+        alone so no data silently changes owner.
+        """
+        weights = self.weights if weights is None else weights
+        width = min(self.replication_factor, len(weights))
+        slots = {worker_id: 0 for worker_id in weights}
+        for replicas in replica_sets:
+            for worker_id in replicas:
+                slots[worker_id] += 1
         
-        return replicas
+        filled = []
+        for replicas in replica_sets:
+            replicas = list(replicas)
+            while len(replicas) < width:
+                candidate = min((w for w in weights if w not in replicas),
+                                key=lambda w: slots[w] / weights[w])
+                replicas.append(candidate)
+                slots[candidate] += 1
+            filled.append(tuple(replicas))
+        return filled
+    
+    def add_worker(self, worker_id: str, weight: float = 1.0):
+        """Add a worker; it joins ranges that are short of replicas"""
+        with self._write_lock:
+            if worker_id in self.weights:
+                return
+            weights = dict(self.weights, **{worker_id: weight})
+            old = self.snapshot
+            replica_sets = self._filled(old.replica_sets, weights)
+            self._log({'kind': 'ring', 'op': 'add_worker',
+                       'args': {'worker_id': worker_id, 'weight': weight}})
+            self.weights = weights
+            self._publish(old.bounds, replica_sets)
+    
+    def preview_add(self, worker_id: str, weight: float = 1.0) -> RangeSnapshot:
+        """The range map that add_worker would publish, without publishing it"""
+        old = self.snapshot
+        return RangeSnapshot(old.version + 1, old.bounds,
+                             self._filled(old.replica_sets, dict(self.weights, **{worker_id: weight})),
+                             self.replication_factor)
+    
+    def remove_worker(self, worker_id: str):
+        """Remove a worker and re-fill the ranges it served"""
+        with self._write_lock:
+            if worker_id not in self.weights:
+                return
+            weights = {w: weight for w, weight in self.weights.items() if w != worker_id}
+            old = self.snapshot
+            replica_sets = [tuple(w for w in replicas if w != worker_id)
+                            for replicas in old.replica_sets]
+            replica_sets = (self._filled(replica_sets, weights) if weights
+                            else [() for _ in replica_sets])
+            self._log({'kind': 'ring', 'op': 'remove_worker', 'args': {'worker_id': worker_id}})
+            self.weights = weights
+            self._publish(old.bounds, replica_sets)
+    
+    def preview_set_weight(self, worker_id: str, weight: float) -> Optional[RangeSnapshot]:
+        """The map after set_weight (unchanged: ranges do not move), or None if the worker holds none"""
+        return self.snapshot if worker_id in self.weights else None
+    
+    def set_weight(self, worker_id: str, weight: float,
+                   if_version: Optional[int] = None) -> bool:
+        """
+        Change a worker's capacity weight. Ranges are not moved here; the
+        range balancer uses weights when it picks move targets. Returns
+        False if the worker holds no ranges or the map is no longer at
+        `if_version`.
+        """
+        with self._write_lock:
+            if worker_id not in self.weights:
+                return False
+            if if_version is not None and self.snapshot.version != if_version:
+                return False
+            self._log({'kind': 'ring', 'op': 'set_weight',
+                       'args': {'worker_id': worker_id, 'weight': weight}})
+            self.weights[worker_id] = weight
+            return True
+    
+    def split_range(self, start: str, split_key: str) -> bool:
+        """
+        Split the range starting at `start` at `split_key`. Both halves keep
+        the same replicas, so no data moves.
+        """
+        with self._write_lock:
+            old = self.snapshot
+            index = bisect.bisect_left(old.bounds, start)
+            if index == len(old.bounds) or old.bounds[index] != start:
+                return False
+            end = old.range_end(index)
+            if split_key <= start or (end is not None and split_key >= end):
+                return False
+            
+            bounds = old.bounds[:index + 1] + [split_key] + old.bounds[index + 1:]
+            replica_sets = (old.replica_sets[:index + 1] + [old.replica_sets[index]] +
+                            old.replica_sets[index + 1:])
+            self._log({'kind': 'ring', 'op': 'split_range',
+                       'args': {'start': start, 'split_key': split_key}})
+            self._publish(bounds, replica_sets)
+            return True
+    
+    def move_replica(self, start: str, from_worker: str, to_worker: str) -> bool:
+        """
+        Hand the range starting at `start` from one worker to another. The
+        new worker takes the old one's position, so a moved primary stays
+        primary.
+        """
+        with self._write_lock:
+            old = self.snapshot
+            index = bisect.bisect_left(old.bounds, start)
+            if index == len(old.bounds) or old.bounds[index] != start:
+                return False
+            replicas = old.replica_sets[index]
+            if from_worker not in replicas or to_worker in replicas:
+                return False
+            
+            replica_sets = list(old.replica_sets)
+            replica_sets[index] = tuple(to_worker if w == from_worker else w
+                                        for w in replicas)
+            self._log({'kind': 'ring', 'op': 'move_replica',
+                       'args': {'start': start, 'from_worker': from_worker,
+                                'to_worker': to_worker}})
+            self._publish(old.bounds, replica_sets)
+            return True
+    
+    def to_state(self) -> Dict:
+        """Range map and weights for a metadata snapshot"""
+        with self._write_lock:
+            return {
+                'lsn': self._journal_position(),
+                'ring': encode_ring(self.snapshot, {}),
+                'weights': dict(self.weights)
+            }
+    
+    def restore(self, state: Dict):
+        """Load the range map from a metadata snapshot"""
+        with self._write_lock:
+            ring, _ = decode_ring(state['ring'])
+            self.snapshot = ring
+            self.history = deque([ring], maxlen=self.history.maxlen)
+            self.weights = dict(state['weights'])
+    
+    def get_worker(self, key: str) -> Optional[str]:
+        """Get the primary worker responsible for a key"""
+        return self.snapshot.get_worker(key)
+    
+    def get_replicas(self, key: str, num_replicas: int) -> Tuple[str, ...]:
+        """Get the workers for replicas (including primary)"""
+        return self.snapshot.get_replicas(key, num_replicas)
+    
+    def get_replicas_many(self, keys: Sequence[str],
+                          num_replicas: int) -> List[Tuple[str, ...]]:
+        """Get the replica sets for many keys"""
+        return self.snapshot.get_replicas_many(keys, num_replicas)
+
+
+class RangeTransfer(NamedTuple):
+    """
+    A range whose replica set changed between two ring versions.
+    Hash rings use token ranges (start, end], wrapping when start >= end;
+    range maps use key ranges [start, end) with end None for unbounded.
+    """
+    kind: str  # 'token' or 'key'
+    start: object
+    end: object
+    old_replicas: Tuple[str, ...]
+    new_replicas: Tuple[str, ...]
+    
+    @property
+    def gained(self) -> Tuple[str, ...]:
+        """Workers that must receive the range's data"""
+        return tuple(w for w in self.new_replicas if w not in self.old_replicas)
+    
+    @property
+    def lost(self) -> Tuple[str, ...]:
+        """Workers that no longer hold the range"""
+        return tuple(w for w in self.old_replicas if w not in self.new_replicas)
+    
+    def to_dict(self) -> Dict:
+        """JSON-friendly form"""
+        return {
+            'kind': self.kind,
+            'start': self.start,
+            'end': self.end,
+            'old_replicas': list(self.old_replicas),
+            'new_replicas': list(self.new_replicas)
+        }
+
+
+def diff_rings(old, new) -> List[RangeTransfer]:
+    """
+    Diff two ring versions into the minimal list of ranges whose replica
+    set changed. Adjacent ranges with the same old and new replicas are
+    merged.
+    """
+    if isinstance(old, RangeSnapshot) != isinstance(new, RangeSnapshot):
+        raise ValueError('Cannot diff a hash ring against a range map')
+    
+    transfers = []
+    
+    if isinstance(old, RangeSnapshot):
+        bounds = sorted(set(old.bounds) | set(new.bounds))
+        for i, start in enumerate(bounds):
+            end = bounds[i + 1] if i + 1 < len(bounds) else None
+            before = old.replica_sets[old.range_index(start)]
+            after = new.replica_sets[new.range_index(start)]
+            if before == after:
+                continue
+            last = transfers[-1] if transfers else None
+            if last and last.end == start and (last.old_replicas, last.new_replicas) == (before, after):
+                transfers[-1] = last._replace(end=end)
+            else:
+                transfers.append(RangeTransfer('key', start, end, before, after))
+        return transfers
+    
+    # Elementary token ranges lie between consecutive tokens of either ring;
+    # each is owned by the first token at or after its end in each ring
+    bounds = sorted(set(old.tokens) | set(new.tokens))
+    if not bounds:
+        return transfers
+    
+    def replicas_at(ring, token):
+        return ring.replica_table[ring.token_index(token)] if ring.tokens else ()
+    
+    prev = bounds[-1]  # the first range wraps around from the last token
+    for token in bounds:
+        before = replicas_at(old, token)
+        after = replicas_at(new, token)
+        if before != after:
+            last = transfers[-1] if transfers else None
+            if last and last.end == prev and (last.old_replicas, last.new_replicas) == (before, after):
+                transfers[-1] = last._replace(end=token)
+            else:
+                transfers.append(RangeTransfer('token', prev, token, before, after))
+        prev = token
+    
+    # Join the wrapping range with the one that continues it
+    if len(transfers) > 1:
+        first, last = transfers[0], transfers[-1]
+        if (first.start == last.end == bounds[-1] and
+                (first.old_replicas, first.new_replicas) == (last.old_replicas, last.new_replicas)):
+            transfers[0] = first._replace(start=last.start)
+            transfers.pop()
+    
+    return transfers
+
+
+class RepairProgress:
+    """Progress of re-replicating one failed worker's ranges"""
+    
+    def __init__(self, worker_id: str, tasks: int, ranges: int, expected_keys: int):
+        self.worker_id = worker_id
+        self.tasks = tasks
+        self.ranges = ranges
+        self.expected_keys = expected_keys  # from the worker's last partition counts
+        self.tasks_done = 0
+        self.tasks_failed = 0
+        self.keys_sent = 0
+        self.started_at = time.time()
+        # Nothing to stream (no surviving replicas) is finished straight away
+        self.finished_at = None if tasks else self.started_at
+        self._lock = threading.Lock()
+    
+    def record(self, keys_sent: Optional[int]):
+        """Record a finished stream (keys_sent None if it failed)"""
+        with self._lock:
+            if keys_sent is None:
+                self.tasks_failed += 1
+            else:
+                self.tasks_done += 1
+                self.keys_sent += keys_sent
+            if self.tasks_done + self.tasks_failed == self.tasks:
+                self.finished_at = time.time()
+    
+    def eta(self, now: float) -> Optional[float]:
+        """Seconds left, from the key rate so far (or the stream rate if no keys are known)"""
+        if self.finished_at is not None:
+            return 0.0
+        elapsed = now - self.started_at
+        if self.expected_keys and self.keys_sent:
+            remaining = max(self.expected_keys - self.keys_sent, 0)
+            return remaining * elapsed / self.keys_sent
+        finished = self.tasks_done + self.tasks_failed
+        if finished:
+            return (self.tasks - finished) * elapsed / finished
+        return None
+    
+    def to_dict(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            elapsed = (self.finished_at or now) - self.started_at
+            return {
+                'worker_id': self.worker_id,
+                'state': 'running' if self.finished_at is None else 'finished',
+                'ranges': self.ranges,
+                'tasks': self.tasks,
+                'tasks_done': self.tasks_done,
+                'tasks_failed': self.tasks_failed,
+                'keys_sent': self.keys_sent,
+                'expected_keys': self.expected_keys,
+                'elapsed': round(elapsed, 3),
+                'keys_per_sec': round(self.keys_sent / elapsed, 1) if elapsed > 0 else 0.0,
+                'eta': self.eta(now)
+            }
+
+
+class RegistrySnapshot:
+    """
+    Immutable view of the registered workers. Reads never take a lock;
+    writers copy the worker map and publish a new snapshot. Worker info
+    dicts are shared between snapshots and never modified in place.
+    """
+    
+    def __init__(self, version: int, workers: Dict[str, Dict]):
+        self.version = version
+        self.workers = workers  # worker_id -> worker_info
+        self.urls = {worker_id: info['url'] for worker_id, info in workers.items()}
+        self.active = frozenset(worker_id for worker_id, info in workers.items()
+                                if info['status'] == 'active')
 
 
-class WorkerRegistry:
-    """Manages worker information and health status"""
+class PhiAccrualDetector:
+    """
+    Phi-accrual failure detector. Heartbeat intervals are modelled as a
+    normal distribution per worker; phi is -log10 of the probability that
+    a heartbeat still arrives this late, so the timeout follows each
+    worker's observed jitter instead of a fixed value.
+    """
     
-    def __init__(self, heartbeat_timeout: int = 15):
-        self.workers = {}  # worker_id -> worker_info
+    def __init__(self, threshold: float = 8.0, window_size: int = 100,
+                 min_std: float = 0.5, acceptable_pause: float = 1.0,
+                 min_samples: int = 5):
+        self.threshold = threshold
+        self.window_size = window_size
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+        self.min_samples = min_samples
+        # Standard deviations past the mean at which phi reaches the threshold
+        self.z = -NormalDist().inv_cdf(10 ** -threshold)
+        self.intervals = {}  # worker_id -> deque of heartbeat intervals
+    
+    def heartbeat(self, worker_id: str, interval: float):
+        """Record the time since the worker's previous heartbeat"""
+        window = self.intervals.get(worker_id)
+        if window is None:
+            window = self.intervals.setdefault(worker_id, deque(maxlen=self.window_size))
+        window.append(interval)
+    
+    def reset(self, worker_id: str):
+        """Forget a worker's intervals (the gap before a recovery is not jitter)"""
+        self.intervals.pop(worker_id, None)
+    
+    def _distribution(self, worker_id: str) -> Optional[Tuple[float, float]]:
+        """Mean (plus acceptable pause) and deviation of the intervals, once there are enough"""
+        window = list(self.intervals.get(worker_id, ()))
+        if len(window) < self.min_samples:
+            return None
+        mean = sum(window) / len(window)
+        variance = sum((x - mean) ** 2 for x in window) / len(window)
+        return mean + self.acceptable_pause, max(math.sqrt(variance), self.min_std)
+    
+    def timeout(self, worker_id: str) -> Optional[float]:
+        """Silence after which phi reaches the threshold, or None without enough samples"""
+        distribution = self._distribution(worker_id)
+        if distribution is None:
+            return None
+        mean, std = distribution
+        return mean + self.z * std
+    
+    def phi(self, worker_id: str, elapsed: float) -> Optional[float]:
+        """Suspicion level after `elapsed` seconds without a heartbeat"""
+        distribution = self._distribution(worker_id)
+        if distribution is None:
+            return None
+        mean, std = distribution
+        p_later = 0.5 * math.erfc((elapsed - mean) / (std * math.sqrt(2)))
+        return -math.log10(p_later) if p_later > 0 else float('inf')
+
+
+class WorkerRegistry(Journaled):
+    """
+    Manages worker information and health status. Membership and status
+    live in a RegistrySnapshot swapped on every change; heartbeat
+    timestamps are kept outside it so a heartbeat never copies the registry.
+    
+    Failure detection uses a heap of per-worker deadlines: heartbeats only
+    store a timestamp, and when a deadline comes due it is either pushed
+    back to the worker's real deadline or the worker is failed. A waiter
+    therefore wakes exactly when the earliest deadline passes, and each
+    check only touches the workers that are due.
+    """
+    
+    def __init__(self, heartbeat_timeout: int = 15,
+                 phi_detector: Optional[PhiAccrualDetector] = None):
+        self.snapshot = RegistrySnapshot(0, {})
+        self.last_heartbeat = {}  # worker_id -> timestamp, written without copying
         self.heartbeat_timeout = heartbeat_timeout
+        self.phi_detector = phi_detector  # None = fixed heartbeat_timeout
+        self._write_lock = threading.Lock()
+        self._deadlines = []  # heap of (deadline, worker_id)
+        self._scheduled = {}  # worker_id -> deadline of its live heap entry
+        self._deadline_cond = threading.Condition()
+    
+    @property
+    def workers(self) -> Dict[str, Dict]:
+        """Worker info from the current snapshot"""
+        return self.snapshot.workers
+    
+    def _update(self, changes: Dict[str, Dict]):
+        """Publish a snapshot with some worker entries replaced (caller holds _write_lock)"""
+        workers = dict(self.snapshot.workers)
+        workers.update(changes)
+        self._log({'kind': 'registry', 'workers': changes})
+        self.snapshot = RegistrySnapshot(self.snapshot.version + 1, workers)
+    
+    def to_state(self) -> Dict:
+        """Registered workers for a metadata snapshot"""
+        with self._write_lock:
+            return {
+                'lsn': self._journal_position(),
+                'version': self.snapshot.version,
+                'workers': self.snapshot.workers
+            }
+    
+    def restore(self, state: Dict):
+        """Load the registered workers from a metadata snapshot"""
+        with self._write_lock:
+            self.snapshot = RegistrySnapshot(state['version'], dict(state['workers']))
     
-    def register_worker(self, worker_id: str, host: str, port: int):
+    def apply(self, changes: Dict[str, Dict]):
+        """Replay logged worker changes"""
+        with self._write_lock:
+            self._update(changes)
+    
+    def reset_deadlines(self):
+        """
+        Give every active worker a full timeout from now. Used after a
+        restart: workers still alive prove it with their next heartbeat.
+        """
+        now = time.time()
+        for worker_id in self.snapshot.active:
+            self.last_heartbeat[worker_id] = now
+            self._schedule(worker_id, self.deadline(worker_id))
+    
+    def timeout(self, worker_id: str) -> float:
+        """Silence after which a worker is considered failed"""
+        if self.phi_detector is not None:
+            timeout = self.phi_detector.timeout(worker_id)
+            if timeout is not None:
+                return timeout
+        return self.heartbeat_timeout
+    
+    def deadline(self, worker_id: str) -> float:
+        """Time at which a worker fails unless it sends a heartbeat"""
+        return self.last_heartbeat.get(worker_id, 0) + self.timeout(worker_id)
+    
+    def _schedule(self, worker_id: str, deadline: float):
+        """Push a worker's deadline, replacing any earlier entry, and wake the waiter if it is now first"""
+        with self._deadline_cond:
+            self._scheduled[worker_id] = deadline
+            heapq.heappush(self._deadlines, (deadline, worker_id))
+            if self._deadlines[0] == (deadline, worker_id):
+                self._deadline_cond.notify()
+    
+    def register_worker(self, worker_id: str, host: str, port: int,
+                        weight: float = 1.0):
         """Register a new worker"""
-        self.workers[worker_id] = {
-            'id': worker_id,
-            'host': host,
-            'port': port,
-            'url': f"http://{host}:{port}",
-            'status': 'active',
-            'last_heartbeat': time.time(),
-            'registered_at': time.time()
-        }
+        now = time.time()
+        with self._write_lock:
+            self.last_heartbeat[worker_id] = now
+            if self.phi_detector is not None:
+                self.phi_detector.reset(worker_id)
+            self._update({worker_id: {
+                'id': worker_id,
+                'host': host,
+                'port': port,
+                'url': f"http://{host}:{port}",
+                'weight': weight,
+                'status': 'active',
+                'registered_at': now
+            }})
+        self._schedule(worker_id, self.deadline(worker_id))
     
-    def update_heartbeat(self, worker_id: str) -> bool:
-        """Update heartbeat timestamp for a worker"""
-        if worker_id in self.workers:
-            self.workers[worker_id]['last_heartbeat'] = time.time()
-            if self.workers[worker_id]['status'] == 'failed':
-                self.workers[worker_id]['status'] = 'active'
-            return True
-        return False
+    def update_heartbeat(self, worker_id: str) -> Optional[str]:
+        """
+        Update heartbeat timestamp for a worker, reactivating it if it had
+        failed. Returns the worker's previous status, or None if unknown.
+        """
+        info = self.snapshot.workers.get(worker_id)
+        if info is None:
+            return None
+        
+        now = time.time()
+        if info['status'] == 'active':
+            previous = self.last_heartbeat.get(worker_id)
+            self.last_heartbeat[worker_id] = now
+            if self.phi_detector is not None and previous is not None:
+                self.phi_detector.heartbeat(worker_id, now - previous)
+                # A tighter phi timeout can pull the deadline before the queued one
+                deadline = self.deadline(worker_id)
+                if deadline < self._scheduled.get(worker_id, deadline):
+                    self._schedule(worker_id, deadline)
+            return 'active'
+        
+        with self._write_lock:
+            info = self.snapshot.workers.get(worker_id)
+            if info is None or info['status'] == 'active':
+                self.last_heartbeat[worker_id] = now
+                return 'active' if info else None
+            self.last_heartbeat[worker_id] = now
+            if self.phi_detector is not None:
+                self.phi_detector.reset(worker_id)
+            self._update({worker_id: dict(info, status='active')})
+        self._schedule(worker_id, self.deadline(worker_id))
+        return info['status']
     
     def get_worker(self, worker_id: str) -> Optional[Dict]:
         """Get worker information"""
-        return self.workers.get(worker_id)
+        return self.snapshot.workers.get(worker_id)
     
     def get_all_workers(self) -> Dict:
-        """Get all registered workers"""
-        return self.workers
+        """Get all registered workers, with their latest heartbeat times"""
+        workers = {}
+        now = time.time()
+        for worker_id, info in self.snapshot.workers.items():
+            last_heartbeat = self.last_heartbeat.get(worker_id)
+            workers[worker_id] = dict(info, last_heartbeat=last_heartbeat)
+            if self.phi_detector is not None and last_heartbeat is not None:
+                phi = self.phi_detector.phi(worker_id, now - last_heartbeat)
+                workers[worker_id]['phi'] = None if phi is None else round(min(phi, 1e6), 3)
+        return workers
     
     def get_active_workers(self) -> List[str]:
         """Get list of active worker IDs"""
-        return [wid for wid, info in self.workers.items() 
-                if info['status'] == 'active']
+        return list(self.snapshot.active)
     
     def check_failed_workers(self) -> List[str]:
-        """Check for workers that haven't sent heartbeat within timeout"""
+        """
+        Fail the workers whose deadlines have passed. Only due heap entries
+        are examined; a worker that sent a heartbeat since is rescheduled.
+        """
         current_time = time.time()
-        failed = []
+        due = []
+        with self._deadline_cond:
+            while self._deadlines and self._deadlines[0][0] <= current_time:
+                deadline, worker_id = heapq.heappop(self._deadlines)
+                if self._scheduled.get(worker_id) == deadline:
+                    del self._scheduled[worker_id]
+                    due.append(worker_id)
         
-        for worker_id, info in self.workers.items():
-            if info['status'] == 'active':
-                time_since_heartbeat = current_time - info['last_heartbeat']
-                if time_since_heartbeat > self.heartbeat_timeout:
-                    info['status'] = 'failed'
-                    info['failed_at'] = current_time
-                    failed.append(worker_id)
+        reschedule = []
+        with self._write_lock:
+            changes = {}
+            for worker_id in due:
+                if worker_id not in self.snapshot.active:
+                    continue  # rescheduled when it comes back
+                deadline = self.deadline(worker_id)
+                if deadline > current_time:
+                    reschedule.append((worker_id, deadline))
+                else:
+                    changes[worker_id] = dict(self.snapshot.workers[worker_id],
+                                              status='failed', failed_at=current_time)
+            if changes:
+                self._update(changes)
         
-        return failed
+        for worker_id, deadline in reschedule:
+            self._schedule(worker_id, deadline)
+        
+        return list(changes)
+    
+    def wait_for_failures(self) -> List[str]:
+        """Block until a worker's deadline passes and return the workers that failed"""
+        while True:
+            with self._deadline_cond:
+                while True:
+                    now = time.time()
+                    if self._deadlines and self._deadlines[0][0] <= now:
+                        break
+                    timeout = self._deadlines[0][0] - now if self._deadlines else None
+                    self._deadline_cond.wait(timeout)
+            
+            failed = self.check_failed_workers()
+            if failed:
+                return failed
     
-    def mark_worker_failed(self, worker_id: str):
-        """Manually mark a worker as failed"""
-        if worker_id in self.workers:
-            self.workers[worker_id]['status'] = 'failed'
-            self.workers[worker_id]['failed_at'] = time.time()
+    def set_weight(self, worker_id: str, weight: float) -> bool:
+        """Update a worker's capacity weight"""
+        with self._write_lock:
+            info = self.snapshot.workers.get(worker_id)
+            if info is None:
+                return False
+            self._update({worker_id: dict(info, weight=weight)})
+            return True
+    
+    def mark_worker_failed(self, worker_id: str) -> bool:
+        """Mark a worker as failed (e.g. on a gossip report); False if it wasn't active"""
+        with self._write_lock:
+            info = self.snapshot.workers.get(worker_id)
+            if info is None or info['status'] != 'active':
+                return False
+            self._update({worker_id: dict(info, status='failed',
+                                          failed_at=time.time())})
+            return True
     
     def get_worker_url(self, worker_id: str) -> Optional[str]:
         """Get the URL for a worker"""
-        worker = self.workers.get(worker_id)
-        return worker['url'] if worker else None
\ No newline at end of file
+        return self.snapshot.urls.get(worker_id)
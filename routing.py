@@ -0,0 +1,453 @@
+# routing.py - Partition snapshots and client-side routing shared by the
+# controller, workers and KVStoreClient
+
+import base64
+import bisect
+import hashlib
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import requests
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch routing falls back to bisect
+    np = None
+
+# Workers echo their ring version in this header; clients send theirs
+RING_VERSION_HEADER = 'X-Ring-Version'
+
+# Controllers send their failover term in this header; a lower term than one
+# already seen comes from a deposed primary
+CONTROLLER_TERM_HEADER = 'X-Controller-Term'
+
+
+def controller_term(response: requests.Response) -> Optional[int]:
+    """Failover term a controller sent with its response (None from controllers without terms)"""
+    term = response.headers.get(CONTROLLER_TERM_HEADER)
+    return int(term) if term is not None else None
+
+
+# Ring tokens are the first TOKEN_BITS bits of a key's MD5 digest. Rings in
+# the wire form and in metadata snapshots say which width they were built for
+TOKEN_BITS = 64
+
+
+class RingFormatError(ValueError):
+    """A ring in the wire form was built for another token width"""
+
+
+def hash_key(key: str) -> int:
+    """
+    Generate a 64-bit ring token for a key (first 8 bytes of MD5). A prefix
+    keeps the order of the full 128-bit digests, so keys land on the same
+    vnodes as with full digests unless a key and a vnode share all 64 bits.
+    """
+    return int(hashlib.md5(key.encode()).hexdigest()[:TOKEN_BITS // 4], 16)
+
+
+def walk_replicas(owners: List[str], start: int, count: int) -> Tuple[str, ...]:
+    """Collect `count` distinct owners walking clockwise from `start`"""
+    n = len(owners)
+    replicas = []
+    idx = start
+    while len(replicas) < count:
+        worker_id = owners[idx % n]
+        if worker_id not in replicas:
+            replicas.append(worker_id)
+        idx += 1
+    return tuple(replicas)
+
+
+def partition_of(key: str, bits: int) -> int:
+    """Fixed hash partition (top `bits` bits of the ring token) of a key"""
+    return hash_key(key) >> (64 - bits)
+
+
+class RangeSet:
+    """
+    Membership test for a set of disjoint ranges. Token ranges are
+    (start, end] on the hash ring, wrapping when start >= end; key ranges
+    are [start, end) with end None for unbounded.
+    """
+    
+    def __init__(self, kind: str, ranges: Sequence[Sequence]):
+        self.kind = kind
+        spans = []
+        for start, end in ranges:
+            if kind == 'token' and start >= end:
+                # Wrapping range: split at the top of the ring
+                spans.append((start, 2 ** 64 - 1))
+                spans.append((-1, end))
+            else:
+                spans.append((start, end))
+        spans.sort(key=lambda span: span[0])
+        self.starts = [start for start, _ in spans]
+        self.ends = [end for _, end in spans]
+    
+    def __contains__(self, key: str) -> bool:
+        if self.kind == 'token':
+            token = hash_key(key)
+            i = bisect.bisect_left(self.starts, token) - 1
+            return i >= 0 and token <= self.ends[i]
+        
+        i = bisect.bisect_right(self.starts, key) - 1
+        return i >= 0 and (self.ends[i] is None or key < self.ends[i])
+
+
+class RingSnapshot:
+    """
+    Immutable view of the hash ring at one version.
+    Lookups on a snapshot never take a lock; a new snapshot is published
+    for every membership change.
+    """
+    
+    def __init__(self, version: int, tokens: array, owners: List[str],
+                 replica_table: List[Tuple[str, ...]], replication_factor: int):
+        self.version = version
+        self.tokens = tokens  # sorted 64-bit ring tokens
+        self.owners = owners  # token index -> worker_id
+        self.replica_table = replica_table  # token index -> distinct worker ids
+        self.replication_factor = replication_factor
+        self.workers = frozenset(owners)
+        self.width = min(replication_factor, len(self.workers))
+        self.token_view = np.frombuffer(tokens, dtype=np.uint64) if np else None
+    
+    @classmethod
+    def build(cls, version: int, tokens: array, owners: List[str],
+              replication_factor: int) -> 'RingSnapshot':
+        """Build a snapshot from scratch, computing the whole replica table"""
+        width = min(replication_factor, len(set(owners)))
+        interned = {}  # share identical replica tuples between tokens
+        table = []
+        for i in range(len(tokens)):
+            replicas = walk_replicas(owners, i, width)
+            table.append(interned.setdefault(replicas, replicas))
+        return cls(version, tokens, owners, table, replication_factor)
+    
+    def __len__(self) -> int:
+        return len(self.tokens)
+    
+    def token_index(self, key_hash: int) -> int:
+        """Index of the first token clockwise from a hash position"""
+        idx = bisect.bisect_left(self.tokens, key_hash)
+        return 0 if idx == len(self.tokens) else idx
+    
+    def get_worker(self, key: str) -> Optional[str]:
+        """Get the primary worker responsible for a key"""
+        if not self.tokens:
+            return None
+        return self.replica_table[self.token_index(hash_key(key))][0]
+    
+    def get_replicas(self, key: str, num_replicas: int) -> Tuple[str, ...]:
+        """Get the workers for replicas (including primary), in ring order"""
+        if not self.tokens or num_replicas <= 0:
+            return ()
+        
+        idx = self.token_index(hash_key(key))
+        replicas = self.replica_table[idx]
+        
+        if num_replicas <= self.replication_factor:
+            # Precomputed; the tuple is shared, so only slice when asked for fewer
+            return replicas if num_replicas >= len(replicas) else replicas[:num_replicas]
+        
+        # More replicas than the table was built for: walk the ring
+        return walk_replicas(self.owners, idx, min(num_replicas, len(self.workers)))
+    
+    def get_replicas_many(self, keys: Sequence[str],
+                          num_replicas: int) -> List[Tuple[str, ...]]:
+        """
+        Get the replica sets for many keys in one pass.
+        Uses NumPy searchsorted over the token array when available.
+        """
+        if not self.tokens or num_replicas <= 0:
+            return [() for _ in keys]
+        
+        if num_replicas > self.replication_factor:
+            return [self.get_replicas(key, num_replicas) for key in keys]
+        
+        tokens = self.tokens
+        n = len(tokens)
+        hashes = [hash_key(key) for key in keys]
+        
+        if self.token_view is not None:
+            positions = np.searchsorted(self.token_view,
+                                        np.array(hashes, dtype=np.uint64))
+            positions[positions == n] = 0
+            indices = positions.tolist()
+        else:
+            indices = [bisect.bisect_left(tokens, h) % n for h in hashes]
+        
+        table = self.replica_table
+        return [table[i] if num_replicas >= len(table[i]) else table[i][:num_replicas]
+                for i in indices]
+
+
+class RangeSnapshot:
+    """
+    Immutable view of an ordered range partition map at one version.
+    Range i covers keys in [bounds[i], bounds[i + 1]); the first range
+    starts at '' and the last one is unbounded.
+    """
+    
+    def __init__(self, version: int, bounds: List[str],
+                 replica_sets: List[Tuple[str, ...]], replication_factor: int):
+        self.version = version
+        self.bounds = bounds  # sorted range start keys, bounds[0] == ''
+        self.replica_sets = replica_sets  # range index -> replica worker ids
+        self.replication_factor = replication_factor
+        self.workers = frozenset(w for replicas in replica_sets for w in replicas)
+    
+    def __len__(self) -> int:
+        return len(self.bounds) if self.workers else 0
+    
+    def range_index(self, key: str) -> int:
+        """Index of the range containing a key"""
+        return bisect.bisect_right(self.bounds, key) - 1
+    
+    def range_end(self, index: int) -> Optional[str]:
+        """Exclusive end key of a range (None for the last range)"""
+        return self.bounds[index + 1] if index + 1 < len(self.bounds) else None
+    
+    def get_worker(self, key: str) -> Optional[str]:
+        """Get the primary worker responsible for a key"""
+        replicas = self.replica_sets[self.range_index(key)]
+        return replicas[0] if replicas else None
+    
+    def get_replicas(self, key: str, num_replicas: int) -> Tuple[str, ...]:
+        """Get the workers for replicas (including primary)"""
+        if num_replicas <= 0:
+            return ()
+        replicas = self.replica_sets[self.range_index(key)]
+        return replicas if num_replicas >= len(replicas) else replicas[:num_replicas]
+    
+    def get_replicas_many(self, keys: Sequence[str],
+                          num_replicas: int) -> List[Tuple[str, ...]]:
+        """Get the replica sets for many keys"""
+        return [self.get_replicas(key, num_replicas) for key in keys]
+
+
+def encode_ring(ring, worker_urls: Dict[str, str]) -> Dict:
+    """
+    Compact wire form of a partition snapshot. Hash rings send tokens as
+    base64 little-endian uint64s and owners as indices into the node list;
+    range maps send their bounds and per-range replica indices.
+    """
+    nodes = sorted(ring.workers)
+    node_index = {worker_id: i for i, worker_id in enumerate(nodes)}
+    payload = {
+        'version': ring.version,
+        'replication_factor': ring.replication_factor,
+        'nodes': nodes,
+        'workers': {worker_id: worker_urls.get(worker_id) for worker_id in nodes}
+    }
+    
+    if isinstance(ring, RangeSnapshot):
+        payload['method'] = 'range'
+        payload['bounds'] = ring.bounds
+        payload['owners'] = [[node_index[w] for w in replicas]
+                             for replicas in ring.replica_sets]
+        return payload
+    
+    tokens = array('Q', ring.tokens)
+    if sys.byteorder == 'big':
+        tokens.byteswap()
+    
+    payload['method'] = 'hash'
+    payload['token_bits'] = TOKEN_BITS
+    payload['tokens'] = base64.b64encode(tokens.tobytes()).decode('ascii')
+    payload['owners'] = [node_index[owner] for owner in ring.owners]
+    return payload
+
+
+def decode_ring(payload: Dict):
+    """
+    Rebuild a partition snapshot (and worker URL map) from its wire form.
+    Raises RingFormatError for a hash ring built for another token width.
+    """
+    nodes = payload['nodes']
+    
+    if payload.get('method') == 'range':
+        replica_sets = [tuple(nodes[i] for i in replicas)
+                        for replicas in payload['owners']]
+        ring = RangeSnapshot(payload['version'], payload['bounds'], replica_sets,
+                             payload['replication_factor'])
+        return ring, dict(payload['workers'])
+    
+    token_bits = payload.get('token_bits', 128)  # rings before the field used full digests
+    if token_bits != TOKEN_BITS:
+        raise RingFormatError(f"Ring uses {token_bits}-bit tokens, expected {TOKEN_BITS}")
+    
+    tokens = array('Q')
+    tokens.frombytes(base64.b64decode(payload['tokens']))
+    if sys.byteorder == 'big':
+        tokens.byteswap()
+    
+    owners = [nodes[i] for i in payload['owners']]
+    ring = RingSnapshot.build(payload['version'], tokens, owners,
+                              payload['replication_factor'])
+    return ring, dict(payload['workers'])
+
+
+class RingRouter:
+    """
+    Routes keys locally from a cached copy of the controller's ring
+    (a RingSnapshot or, with range partitioning, a RangeSnapshot).
+    The ring is fetched from /ring and refreshed only when a worker reports
+    a newer ring version than ours (or the cache is empty). Given several
+    controller URLs (primary first, then standbys) it fetches from the
+    first that answers and sticks with it until it stops answering, or
+    until it answers with a lower failover term than one already seen.
+    
+    It can also cache the workers' load reports (/cluster/load) for
+    load-aware replica selection.
+    """
+    
+    def __init__(self, controller_urls: Union[str, Sequence[str]], timeout: float = 5):
+        if isinstance(controller_urls, str):
+            controller_urls = [controller_urls]
+        self.controller_urls = list(controller_urls)
+        self.timeout = timeout
+        self.ring = None  # current RingSnapshot
+        self.worker_urls = {}  # worker_id -> url, for the current ring
+        self.etag = None
+        self.term = 0  # highest controller term seen
+        self.ring_term = 0  # term of the controller the cached ring came from
+        self._refresh_lock = threading.Lock()
+        self.load = {}  # worker_id -> latest heartbeat load report
+        self.load_fetched = 0.0  # when self.load was last fetched
+        self._load_lock = threading.Lock()
+    
+    @property
+    def version(self) -> int:
+        """Version of the cached ring (-1 before the first fetch)"""
+        ring = self.ring
+        return ring.version if ring is not None else -1
+    
+    @property
+    def controller_url(self) -> str:
+        """Controller the ring is currently fetched from"""
+        return self.controller_urls[0]
+    
+    def _get_ring(self, headers: Dict[str, str]) -> requests.Response:
+        """GET /ring from the first reachable controller, moving it to the front"""
+        for attempt in range(len(self.controller_urls)):
+            try:
+                return requests.get(f"{self.controller_url}/ring",
+                                    headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                if attempt == len(self.controller_urls) - 1:
+                    raise
+                self.next_controller()
+    
+    def next_controller(self):
+        """Move on to the next controller URL"""
+        self.controller_urls.append(self.controller_urls.pop(0))
+    
+    def observe_term(self, term: Optional[int]) -> bool:
+        """
+        Note a controller's failover term. Returns False if it is lower than
+        one already seen: that controller was deposed and its answer must
+        be ignored.
+        """
+        if term is None:
+            return True
+        if term < self.term:
+            return False
+        self.term = term
+        return True
+    
+    def refresh(self) -> bool:
+        """Fetch the ring from the controller; returns True if it changed"""
+        with self._refresh_lock:
+            headers = {'If-None-Match': self.etag} if self.etag else {}
+            for _ in range(len(self.controller_urls)):
+                response = self._get_ring(headers)
+                term = controller_term(response)
+                if self.observe_term(term):
+                    break
+                print(f"⚠ Ignoring ring from {self.controller_url}: "
+                      f"term {term} is older than {self.term}")
+                self.next_controller()
+            else:
+                return False
+            if response.status_code == 304:
+                return False
+            response.raise_for_status()
+            
+            ring, worker_urls = decode_ring(response.json())
+            # Publish URLs before the ring so lookups never miss an owner
+            self.worker_urls = worker_urls
+            self.ring = ring
+            self.ring_term = self.term
+            self.etag = response.headers.get('ETag')
+            return True
+    
+    def load_age(self) -> float:
+        """Seconds since the load reports were fetched"""
+        return time.time() - self.load_fetched
+    
+    def refresh_load(self) -> bool:
+        """
+        Fetch the workers' load reports from the controller. Returns False
+        without waiting if another thread is already fetching them.
+        """
+        if not self._load_lock.acquire(blocking=False):
+            return False
+        try:
+            response = requests.get(f"{self.controller_url}/cluster/load", timeout=self.timeout)
+            response.raise_for_status()
+            if not self.observe_term(controller_term(response)):
+                self.next_controller()
+                return False
+            self.load = response.json().get('workers', {})
+            return True
+        except requests.RequestException as e:
+            print(f"⚠ Load refresh failed: {str(e)}")
+            return False
+        finally:
+            # Failures count as fetches too, so a down controller isn't retried on every read
+            self.load_fetched = time.time()
+            self._load_lock.release()
+    
+    def observe_version(self, version: Optional[int]) -> bool:
+        """
+        Refresh if someone has seen a newer ring than ours, or our ring came
+        from a controller that has since been replaced in a higher term
+        """
+        if version is None or (version <= self.version and self.ring_term >= self.term):
+            return False
+        try:
+            return self.refresh()
+        except requests.RequestException as e:
+            print(f"⚠ Ring refresh failed: {str(e)}")
+            return False
+    
+    def _current(self):
+        """Cached ring, fetching it on first use"""
+        if self.ring is None:
+            self.refresh()
+        return self.ring
+    
+    def get_replicas(self, key: str, num_replicas: int) -> Tuple[str, ...]:
+        """Replica worker ids for a key (primary first)"""
+        return self._current().get_replicas(key, num_replicas)
+    
+    def get_replicas_many(self, keys: Sequence[str],
+                          num_replicas: int) -> List[Tuple[str, ...]]:
+        """Replica worker ids for many keys"""
+        return self._current().get_replicas_many(keys, num_replicas)
+    
+    def get_replica_urls(self, key: str, num_replicas: int) -> List[str]:
+        """Replica worker URLs for a key (primary first)"""
+        replica_ids = self.get_replicas(key, num_replicas)
+        worker_urls = self.worker_urls
+        return [worker_urls[worker_id] for worker_id in replica_ids
+                if worker_urls.get(worker_id)]
+    
+    def get_worker_url(self, worker_id: str) -> Optional[str]:
+        """URL of a worker in the cached ring"""
+        return self.worker_urls.get(worker_id)
@@ -12,6 +12,10 @@ python controller/controller.py > logs/controller.log 2>&1 &
 CONTROLLER_PID=$!
 sleep 2
 
+# Start the hot standby controller
+echo "Starting Standby Controller..."
+python controller/controller.py --standby > logs/controller_standby.log 2>&1 &
+
 # Start 4 workers
 echo "Starting Workers..."
 python worker/worker.py worker_1 6000 > logs/worker_1.log 2>&1 &
@@ -23,6 +27,7 @@ echo ""
 echo "✓ All services started!"
 echo ""
 echo "Controller: http://localhost:5000"
+echo "Standby:    http://localhost:5001"
 echo "Worker 1:   http://localhost:6000"
 echo "Worker 2:   http://localhost:6001"
 echo "Worker 3:   http://localhost:6002"
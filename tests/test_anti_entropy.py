@@ -0,0 +1,113 @@
+import requests
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTROLLER_URLS, REPLICATION_FACTOR
+from client.client import KVStoreClient
+
+CONTROLLER_URL = CONTROLLER_URLS[0]
+NUM_KEYS = 2000
+NUM_DIVERGENT = 25
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def shared_keys(client, keys, a, b, count):
+    """Up to `count` keys replicated on both workers a and b"""
+    found = []
+    for key in keys:
+        replicas = client.router.get_replicas(key, REPLICATION_FACTOR)
+        if a in replicas and b in replicas:
+            found.append(key)
+            if len(found) == count:
+                break
+    return found
+
+
+def diverge(url, keys, value):
+    """Write newer versions straight to one replica, bypassing replication"""
+    version = [int(time.time() * 1000) + 1, 0, 'test_anti_entropy']
+    requests.post(f"{url}/replicate_batch", json={
+        'items': [{'key': key, 'value': value, 'version': version} for key in keys]
+    }, timeout=10)
+
+
+def test_anti_entropy():
+    """Merkle anti-entropy exchanges only the keys that differ"""
+
+    print_section("🧪 ANTI-ENTROPY TEST")
+    print("This test will:")
+    print(f"  1. Write {NUM_KEYS} keys")
+    print("  2. Reconcile two in-sync replicas (should exchange nothing)")
+    print(f"  3. Make {NUM_DIVERGENT} keys newer on each of the two replicas")
+    print("  4. Reconcile again and check only those keys moved")
+
+    input("\nPress Enter to start...")
+
+    client = KVStoreClient()
+    results = []
+
+    # Step 1: Data
+    print_section("Step 1: Writing Keys")
+    keys = [f"ae:{i:05d}" for i in range(NUM_KEYS)]
+    written = sum(1 for key in keys if client.put(key, "original"))
+    print(f"Wrote {written}/{NUM_KEYS} keys")
+    time.sleep(2)  # let the replication queues drain
+
+    workers = requests.get(f"{CONTROLLER_URL}/workers", timeout=5).json()['workers']
+    active = sorted(worker_id for worker_id, info in workers.items() if info['status'] == 'active')
+    a, b = active[0], active[1]
+    url_a, url_b = workers[a]['url'], workers[b]['url']
+
+    # Step 2: In sync
+    print_section(f"Step 2: Reconciling {a} with {b} (in sync)")
+    session = requests.post(f"{url_a}/anti_entropy", json={'peer': b}, timeout=60).json()
+    print(f"Session: {session}")
+    results.append(("In-sync replicas exchange nothing",
+                    session.get('success') and session['keys_pushed'] == 0 and
+                    session['keys_pulled'] == 0))
+
+    # Step 3: Divergence
+    print_section("Step 3: Diverging Replicas")
+    keys_a = shared_keys(client, keys, a, b, NUM_DIVERGENT)
+    keys_b = shared_keys(client, reversed(keys), a, b, NUM_DIVERGENT)
+    diverge(url_a, keys_a, "newer_on_a")
+    diverge(url_b, keys_b, "newer_on_b")
+    print(f"{len(keys_a)} keys newer on {a}, {len(keys_b)} keys newer on {b}")
+
+    # Step 4: Reconcile
+    print_section(f"Step 4: Reconciling {a} with {b}")
+    session = requests.post(f"{url_a}/anti_entropy", json={'peer': b}, timeout=60).json()
+    print(f"Session: {session}")
+    results.append(("Only divergent keys exchanged",
+                    session.get('keys_pushed') == len(keys_a) and
+                    session.get('keys_pulled') == len(keys_b)))
+
+    def value_on(url, key):
+        return requests.get(f"{url}/get", params={'key': key}, timeout=5).json().get('value')
+
+    converged = (all(value_on(url_b, key) == "newer_on_a" for key in keys_a) and
+                 all(value_on(url_a, key) == "newer_on_b" for key in keys_b))
+    results.append(("Replicas converged on the newest versions", converged))
+
+    session = requests.post(f"{url_a}/anti_entropy", json={'peer': b}, timeout=60).json()
+    print(f"Follow-up session: {session}")
+    results.append(("Trees match afterwards", session.get('leaves_differing') == 0))
+
+    # Summary
+    print_section("ANTI-ENTROPY TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    return all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_anti_entropy()
@@ -0,0 +1,104 @@
+import random
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+import controller
+import routing
+from config import NUM_WORKERS, REPLICATION_FACTOR, VIRTUAL_NODES
+from routing import RingSnapshot
+from utils import ConsistentHash, WorkerRegistry
+
+NUM_KEYS = 5000
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def test_batch_lookup():
+    """get_replicas_many agrees with get_replicas with and without NumPy"""
+
+    print_section("🧪 BATCH ROUTING TEST")
+    rng = random.Random(5)
+    ring = ConsistentHash(0, VIRTUAL_NODES, REPLICATION_FACTOR)
+    for i in range(6):
+        ring.add_worker(f"worker_{i}", rng.choice((0.5, 1.0, 2.0)))
+    snapshot = ring.snapshot
+    keys = [f"key_{rng.getrandbits(48)}" for _ in range(NUM_KEYS)]
+    results = []
+
+    # Without NumPy the snapshot has no token view and bisects each key
+    numpy_module = routing.np
+    routing.np = None
+    try:
+        fallback = RingSnapshot(snapshot.version, snapshot.tokens, snapshot.owners,
+                                snapshot.replica_table, REPLICATION_FACTOR)
+    finally:
+        routing.np = numpy_module
+    results.append(("The fallback snapshot has no NumPy token view", fallback.token_view is None))
+
+    for count in (1, REPLICATION_FACTOR, REPLICATION_FACTOR + 2):
+        expected = [snapshot.get_replicas(key, count) for key in keys]
+        if numpy_module is not None:
+            results.append((f"NumPy lookup matches get_replicas for {count} replicas",
+                            snapshot.get_replicas_many(keys, count) == expected))
+        results.append((f"Bisect lookup matches get_replicas for {count} replicas",
+                        fallback.get_replicas_many(keys, count) == expected))
+
+    print_section("BATCH ROUTING TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+def test_query_batch_endpoint():
+    """/query_batch routes every key and rejects malformed bodies with 400"""
+
+    print_section("🧪 QUERY BATCH ENDPOINT TEST")
+    controller.partitioner = ConsistentHash(NUM_WORKERS, VIRTUAL_NODES, REPLICATION_FACTOR)
+    controller.worker_registry = WorkerRegistry()
+    controller.role = 'primary'
+    for i in range(4):
+        controller.worker_registry.register_worker(f"worker_{i}", 'localhost', 6000 + i)
+        controller.partitioner.add_worker(f"worker_{i}")
+    client = controller.app.test_client()
+    results = []
+
+    keys = [f"key_{i}" for i in range(200)]
+    response = client.post('/query_batch', json={'keys': keys})
+    body = response.get_json()
+    results.append(("A batch is routed like single lookups",
+                    response.status_code == 200 and
+                    all(tuple(body['routes'][key]) ==
+                        controller.partitioner.get_replicas(key, REPLICATION_FACTOR)
+                        for key in keys)))
+
+    malformed = [("A JSON array", keys), ("A JSON string", 'keys'), ("A JSON number", 7),
+                 ("JSON null", None), ("An empty keys list", {'keys': []}),
+                 ("A keys string", {'keys': 'key_1'})]
+    for label, body in malformed:
+        response = client.post('/query_batch', json=body)
+        results.append((f"{label} is rejected with 400", response.status_code == 400))
+    response = client.post('/query_batch', data='{not json', content_type='application/json')
+    results.append(("Malformed JSON is rejected with 400", response.status_code == 400))
+
+    print_section("QUERY BATCH ENDPOINT TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_batch_lookup()
+    test_query_batch_endpoint()
@@ -0,0 +1,123 @@
+import requests
+import time
+import signal
+import subprocess
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTROLLER_URLS, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, REPLICATION_FACTOR
+from client.client import KVStoreClient
+
+CONTROLLER_URL = CONTROLLER_URLS[0]
+NUM_KEYS = 500
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def worker_pid(worker_id):
+    """PID of a local worker process, or None"""
+    result = subprocess.run(['pgrep', '-f', f"worker.py {worker_id} "],
+                            capture_output=True, text=True)
+    pids = result.stdout.split()
+    return int(pids[0]) if pids else None
+
+
+def worker_status(worker_id):
+    """A worker's status in the controller's registry"""
+    workers = requests.get(f"{CONTROLLER_URL}/workers", timeout=5).json()['workers']
+    return workers.get(worker_id, {}).get('status')
+
+
+def test_catch_up():
+    """A worker that was marked failed catches up from its peers' replication logs"""
+
+    print_section("🧪 CATCH-UP TEST")
+    print("This test will:")
+    print(f"  1. Write {NUM_KEYS} keys")
+    print(f"  2. Pause a worker until the controller marks it failed (~{HEARTBEAT_TIMEOUT}s)")
+    print("  3. Overwrite the keys while it is away")
+    print("  4. Resume it and check it fetched only the missed writes")
+
+    input("\nPress Enter to start...")
+
+    client = KVStoreClient()
+    results = []
+
+    # Step 1: Data
+    print_section("Step 1: Writing Keys")
+    keys = [f"catch_up:{i:04d}" for i in range(NUM_KEYS)]
+    written = sum(1 for key in keys if client.put(key, "before"))
+    print(f"Wrote {written}/{NUM_KEYS} keys")
+    time.sleep(1)
+
+    workers = requests.get(f"{CONTROLLER_URL}/workers", timeout=5).json()['workers']
+    paused_id = sorted(workers)[-1]
+    paused_url = workers[paused_id]['url']
+    paused_keys = [key for key in keys
+                   if paused_id in client.router.get_replicas(key, REPLICATION_FACTOR)]
+    pid = worker_pid(paused_id)
+    if pid is None:
+        print(f"✗ Could not find {paused_id}'s process")
+        return False
+    before = requests.get(f"{paused_url}/replication", timeout=5).json()['catch_up']
+
+    # Step 2: Absence
+    print_section(f"Step 2: Pausing {paused_id}")
+    os.kill(pid, signal.SIGSTOP)
+    try:
+        deadline = time.time() + HEARTBEAT_TIMEOUT * 3
+        while worker_status(paused_id) != 'failed' and time.time() < deadline:
+            time.sleep(1)
+        print(f"{paused_id} is {worker_status(paused_id)}")
+        results.append(("Paused worker marked failed", worker_status(paused_id) == 'failed'))
+
+        # Step 3: Writes it misses
+        print_section("Step 3: Writing While It Is Away")
+        client.router.refresh()
+        written = sum(1 for key in keys if client.put(key, "after"))
+        print(f"Overwrote {written}/{NUM_KEYS} keys ({len(paused_keys)} belong on {paused_id})")
+    finally:
+        os.kill(pid, signal.SIGCONT)
+        print(f"Resumed {paused_id}")
+
+    # Step 4: Catch-up
+    print_section("Step 4: Catching Up")
+    # One session before it goes back on the ring and one after the cutover
+    deadline = time.time() + HEARTBEAT_INTERVAL * 4
+    stats = {}
+    while time.time() < deadline:
+        stats = requests.get(f"{paused_url}/replication", timeout=5).json()
+        if stats['catch_up']['sessions'] >= before['sessions'] + 2:
+            break
+        time.sleep(1)
+    totals = {field: stats['catch_up'][field] - before[field]
+              for field in ('sessions', 'delta_keys', 'snapshots', 'failed')}
+    print(f"Catch-up: {totals}")
+    results.append(("Caught up before and after rejoining the ring", totals['sessions'] == 2))
+    results.append(("Caught up from the logs without range copies",
+                    totals.get('snapshots') == 0 and totals.get('failed') == 0))
+    results.append(("Fetched only the missed writes",
+                    0 < totals.get('delta_keys', 0) <= len(paused_keys)))
+
+    current = sum(1 for key in paused_keys
+                  if requests.get(f"{paused_url}/get", params={'key': key},
+                                  timeout=5).json().get('value') == "after")
+    print(f"{paused_id} holds the new value of {current}/{len(paused_keys)} of its keys")
+    results.append(("Returning worker holds the new values", current == len(paused_keys)))
+
+    # Summary
+    print_section("CATCH-UP TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    return all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_catch_up()
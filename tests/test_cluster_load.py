@@ -0,0 +1,77 @@
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+import controller
+from utils import WorkerRegistry
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def test_cluster_load():
+    """/cluster/load sums the live workers' reports, with imbalance and the hottest partitions"""
+
+    print_section("🧪 CLUSTER LOAD TEST")
+    controller.worker_registry = WorkerRegistry()
+    controller.role = 'primary'
+    for i in range(3):
+        controller.worker_registry.register_worker(f"worker_{i}", 'localhost', 6000 + i)
+    controller.worker_registry.mark_worker_failed('worker_2')
+    controller.worker_loads.clear()
+    controller.worker_loads.update({
+        'worker_0': {'keys': 300, 'bytes': 3000, 'get_qps': 30.0, 'put_qps': 10.0,
+                     'replicate_qps': 20.0, 'p99_ms': 4.0, 'replication_backlog': 5,
+                     'replication_lag': 0.5, 'hints_pending': 1,
+                     'hot_partitions': [[7, 20.0], [3, 5.0]]},
+        'worker_1': {'keys': 100, 'bytes': 1000, 'get_qps': 10.0, 'put_qps': 0.0,
+                     'replicate_qps': 10.0, 'p99_ms': 9.0, 'replication_backlog': 0,
+                     'replication_lag': 2.0, 'hints_pending': 0,
+                     'hot_partitions': [[3, 30.0], [9, 1.0]]},
+        # Failed workers' last reports are left out
+        'worker_2': {'keys': 5000, 'get_qps': 999.0, 'p99_ms': 500.0,
+                     'hot_partitions': [[1, 999.0]]}
+    })
+    client = controller.app.test_client()
+    results = []
+
+    response = client.get('/cluster/load')
+    body = response.get_json()
+    totals = body['totals']
+    print(f"Totals: {totals}")
+    results.append(("Only live workers are reported",
+                    response.status_code == 200 and sorted(body['workers']) == ['worker_0', 'worker_1']))
+    results.append(("Counters and rates are summed",
+                    (totals['keys'], totals['bytes'], totals['get_qps'], totals['put_qps'],
+                     totals['replicate_qps'], totals['replication_backlog'],
+                     totals['hints_pending']) == (400, 4000, 40.0, 10.0, 30.0, 5, 1)))
+    results.append(("Latency and lag are the worst worker's",
+                    totals['p99_ms'] == 9.0 and totals['replication_lag'] == 2.0))
+    results.append(("Imbalance is max over mean",
+                    body['imbalance'] == {'keys': 1.5, 'qps': 1.5}))
+    results.append(("Hot partitions are merged across workers, hottest first",
+                    body['hot_partitions'] == [[3, 35.0], [7, 20.0], [9, 1.0]]))
+
+    controller.worker_loads.clear()
+    body = client.get('/cluster/load').get_json()
+    results.append(("No reports means no imbalance",
+                    body['imbalance'] == {'keys': None, 'qps': None} and
+                    body['totals']['p99_ms'] is None and body['hot_partitions'] == []))
+
+    print_section("CLUSTER LOAD TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_cluster_load()
@@ -0,0 +1,81 @@
+import time
+import sys
+import os
+from array import array
+
+# Add parent directory (and the worker's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'worker'))
+
+import worker
+from config import HLC_MAX_DRIFT_MS, REPLICATION_FACTOR
+from hlc import HybridLogicalClock, is_newer
+from replication import Replicator
+from routing import RingSnapshot, hash_key
+
+WORKER_ID = 'worker_0'
+KEY = 'drift:key'
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def start_lone_worker():
+    """Set up the worker module as the only replica of a one-worker ring"""
+    tokens = array('Q', sorted(hash_key(f"{WORKER_ID}:vnode{i}") for i in range(8)))
+    worker.worker_id = WORKER_ID
+    worker.clock = HybridLogicalClock(WORKER_ID, HLC_MAX_DRIFT_MS)
+    worker.replicator = Replicator(origin_id=WORKER_ID)
+    worker.router.ring = RingSnapshot.build(1, tokens, [WORKER_ID] * len(tokens),
+                                            REPLICATION_FACTOR)
+    worker.router.worker_urls = {WORKER_ID: 'http://localhost:6000'}
+    worker.SYNC_REPLICAS = 1  # nobody else to acknowledge
+    return worker.app.test_client()
+
+
+def test_put_after_drifted_peer():
+    """A PUT over a value stamped by a peer clock past HLC_MAX_DRIFT_MS still wins"""
+
+    print_section("🧪 DRIFTED PEER CLOCK TEST")
+    client = start_lone_worker()
+    results = []
+
+    # A peer whose clock runs well past the drift bound replicates a write
+    future_ms = int(time.time() * 1000) + 2 * HLC_MAX_DRIFT_MS
+    drifted = [future_ms, 3, 'worker_9']
+    response = client.post('/replicate', json={'key': KEY, 'value': 'peer', 'version': drifted})
+    results.append(("Drifted write is stored", response.get_json().get('applied') is True))
+    results.append(("Our clock does not follow it", worker.clock.wall_ms < future_ms))
+
+    # A client overwrites it through this worker
+    response = client.post('/put', json={'key': KEY, 'value': 'client'})
+    body = response.get_json()
+    print(f"PUT answered {response.status_code}: version {body.get('version')} over {drifted}")
+    results.append(("PUT succeeds", response.status_code == 200 and body.get('success')))
+    results.append(("The client's value is stored", worker.storage.get(KEY) == 'client'))
+    results.append(("Its version supersedes the drifted one",
+                    is_newer(body.get('version'), drifted) and
+                    worker.versions.get(KEY) == body.get('version')))
+    results.append(("Other keys keep following our own clock",
+                    worker.clock.now()[0] < future_ms))
+
+    # Replaying the drifted write does not roll the key back
+    response = client.post('/replicate', json={'key': KEY, 'value': 'peer', 'version': drifted})
+    results.append(("Stale replay is ignored",
+                    response.get_json().get('applied') is False and
+                    worker.storage.get(KEY) == 'client'))
+
+    print_section("DRIFTED PEER CLOCK TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_put_after_drifted_peer()
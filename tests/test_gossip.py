@@ -0,0 +1,158 @@
+import requests
+import time
+import random
+import subprocess
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (CONTROLLER_URLS, GOSSIP_INTERVAL, GOSSIP_REPORT_INTERVAL,
+                    GOSSIP_REPORT_TIMEOUT, GOSSIP_SUSPECT_TIMEOUT, HEARTBEAT_INTERVAL,
+                    MEMBERSHIP, WORKER_BASE_PORT)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTROLLER_URL = CONTROLLER_URLS[0]
+NUM_WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+NUM_KILLED = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def wait_for(condition, timeout, interval=0.5):
+    """Poll until condition() is true; returns False on timeout"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if condition():
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(interval)
+    return False
+
+
+def get_workers():
+    return requests.get(f"{CONTROLLER_URL}/workers", timeout=5).json().get('workers', {})
+
+
+def start_cluster():
+    """Start a controller (without metadata persistence) and NUM_WORKERS workers"""
+    processes = {}
+    processes['controller'] = subprocess.Popen(
+        [sys.executable, 'controller/controller.py', '--metadata-dir', ''],
+        cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(lambda: requests.get(f"{CONTROLLER_URL}/status", timeout=1).ok, 20)
+    
+    for i in range(NUM_WORKERS):
+        worker_id = f"worker_{i + 1}"
+        processes[worker_id] = subprocess.Popen(
+            [sys.executable, 'worker/worker.py', worker_id, str(WORKER_BASE_PORT + i)],
+            cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return processes
+
+
+def members_view(port):
+    """(alive, suspect, dead) peer counts in one worker's gossip view"""
+    members = requests.get(f"http://localhost:{port}/gossip/members",
+                           timeout=2).json()['members'].values()
+    return tuple(sum(1 for m in members if m['status'] == status)
+                 for status in ('alive', 'suspect', 'dead'))
+
+
+def test_gossip_detection():
+    """SWIM failure detection across a large local cluster"""
+    
+    print_section(f"🧪 GOSSIP MEMBERSHIP TEST ({NUM_WORKERS} workers)")
+    print("This test will:")
+    print(f"  1. Start a controller and {NUM_WORKERS} workers on this machine")
+    print("  2. Wait for every worker to learn all its peers")
+    print(f"  3. Kill {NUM_KILLED} workers")
+    print("  4. Measure how long until the controller hears of each failure")
+    print("\nStop any running cluster first (./stop_all.sh)")
+    
+    if MEMBERSHIP != 'gossip':
+        print("\n✗ Set MEMBERSHIP = 'gossip' in config.py to run this test")
+        return False
+    
+    input("\nPress Enter to start...")
+    
+    processes = start_cluster()
+    results = []
+    try:
+        # Step 1: Registration
+        print_section("Step 1: Starting Workers")
+        registered = wait_for(lambda: requests.get(f"{CONTROLLER_URL}/status", timeout=2)
+                              .json()['active_workers'] == NUM_WORKERS, 180, interval=2)
+        print(f"Active workers: {len(get_workers())}")
+        results.append(("All workers registered", registered))
+        
+        # Step 2: Convergence
+        print_section("Step 2: Gossip Convergence")
+        started = time.time()
+        sample = random.sample(range(NUM_WORKERS), min(10, NUM_WORKERS))
+        converged = wait_for(lambda: all(members_view(WORKER_BASE_PORT + i) == (NUM_WORKERS - 1, 0, 0)
+                                         for i in sample), 120, interval=1)
+        print(f"Sampled workers see {NUM_WORKERS - 1} alive peers after "
+              f"{time.time() - started:.1f}s")
+        results.append(("Membership converged", converged))
+        
+        heartbeat_rate = NUM_WORKERS / HEARTBEAT_INTERVAL
+        report_rate = NUM_WORKERS / GOSSIP_REPORT_INTERVAL
+        print(f"Controller load: {report_rate:.1f} reports/s instead of "
+              f"{heartbeat_rate:.1f} heartbeats/s; each worker sends "
+              f"{1 / GOSSIP_INTERVAL:.1f} probes/s")
+        
+        # Step 3: Failures
+        print_section(f"Step 3: Killing {NUM_KILLED} Workers")
+        victims = random.sample([f"worker_{i + 1}" for i in range(NUM_WORKERS)], NUM_KILLED)
+        killed_at = time.time()
+        for worker_id in victims:
+            processes[worker_id].kill()
+            print(f"  ✓ Killed {worker_id}")
+        
+        # Step 4: Detection
+        print_section("Step 4: Failure Detection")
+        detected = {}
+        
+        def all_detected():
+            workers = get_workers()
+            for worker_id in victims:
+                if worker_id not in detected and workers[worker_id]['status'] == 'failed':
+                    detected[worker_id] = time.time() - killed_at
+            return len(detected) == len(victims)
+        
+        wait_for(all_detected, GOSSIP_REPORT_TIMEOUT, interval=0.25)
+        for worker_id in victims:
+            if worker_id in detected:
+                print(f"  ✓ {worker_id} failed after {detected[worker_id]:.1f}s")
+            else:
+                print(f"  ✗ {worker_id} not detected")
+        budget = GOSSIP_SUSPECT_TIMEOUT + 5 * GOSSIP_INTERVAL + 5
+        results.append(("Failures detected by gossip",
+                        len(detected) == len(victims) and max(detected.values()) < budget))
+        
+        time.sleep(GOSSIP_SUSPECT_TIMEOUT)
+        false_positives = [worker_id for worker_id, info in get_workers().items()
+                           if info['status'] == 'failed' and worker_id not in victims]
+        print(f"Live workers marked failed: {false_positives or 'none'}")
+        results.append(("No false positives", not false_positives))
+    
+    finally:
+        for process in processes.values():
+            process.kill()
+    
+    # Summary
+    print_section("GOSSIP MEMBERSHIP TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+    
+    return all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_gossip_detection()
@@ -0,0 +1,114 @@
+import requests
+import time
+import signal
+import subprocess
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTROLLER_URLS, HEARTBEAT_TIMEOUT, REPLICATION_FACTOR
+from client.client import KVStoreClient
+
+CONTROLLER_URL = CONTROLLER_URLS[0]
+NUM_KEYS = 1000
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def worker_pid(worker_id):
+    """PID of a local worker process, or None"""
+    result = subprocess.run(['pgrep', '-f', f"worker.py {worker_id} "],
+                            capture_output=True, text=True)
+    pids = result.stdout.split()
+    return int(pids[0]) if pids else None
+
+
+def test_hinted_handoff():
+    """PUTs succeed while two of a key's replicas are down, and hints reach them later"""
+
+    print_section("🧪 HINTED HANDOFF TEST")
+    print("This test will:")
+    print("  1. Find keys whose primary is up and whose other two replicas are two chosen workers")
+    print(f"  2. Pause both workers (for less than the {HEARTBEAT_TIMEOUT}s failure timeout)")
+    print("  3. Write the keys and check the PUTs succeed through hints")
+    print("  4. Resume the workers and check the hints reach them")
+
+    input("\nPress Enter to start...")
+
+    client = KVStoreClient()
+    results = []
+
+    workers = requests.get(f"{CONTROLLER_URL}/workers", timeout=5).json()['workers']
+    paused_ids = sorted(workers)[-2:]
+    paused_urls = [workers[w]['url'] for w in paused_ids]
+    live_urls = [info['url'] for w, info in workers.items() if w not in paused_ids]
+
+    # Step 1: Keys
+    print_section("Step 1: Choosing Keys")
+    candidates = [f"hinted:{i:04d}" for i in range(NUM_KEYS)]
+    keys = [key for key in candidates
+            if set(client.router.get_replicas(key, REPLICATION_FACTOR)[1:]) == set(paused_ids)]
+    print(f"{len(keys)} keys have {paused_ids[0]} and {paused_ids[1]} as their other replicas")
+    pids = [worker_pid(w) for w in paused_ids]
+    if not keys or None in pids:
+        print("✗ No suitable keys or worker processes")
+        return False
+
+    # Step 2: Pause
+    print_section(f"Step 2: Pausing {', '.join(paused_ids)}")
+    for pid in pids:
+        os.kill(pid, signal.SIGSTOP)
+    try:
+        # Step 3: Writes
+        print_section("Step 3: Writing With Two Replicas Down")
+        started = time.time()
+        written = sum(1 for key in keys if client.put(key, "hinted"))
+        elapsed = time.time() - started
+        print(f"{written}/{len(keys)} PUTs succeeded in {elapsed:.1f}s")
+        results.append(("PUTs succeed with two replicas down", written == len(keys)))
+    finally:
+        for pid in pids:
+            os.kill(pid, signal.SIGCONT)
+        print(f"Resumed {', '.join(paused_ids)}")
+
+    held = sum(requests.get(f"{url}/replication", timeout=5).json()['hints']['pending']
+               for url in live_urls)
+    print(f"Hints held by the live workers: {held}")
+
+    # Step 4: Handoff
+    print_section("Step 4: Handing Off")
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        hint_stats = [requests.get(f"{url}/replication", timeout=5).json()['hints']
+                      for url in live_urls]
+        if sum(stats['pending'] for stats in hint_stats) == 0:
+            break
+        time.sleep(1)
+    delivered = sum(peer['sent'] for stats in hint_stats for peer in stats['peers'].values())
+    print(f"Hints delivered: {delivered}")
+    results.append(("Hints delivered", delivered > 0))
+
+    current = sum(1 for key in keys for url in paused_urls
+                  if requests.get(f"{url}/get", params={'key': key},
+                                  timeout=5).json().get('value') == "hinted")
+    print(f"Paused workers hold {current}/{2 * len(keys)} of the writes")
+    results.append(("Replicas caught up", current == 2 * len(keys)))
+    statuses = requests.get(f"{CONTROLLER_URL}/workers", timeout=5).json()['workers']
+    results.append(("No worker was marked failed",
+                    all(statuses[w]['status'] == 'active' for w in paused_ids)))
+
+    # Summary
+    print_section("HINTED HANDOFF TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    return all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_hinted_handoff()
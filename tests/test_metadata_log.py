@@ -0,0 +1,249 @@
+import json
+import shutil
+import tempfile
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+import controller
+from config import NUM_WORKERS, REPLICATION_FACTOR, VIRTUAL_NODES
+from metadata import MetadataStore
+from routing import CONTROLLER_TERM_HEADER, RingRouter
+from utils import ConsistentHash, RangePartitioner, WorkerRegistry
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def controller_state():
+    """The ring and registry as a controller would serve them"""
+    ring = controller.partitioner.snapshot
+    workers = {worker_id: {k: v for k, v in info.items() if k != 'registered_at'}
+               for worker_id, info in controller.worker_registry.workers.items()}
+    return list(ring.tokens), list(ring.owners), dict(controller.partitioner.weights), workers
+
+
+def restart_controller(directory):
+    """Drop the in-memory ring and registry and recover them from disk"""
+    controller.partitioner = ConsistentHash(NUM_WORKERS, VIRTUAL_NODES, REPLICATION_FACTOR)
+    controller.worker_registry = WorkerRegistry()
+    controller.recover_metadata(directory)
+
+
+def test_metadata_replay():
+    """A restarted controller rebuilds the same ring and registry from its snapshot and log"""
+
+    print_section("🧪 METADATA LOG REPLAY TEST")
+    directory = tempfile.mkdtemp(prefix='metadata_test_')
+    results = []
+
+    restart_controller(directory)
+    for i in range(4):
+        controller.worker_registry.register_worker(f"worker_{i}", 'localhost', 7000 + i)
+        controller.partitioner.add_worker(f"worker_{i}")
+    controller.partitioner.set_weight('worker_1', 2.0)
+    controller.worker_registry.set_weight('worker_1', 2.0)
+    controller.checkpoint_metadata()
+    print(f"Snapshot at lsn {controller.metadata_store.base_lsn}")
+
+    # Changes after the snapshot only live in the log
+    token = controller.partitioner.snapshot.tokens[0]
+    controller.partitioner.move_vnode(token, 'worker_3')
+    controller.worker_registry.mark_worker_failed('worker_2')
+    controller.partitioner.remove_worker('worker_2')
+    expected = controller_state()
+    logged = controller.metadata_store.lsn
+    print(f"{controller.metadata_store.pending} records after the snapshot, last lsn {logged}")
+
+    # A crash in the middle of appending leaves a torn record behind
+    with open(os.path.join(directory, MetadataStore.LOG_FILE), 'a') as f:
+        f.write('{"kind":"ring","op":"add_worker","args":{"worker_id":"torn"')
+
+    restart_controller(directory)
+    recovered = controller_state()
+    results.append(("Ring tokens and owners are recovered", recovered[:2] == expected[:2]))
+    results.append(("Weights are recovered", recovered[2] == expected[2]))
+    results.append(("Registry is recovered", recovered[3] == expected[3]))
+    results.append(("Moved vnodes are remembered",
+                    controller.partitioner.adopted.get('worker_3') == {token}))
+    results.append(("Torn record is dropped",
+                    'torn' not in controller.partitioner.weights and
+                    controller.metadata_store.lsn == logged))
+
+    # New changes continue the log after the recovered position
+    controller.partitioner.add_worker('worker_4')
+    lines = controller.metadata_store.records_after(logged)
+    results.append(("Logging resumes after the last record",
+                    [json.loads(line)['lsn'] for line in lines] == [logged + 1]))
+    results.append(("Compacted positions are refused",
+                    controller.metadata_store.records_after(-1) is None))
+
+    expected = controller_state()
+    controller.checkpoint_metadata()
+    restart_controller(directory)
+    results.append(("Recovery from a snapshot alone matches", controller_state() == expected))
+    shutil.rmtree(directory)
+
+    print_section("METADATA LOG REPLAY TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+class FullDisk:
+    """A metadata log whose appends fail, as on a full or failed disk"""
+
+    lsn = 0
+
+    def append(self, record):
+        raise OSError(28, 'No space left on device')
+
+
+def refused(change):
+    """Whether a change failed because its log record could not be written"""
+    try:
+        change()
+    except OSError:
+        return True
+    return False
+
+
+def test_log_before_publish():
+    """A change whose log record cannot be written is never served"""
+
+    print_section("🧪 LOG BEFORE PUBLISH TEST")
+    results = []
+
+    ring = ConsistentHash(NUM_WORKERS, VIRTUAL_NODES, REPLICATION_FACTOR)
+    for i in range(3):
+        ring.add_worker(f"worker_{i}")
+    ring.journal = FullDisk()
+    snapshot, weights = ring.snapshot, dict(ring.weights)
+    changes = [lambda: ring.add_worker('worker_9'),
+               lambda: ring.remove_worker('worker_0'),
+               lambda: ring.set_weight('worker_1', 2.0),
+               lambda: ring.move_vnode(snapshot.tokens[0], 'worker_2'
+                                       if snapshot.owners[0] != 'worker_2' else 'worker_1')]
+    results.append(("Ring changes fail when the log append fails",
+                    all(refused(change) for change in changes)))
+    results.append(("The ring is left as it was",
+                    ring.snapshot is snapshot and ring.weights == weights and not ring.adopted))
+
+    ranges = RangePartitioner(REPLICATION_FACTOR)
+    for i in range(4):
+        ranges.add_worker(f"worker_{i}")
+    ranges.journal = FullDisk()
+    snapshot, weights = ranges.snapshot, dict(ranges.weights)
+    replicas = snapshot.replica_sets[0]
+    spare = next(w for w in sorted(weights) if w not in replicas)
+    changes = [lambda: ranges.add_worker('worker_9'),
+               lambda: ranges.remove_worker('worker_0'),
+               lambda: ranges.set_weight('worker_1', 2.0),
+               lambda: ranges.split_range('', 'm'),
+               lambda: ranges.move_replica('', replicas[0], spare)]
+    results.append(("Range map changes fail when the log append fails",
+                    all(refused(change) for change in changes)))
+    results.append(("The range map is left as it was",
+                    ranges.snapshot is snapshot and ranges.weights == weights))
+
+    registry = WorkerRegistry()
+    registry.register_worker('worker_0', 'localhost', 7000)
+    registry.journal = FullDisk()
+    snapshot = registry.snapshot
+    changes = [lambda: registry.register_worker('worker_1', 'localhost', 7001),
+               lambda: registry.set_weight('worker_0', 2.0),
+               lambda: registry.mark_worker_failed('worker_0')]
+    results.append(("Registry changes fail when the log append fails",
+                    all(refused(change) for change in changes)))
+    results.append(("The registry is left as it was", registry.snapshot is snapshot))
+
+    directory = tempfile.mkdtemp(prefix='metadata_test_')
+    store = MetadataStore(directory)
+    store.load()
+    store.append({'kind': 'ring', 'op': 'add_worker', 'args': {'worker_id': 'worker_0'}})
+    store._log.close()  # the next write fails
+    try:
+        store.append({'kind': 'registry', 'workers': {}})
+        failed = False
+    except ValueError:  # write to a closed file
+        failed = True
+    results.append(("A failed append does not use up a sequence number",
+                    failed and store.lsn == 1))
+    shutil.rmtree(directory)
+
+    print_section("LOG BEFORE PUBLISH TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+def test_failover_terms():
+    """Promotion bumps a persisted term, and callers that saw a higher term fence the old primary"""
+
+    print_section("🧪 FAILOVER TERM TEST")
+    directory = tempfile.mkdtemp(prefix='metadata_test_')
+    results = []
+
+    restart_controller(directory)
+    controller.worker_registry.register_worker('worker_0', 'localhost', 7000)
+    controller.partitioner.add_worker('worker_0')
+    results.append(("A fresh controller starts in term 0", controller.term == 0))
+
+    # Promote this controller as if it had been a standby
+    controller.role = 'standby'
+    controller.metadata_dir = directory
+    controller.promote('term test')
+    print(f"Promoted: term {controller.term}")
+    results.append(("Promotion starts term 1", controller.term == 1))
+    results.append(("The term is persisted", MetadataStore(directory).term == 1))
+
+    client = controller.app.test_client()
+    response = client.get('/status')
+    results.append(("Responses carry the term",
+                    response.headers.get(CONTROLLER_TERM_HEADER) == '1' and
+                    response.get_json()['term'] == 1))
+    response = client.post('/heartbeat', json={'worker_id': 'worker_0'},
+                           headers={CONTROLLER_TERM_HEADER: '2'})
+    results.append(("Callers that saw a higher term are refused", response.status_code == 409))
+
+    rejected = 0
+    for bad in (0, 1):
+        try:
+            controller.metadata_store.save_term(bad)
+        except ValueError:
+            rejected += 1
+    results.append(("The term never goes backwards", rejected == 2))
+
+    restart_controller(directory)
+    results.append(("A restarted controller recovers its term", controller.term == 1))
+
+    router = RingRouter('http://localhost:1')
+    router.observe_term(3)
+    results.append(("Routers refuse answers from a lower term",
+                    not router.observe_term(2) and router.observe_term(3) and
+                    router.observe_term(None) and router.term == 3))
+    shutil.rmtree(directory)
+
+    print_section("FAILOVER TERM TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_metadata_replay()
+    test_log_before_publish()
+    test_failover_terms()
@@ -0,0 +1,119 @@
+import math
+import random
+import time
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+from utils import PhiAccrualDetector, WorkerRegistry
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def test_phi_accrual():
+    """Phi grows with silence, and its timeout follows each worker's jitter"""
+
+    print_section("🧪 PHI-ACCRUAL DETECTOR TEST")
+    detector = PhiAccrualDetector(threshold=8.0, window_size=100, min_std=0.1,
+                                  acceptable_pause=0.0, min_samples=5)
+    rng = random.Random(3)
+    results = []
+
+    for _ in range(4):
+        detector.heartbeat('steady', 1.0)
+    results.append(("No verdict before min_samples intervals",
+                    detector.phi('steady', 10.0) is None and detector.timeout('steady') is None))
+
+    for _ in range(96):
+        detector.heartbeat('steady', 1.0)
+        detector.heartbeat('jittery', max(0.1, rng.gauss(1.0, 0.5)))
+
+    phis = [detector.phi('steady', elapsed) for elapsed in (0.5, 1.0, 1.5, 2.0)]
+    print(f"Steady worker phi at 0.5/1/1.5/2s: {[round(p, 2) for p in phis]}")
+    results.append(("Phi rises with silence", phis == sorted(phis) and phis[-1] > phis[0]))
+    results.append(("Phi is ~0.3 at the mean interval", abs(phis[1] - math.log10(2)) < 1e-9))
+
+    steady, jittery = detector.timeout('steady'), detector.timeout('jittery')
+    print(f"Timeouts: steady {steady:.2f}s, jittery {jittery:.2f}s")
+    results.append(("Jittery heartbeats get a longer timeout", jittery > steady))
+    results.append(("Phi reaches the threshold at the timeout",
+                    abs(detector.phi('steady', steady) - 8.0) < 0.01 and
+                    abs(detector.phi('jittery', jittery) - 8.0) < 0.01))
+    results.append(("Deviation is floored at min_std", abs(steady - (1.0 + detector.z * 0.1)) < 1e-9))
+    results.append(("Extreme silence is infinitely suspicious",
+                    detector.phi('steady', 1e6) == float('inf')))
+
+    window = PhiAccrualDetector(window_size=10, min_samples=5)
+    for _ in range(20):
+        window.heartbeat('w', 1.0)
+    for _ in range(10):
+        window.heartbeat('w', 3.0)
+    results.append(("Only the last window_size intervals count",
+                    list(window.intervals['w']) == [3.0] * 10))
+
+    detector.reset('steady')
+    results.append(("Reset forgets the intervals", detector.timeout('steady') is None))
+
+    registry = WorkerRegistry(heartbeat_timeout=15, phi_detector=detector)
+    results.append(("Registry falls back to the fixed timeout", registry.timeout('steady') == 15))
+    results.append(("Registry uses the phi timeout once known", registry.timeout('jittery') == jittery))
+
+    print_section("PHI-ACCRUAL DETECTOR TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+def test_deadline_heap():
+    """Workers fail when their deadline passes; heartbeats push deadlines back"""
+
+    print_section("🧪 DEADLINE HEAP TEST")
+    registry = WorkerRegistry(heartbeat_timeout=0.3)
+    results = []
+
+    start = time.time()
+    registry.register_worker('alive', 'localhost', 6000)
+    registry.register_worker('silent', 'localhost', 6001)
+    results.append(("Nobody fails before a deadline", registry.check_failed_workers() == []))
+
+    time.sleep(0.15)
+    registry.update_heartbeat('alive')
+    failed = registry.wait_for_failures()
+    waited = time.time() - start
+    print(f"Failed after {waited:.2f}s: {failed}")
+    results.append(("The silent worker fails at its deadline",
+                    failed == ['silent'] and waited >= 0.3))
+    results.append(("A worker that sent a heartbeat is rescheduled, not failed",
+                    registry.get_worker('alive')['status'] == 'active' and
+                    registry._scheduled['alive'] > start + 0.3))
+
+    results.append(("A failed worker's heartbeat reactivates it",
+                    registry.update_heartbeat('silent') == 'failed' and
+                    registry.get_worker('silent')['status'] == 'active'))
+    results.append(("Unknown workers are not tracked", registry.update_heartbeat('missing') is None))
+
+    # 'alive' last reported at ~0.15s, 'silent' at ~0.3s: they fail in that order
+    order = registry.wait_for_failures() + registry.wait_for_failures()
+    results.append(("Workers fail in deadline order once silent", order == ['alive', 'silent']))
+
+    print_section("DEADLINE HEAP TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_phi_accrual()
+    test_deadline_heap()
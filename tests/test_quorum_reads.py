@@ -0,0 +1,114 @@
+import requests
+import time
+import signal
+import subprocess
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTROLLER_URLS, REPLICATION_FACTOR
+from client.client import KVStoreClient
+
+CONTROLLER_URL = CONTROLLER_URLS[0]
+NUM_KEYS = 60
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def worker_pid(worker_id):
+    """PID of a local worker process, or None"""
+    result = subprocess.run(['pgrep', '-f', f"worker.py {worker_id} "],
+                            capture_output=True, text=True)
+    pids = result.stdout.split()
+    return int(pids[0]) if pids else None
+
+
+def test_quorum_reads():
+    """Consistency levels, read repair and hedging around a paused primary"""
+
+    print_section("🧪 QUORUM READ TEST")
+    print("This test will:")
+    print(f"  1. Write {NUM_KEYS} keys and read them at ONE, QUORUM and ALL")
+    print("  2. Make one replica newer and check an ALL read repairs the others")
+    print("  3. Pause a primary worker (SIGSTOP) and time ONE reads of its keys")
+
+    input("\nPress Enter to start...")
+
+    client = KVStoreClient()
+    results = []
+
+    # Step 1: Consistency levels
+    print_section("Step 1: Reading at Each Consistency Level")
+    keys = [f"quorum:{i:03d}" for i in range(NUM_KEYS)]
+    for key in keys:
+        client.put(key, f"value_of_{key}")
+    time.sleep(1)
+
+    for level in ('one', 'quorum', 'all'):
+        correct = sum(1 for key in keys[:10] if client.get(key, level) == f"value_of_{key}")
+        print(f"  {level.upper()}: {correct}/10 correct")
+        results.append((f"{level.upper()} reads return the value", correct == 10))
+
+    # Step 2: Read repair
+    print_section("Step 2: Read Repair")
+    key = keys[0]
+    replica_urls = client.router.get_replica_urls(key, REPLICATION_FACTOR)
+    current = requests.get(f"{replica_urls[0]}/get", params={'key': key}, timeout=5).json()
+    newer = [current['version'][0] + 1, 0, 'test_quorum_reads']
+    requests.post(f"{replica_urls[-1]}/replicate", json={
+        'key': key, 'value': 'newer_value', 'version': newer}, timeout=5)
+    print(f"Wrote a newer version of {key} to {replica_urls[-1]} only")
+
+    value = client.get(key, 'all')
+    time.sleep(1)
+    values = [requests.get(f"{url}/get", params={'key': key}, timeout=5).json().get('value')
+              for url in replica_urls]
+    print(f"ALL read returned {value}; replicas now hold {values}")
+    results.append(("ALL read returns the newest version", value == 'newer_value'))
+    results.append(("Stale replicas repaired", all(v == 'newer_value' for v in values)))
+
+    # Step 3: Hedging
+    print_section("Step 3: Hedged Reads Around a Paused Primary")
+    workers = requests.get(f"{CONTROLLER_URL}/workers", timeout=5).json()['workers']
+    paused_id = sorted(workers)[0]
+    paused_keys = [key for key in keys
+                   if client.router.get_replicas(key, REPLICATION_FACTOR)[0] == paused_id]
+    pid = worker_pid(paused_id)
+    if pid is None or not paused_keys:
+        print(f"✗ Could not find {paused_id}'s process or keys")
+        results.append(("Reads hedge around a paused primary", False))
+    else:
+        hedged_before = client.hedged_reads
+        os.kill(pid, signal.SIGSTOP)
+        print(f"Paused {paused_id} (pid {pid}), the primary of {len(paused_keys)} keys")
+        try:
+            latencies = []
+            for key in paused_keys:
+                started = time.perf_counter()
+                ok = client.get(key, 'one') == f"value_of_{key}"
+                latencies.append((time.perf_counter() - started, ok))
+        finally:
+            os.kill(pid, signal.SIGCONT)
+            print(f"Resumed {paused_id}")
+
+        worst = max(latency for latency, _ in latencies)
+        print(f"Hedged reads: {client.hedged_reads - hedged_before}, "
+              f"slowest read: {worst * 1000:.0f}ms (worker timeout is 10s)")
+        results.append(("Reads hedge around a paused primary",
+                        all(ok for _, ok in latencies) and worst < 1.0))
+
+    # Summary
+    print_section("QUORUM READ TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    return all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_quorum_reads()
@@ -0,0 +1,164 @@
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+import controller
+from utils import RangePartitioner
+
+REPLICATION_FACTOR = 3
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def test_range_splits():
+    """Splits cut a range in two without changing who holds its keys"""
+
+    print_section("🧪 RANGE SPLIT TEST")
+    ranges = RangePartitioner(REPLICATION_FACTOR)
+    results = []
+
+    ranges.add_worker('worker_0')
+    results.append(("A lone worker holds the whole key space",
+                    ranges.snapshot.replica_sets == [('worker_0',)]))
+    for i in range(1, 4):
+        ranges.add_worker(f"worker_{i}")
+    full = ranges.snapshot.replica_sets[0]
+    results.append(("Workers top up the range to the replication factor",
+                    len(full) == REPLICATION_FACTOR))
+
+    version = ranges.version
+    results.append(("Split at 'm'", ranges.split_range('', 'm')))
+    results.append(("Split at 't'", ranges.split_range('m', 't')))
+    snapshot = ranges.snapshot
+    print(f"Bounds: {snapshot.bounds}, version {version} -> {snapshot.version}")
+    results.append(("Bounds are sorted range starts", snapshot.bounds == ['', 'm', 't']))
+    results.append(("Both halves keep the replicas", set(snapshot.replica_sets) == {full}))
+    results.append(("Keys land in [start, end)",
+                    [snapshot.range_index(key) for key in ('', 'l', 'm', 's', 't', 'zzz')] ==
+                    [0, 0, 1, 1, 2, 2]))
+    results.append(("Last range is unbounded", snapshot.range_end(2) is None))
+
+    rejected = [ranges.split_range('m', 'm'), ranges.split_range('m', 'z'),
+                ranges.split_range('b', 'c'), ranges.split_range('', '')]
+    results.append(("Splits outside a range or at its start are rejected", not any(rejected)))
+    results.append(("Rejected splits publish nothing", ranges.version == snapshot.version))
+
+    print_section("RANGE SPLIT TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+def test_range_moves():
+    """Moves hand one range replica to another worker in the same position"""
+
+    print_section("🧪 RANGE MOVE TEST")
+    ranges = RangePartitioner(REPLICATION_FACTOR)
+    results = []
+    for i in range(4):
+        ranges.add_worker(f"worker_{i}")
+    ranges.split_range('', 'm')
+
+    replicas = ranges.snapshot.replica_sets[1]
+    spare = next(w for w in sorted(ranges.weights) if w not in replicas)
+    results.append(("Move the primary of [m, ...)", ranges.move_replica('m', replicas[0], spare)))
+    moved = ranges.snapshot.replica_sets[1]
+    print(f"[m, ...) replicas: {replicas} -> {moved}")
+    results.append(("The new worker takes the primary's position",
+                    moved == (spare,) + replicas[1:]))
+    results.append(("Other ranges are untouched", ranges.snapshot.replica_sets[0] == replicas))
+
+    version = ranges.version
+    rejected = [ranges.move_replica('m', replicas[0], replicas[1]),  # no longer a replica
+                ranges.move_replica('m', spare, replicas[1]),        # already a replica
+                ranges.move_replica('n', spare, replicas[0])]        # not a range start
+    results.append(("Invalid moves are rejected", not any(rejected)))
+    results.append(("Rejected moves publish nothing", ranges.version == version))
+
+    ranges.remove_worker(spare)
+    refilled = ranges.snapshot.replica_sets
+    print(f"After removing {spare}: {refilled}")
+    results.append(("Removal re-fills the ranges it served",
+                    all(len(r) == REPLICATION_FACTOR and spare not in r for r in refilled)))
+    results.append(("Old versions stay in the history",
+                    ranges.get_snapshot(version) is not None and
+                    ranges.get_snapshot(version).replica_sets[1] == moved))
+
+    ranges.remove_worker(replicas[1])  # leave the ranges a replica short
+    version = ranges.version
+    preview = ranges.preview_add('worker_9', 2.0)
+    results.append(("preview_add publishes nothing", ranges.version == version))
+    ranges.add_worker('worker_9', 2.0)
+    results.append(("preview_add predicts the map add_worker publishes",
+                    preview.replica_sets == ranges.snapshot.replica_sets))
+    results.append(("Reweighting moves no ranges",
+                    ranges.preview_set_weight('worker_9', 3.0) is ranges.snapshot and
+                    ranges.set_weight('worker_9', 3.0, if_version=ranges.version) and
+                    ranges.get_weight('worker_9') == 3.0))
+    results.append(("Workers holding no ranges are not reweighted",
+                    ranges.preview_set_weight('worker_99', 1.0) is None and
+                    not ranges.set_weight('worker_99', 1.0)))
+
+    print_section("RANGE MOVE TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+def test_range_load():
+    """Worker range stats combine per range: keys from the fullest replica, requests summed"""
+
+    print_section("🧪 RANGE LOAD TEST")
+    ranges = RangePartitioner(REPLICATION_FACTOR)
+    for i in range(3):
+        ranges.add_worker(f"worker_{i}")
+    ranges.split_range('', 'm')
+    ring = ranges.snapshot
+    primary, secondary, third = ring.get_replicas('m', REPLICATION_FACTOR)
+    results = []
+
+    controller.range_stats = {
+        primary: {'ring_version': ring.version, 'ranges': [
+            {'start': '', 'keys': 90, 'qps': 10.0, 'split_key': 'f'},
+            {'start': 'm', 'keys': 40, 'qps': 5.0, 'split_key': 'p'}]},
+        secondary: {'ring_version': ring.version, 'ranges': [
+            {'start': '', 'keys': 100, 'qps': 2.0, 'split_key': 'g'},
+            {'start': 'm', 'keys': 38, 'qps': 7.0, 'split_key': 'q'}]},
+        third: {'ring_version': ring.version - 1, 'ranges': [
+            {'start': 'm', 'keys': 9999, 'qps': 99.0, 'split_key': 'z'}]}
+    }
+    loads = controller.collect_range_load(ring)
+    print(f"Range loads: {loads}")
+    results.append(("Keys come from the fullest replica",
+                    loads['']['keys'] == 100 and loads['m']['keys'] == 40))
+    results.append(("Requests are summed over the replicas",
+                    loads['']['qps'] == 12.0 and loads['m']['qps'] == 12.0))
+    results.append(("The range primary's split key wins",
+                    loads['']['split_key'] == 'f' and loads['m']['split_key'] == 'p'))
+    results.append(("Reports against another map version are skipped",
+                    all(load['keys'] < 9999 for load in loads.values())))
+
+    print_section("RANGE LOAD TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_range_splits()
+    test_range_moves()
+    test_range_load()
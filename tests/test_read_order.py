@@ -0,0 +1,91 @@
+import sys
+import os
+from array import array
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from client.client import KVStoreClient
+from config import REPLICATION_FACTOR
+from routing import RingSnapshot, hash_key
+
+KEY = 'read_order:hot'
+NUM_ORDERS = 3000
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def replica_client(max_staleness=None):
+    """A replica-reading client routing with a local three-worker ring"""
+    workers = [f"worker_{i}" for i in range(REPLICATION_FACTOR)]
+    vnodes = sorted((hash_key(f"{worker_id}:vnode{i}"), worker_id)
+                    for worker_id in workers for i in range(8))
+    client = KVStoreClient(read_from='replicas', max_staleness=max_staleness)
+    client.router.ring = RingSnapshot.build(1, array('Q', [token for token, _ in vnodes]),
+                                            [worker_id for _, worker_id in vnodes],
+                                            REPLICATION_FACTOR)
+    client.router.worker_urls = {worker_id: f"http://localhost:{6000 + i}"
+                                 for i, worker_id in enumerate(workers)}
+    return client
+
+
+def first_choices(client):
+    """Share of NUM_ORDERS read orders that start at each replica"""
+    counts = {}
+    for _ in range(NUM_ORDERS):
+        url = client._read_order(KEY, 'one')[0]
+        counts[url] = counts.get(url, 0) + 1
+    return {url: count / NUM_ORDERS for url, count in sorted(counts.items())}
+
+
+def test_read_order():
+    """Replica reads go to the replica with fewer reads in flight, and spread evenly on ties"""
+
+    print_section("🧪 READ ORDER TEST")
+    client = replica_client()
+    urls = client.router.get_replica_urls(KEY, REPLICATION_FACTOR)
+    results = []
+
+    # Load reports that favour one replica are ignored: they may be stale
+    client.router.load = {worker_id: {'get_qps': 1000.0 * i}
+                          for i, worker_id in enumerate(client.router.ring.workers)}
+    spread = first_choices(client)
+    print(f"Idle replicas: {spread}")
+    results.append(("A sequential client spreads reads over every replica",
+                    len(spread) == REPLICATION_FACTOR and
+                    all(0.25 < share < 0.42 for share in spread.values())))
+
+    client.in_flight = {urls[0]: 2, urls[1]: 1, urls[2]: 0}
+    spread = first_choices(client)
+    print(f"With reads in flight: {spread}")
+    results.append(("The busiest replica is never picked first", urls[0] not in spread))
+    results.append(("Replicas with fewer reads in flight are preferred",
+                    spread.get(urls[2], 0) > spread.get(urls[1], 0)))
+    results.append(("The rest follow, fewest reads in flight first",
+                    all(order[1:] == sorted(order[1:], key=client.in_flight.get)
+                        for order in (client._read_order(KEY, 'one') for _ in range(50)))))
+
+    bounded = replica_client(max_staleness=1.0)
+    primary_id = bounded.router.get_replicas(KEY, REPLICATION_FACTOR)[0]
+    bounded.router.load = {primary_id: {'replication_lags': {urls[2]: 5.0}}}
+    bounded.router.load_fetched = float('inf')  # never refetch
+    orders = [bounded._read_order(KEY, 'one') for _ in range(50)]
+    results.append(("ONE reads skip replicas lagging past the bound",
+                    all(urls[2] not in order for order in orders) and
+                    len(bounded._read_order(KEY, 'quorum')) == REPLICATION_FACTOR))
+
+    print_section("READ ORDER TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_read_order()
@@ -0,0 +1,91 @@
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+import controller
+from utils import RepairProgress
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def test_repair_eta():
+    """The repair ETA follows the key rate, or the stream rate when no key count is known"""
+
+    print_section("🧪 REPAIR ETA TEST")
+    results = []
+
+    progress = RepairProgress('worker_1', tasks=4, ranges=10, expected_keys=1000)
+    progress.started_at = 100.0
+    results.append(("No ETA before anything is sent", progress.eta(110.0) is None))
+    progress.record(250)
+    results.append(("ETA from the key rate: 750 keys left at 25 keys/s",
+                    progress.eta(110.0) == 30.0))
+    progress.record(None)
+    results.append(("Failed streams do not count as keys sent",
+                    progress.keys_sent == 250 and progress.eta(110.0) == 30.0))
+    progress.record(900)
+    results.append(("More keys than expected means no time left", progress.eta(120.0) == 0.0))
+
+    unknown = RepairProgress('worker_2', tasks=4, ranges=4, expected_keys=0)
+    unknown.started_at = 100.0
+    unknown.record(10)
+    results.append(("ETA from the stream rate: 3 streams left at one per 5s",
+                    unknown.eta(105.0) == 15.0))
+    for _ in range(3):
+        unknown.record(10)
+    summary = unknown.to_dict()
+    results.append(("A finished repair has no time left",
+                    summary['state'] == 'finished' and summary['eta'] == 0.0))
+
+    empty = RepairProgress('worker_3', tasks=0, ranges=0, expected_keys=500)
+    results.append(("A repair with nothing to stream is finished at once",
+                    empty.to_dict()['state'] == 'finished' and empty.eta(0.0) == 0.0))
+
+    print_section("REPAIR ETA TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+def test_repair_throttle():
+    """POST /repair accepts finite non-negative rates and rejects the rest with 400"""
+
+    print_section("🧪 REPAIR THROTTLE TEST")
+    client = controller.app.test_client()
+    results = []
+
+    response = client.post('/repair', json={'max_keys_per_sec': 5000})
+    results.append(("A rate is set", response.status_code == 200 and
+                    response.get_json()['max_keys_per_sec'] == 5000))
+
+    # json.dumps writes NaN and Infinity, which Flask's parser accepts
+    for bad in ('NaN', 'Infinity', '-Infinity', '-1', '"fast"', 'null'):
+        response = client.post('/repair', data=f'{{"max_keys_per_sec": {bad}}}',
+                               content_type='application/json')
+        results.append((f"{bad} is rejected with 400", response.status_code == 400))
+    results.append(("Rejected rates leave the cap unchanged",
+                    controller.repair_max_keys_per_sec == 5000))
+
+    controller.repair_max_keys_per_sec = controller.REPAIR_MAX_KEYS_PER_SEC
+
+    print_section("REPAIR THROTTLE TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_repair_eta()
+    test_repair_throttle()
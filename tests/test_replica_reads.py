@@ -0,0 +1,112 @@
+import time
+import signal
+import subprocess
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import HEARTBEAT_INTERVAL, READ_LOAD_REFRESH, REPLICATION_FACTOR
+from client.client import KVStoreClient
+
+HOT_KEY = 'replica_reads:hot'
+NUM_READS = 300
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def worker_pid(worker_id):
+    """PID of a local worker process, or None"""
+    result = subprocess.run(['pgrep', '-f', f"worker.py {worker_id} "],
+                            capture_output=True, text=True)
+    pids = result.stdout.split()
+    return int(pids[0]) if pids else None
+
+
+def read_spread(client, key, reads):
+    """Share of `reads` ONE reads of a key answered by each replica"""
+    client.reads_by_replica.clear()
+    for _ in range(reads):
+        client.get(key, 'one')
+    return {url: count / reads for url, count in sorted(client.reads_by_replica.items())}
+
+
+def test_replica_reads():
+    """Replica read balancing and bounded staleness"""
+    
+    print_section("🧪 REPLICA READ TEST")
+    print("This test will:")
+    print(f"  1. Read one hot key {NUM_READS} times from its primary")
+    print("  2. Read it again with replica reads and check all replicas serve it")
+    print("  3. Pause a replica, write the key, and check a staleness bound skips it")
+    
+    input("\nPress Enter to start...")
+    
+    results = []
+    primary_client = KVStoreClient(read_from='primary')
+    replica_client = KVStoreClient(read_from='replicas')
+    primary_client.put(HOT_KEY, 'v1')
+    time.sleep(1)
+    
+    replica_ids = primary_client.router.get_replicas(HOT_KEY, REPLICATION_FACTOR)
+    replica_urls = [primary_client.router.get_worker_url(w) for w in replica_ids]
+    print(f"Replicas of {HOT_KEY}: {list(replica_ids)}")
+    
+    # Step 1: Primary reads
+    print_section("Step 1: Reading From the Primary")
+    spread = read_spread(primary_client, HOT_KEY, NUM_READS)
+    print(f"Answered by: {spread}")
+    results.append(("Primary mode reads the primary", spread.get(replica_urls[0], 0) > 0.9))
+    
+    # Step 2: Replica reads
+    print_section("Step 2: Reading From Replicas")
+    replica_client.router.refresh_load()
+    spread = read_spread(replica_client, HOT_KEY, NUM_READS)
+    print(f"Answered by: {spread}")
+    results.append(("Every replica serves reads",
+                    all(spread.get(url, 0) > 0.15 for url in replica_urls)))
+    
+    # Step 3: Bounded staleness
+    print_section("Step 3: Bounded Staleness")
+    lagging_id, lagging_url = replica_ids[-1], replica_urls[-1]
+    pid = worker_pid(lagging_id)
+    if pid is None:
+        print(f"✗ Could not find {lagging_id}'s process")
+        results.append(("Lagging replica skipped", False))
+    else:
+        os.kill(pid, signal.SIGSTOP)
+        print(f"Paused {lagging_id}; writing {HOT_KEY} so the primary queues it a write")
+        try:
+            primary_client.put(HOT_KEY, 'v2')
+            wait = HEARTBEAT_INTERVAL + 2
+            print(f"Waiting {wait}s for the primary to report its replication lag...")
+            time.sleep(wait)
+            bounded = KVStoreClient(read_from='replicas', max_staleness=1.0)
+            bounded.router.refresh_load()
+            lags = bounded.router.load.get(replica_ids[0], {}).get('replication_lags', {})
+            print(f"Primary's reported lags: {lags}")
+            orders = [bounded._read_order(HOT_KEY, 'one') for _ in range(50)]
+            skipped = all(lagging_url not in order for order in orders)
+            unbounded = replica_client._read_order(HOT_KEY, 'one')
+            print(f"Bounded read order: {orders[0]}; unbounded: {unbounded}")
+            results.append(("Lagging replica skipped", skipped and lagging_url in unbounded))
+            results.append(("Bounded read sees the write", bounded.get(HOT_KEY) == 'v2'))
+        finally:
+            os.kill(pid, signal.SIGCONT)
+            print(f"Resumed {lagging_id}")
+    
+    # Summary
+    print_section("REPLICA READ TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+    
+    print(f"\n(Clients refresh load reports every {READ_LOAD_REFRESH}s)")
+    return all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_replica_reads()
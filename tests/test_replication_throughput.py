@@ -0,0 +1,100 @@
+import requests
+import time
+import sys
+import os
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTROLLER_URLS, REPLICATION_FACTOR
+from client.client import KVStoreClient
+
+CONTROLLER_URL = CONTROLLER_URLS[0]
+NUM_THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+DURATION = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def replication_totals(worker_urls):
+    """(writes, batches) acknowledged by peers across every worker's queues"""
+    writes = batches = 0
+    for url in worker_urls:
+        peers = requests.get(f"{url}/replication", timeout=5).json()['peers']
+        writes += sum(peer['sent'] for peer in peers.values())
+        batches += sum(peer['batches'] for peer in peers.values())
+    return writes, batches
+
+
+def put_load(thread_id, stop, counts):
+    """Write distinct keys as fast as one client thread can"""
+    client = KVStoreClient()
+    done = 0
+    while not stop.is_set():
+        if client.put(f"tput:{thread_id}:{done}", "x" * 100):
+            done += 1
+    counts[thread_id] = done
+
+
+def test_replication_throughput():
+    """Replicated writes per second under concurrent PUT load"""
+    
+    print_section("🧪 REPLICATION THROUGHPUT TEST")
+    print("This test will:")
+    print(f"  1. Run {NUM_THREADS} concurrent PUT clients for {DURATION:.0f}s")
+    print("  2. Measure PUTs and replicated writes per second")
+    print("  3. Show how many writes each /replicate_batch request carried")
+    
+    input("\nPress Enter to start...")
+    
+    workers = requests.get(f"{CONTROLLER_URL}/workers", timeout=5).json()['workers']
+    worker_urls = [info['url'] for info in workers.values() if info['status'] == 'active']
+    writes_before, batches_before = replication_totals(worker_urls)
+    
+    # Step 1: Load
+    print_section("Step 1: PUT Load")
+    stop = threading.Event()
+    counts = {}
+    threads = [threading.Thread(target=put_load, args=(i, stop, counts))
+               for i in range(NUM_THREADS)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    
+    # Let the queues drain before counting
+    time.sleep(2)
+    writes_after, batches_after = replication_totals(worker_urls)
+    
+    # Step 2: Results
+    print_section("Step 2: Results")
+    puts = sum(counts.values())
+    writes = writes_after - writes_before
+    batches = batches_after - batches_before
+    print(f"PUTs:               {puts} ({puts / elapsed:.0f}/s)")
+    print(f"Replicated writes:  {writes} ({writes / elapsed:.0f}/s)")
+    print(f"Replication calls:  {batches} ({writes / max(batches, 1):.1f} writes per call)")
+    
+    results = [
+        ("Every replica written", writes >= puts * (REPLICATION_FACTOR - 1)),
+        ("Writes coalesced into batches", batches < writes)
+    ]
+    
+    # Summary
+    print_section("REPLICATION THROUGHPUT TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+    
+    return all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_replication_throughput()
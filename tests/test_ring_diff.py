@@ -0,0 +1,238 @@
+import random
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+import controller
+from utils import ConsistentHash, RangePartitioner, WorkerRegistry, diff_rings
+
+REPLICATION_FACTOR = 3
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def replicas_at(ring, position):
+    """Replica set owning a hash position"""
+    return ring.replica_table[ring.token_index(position)] if ring.tokens else ()
+
+
+def in_token_range(transfer, position):
+    """Whether a hash position lies in a (start, end] token range, wrapping when start >= end"""
+    if transfer.start < transfer.end:
+        return transfer.start < position <= transfer.end
+    return position > transfer.start or position <= transfer.end
+
+
+def token_diff_errors(old, new):
+    """
+    Positions where diff_rings disagrees with the replica sets of the two
+    rings: probes every token, its neighbours, both ends of the hash space
+    and random positions.
+    """
+    transfers = diff_rings(old, new)
+    tokens = sorted(set(old.tokens) | set(new.tokens))
+    positions = {0, 2 ** 64 - 1}
+    for token in tokens:
+        positions.update(p for p in (token - 1, token, token + 1) if 0 <= p < 2 ** 64)
+    rng = random.Random(old.version)
+    positions.update(rng.randrange(2 ** 64) for _ in range(2000))
+
+    errors = []
+    for position in sorted(positions):
+        before, after = replicas_at(old, position), replicas_at(new, position)
+        covering = [t for t in transfers if in_token_range(t, position)]
+        if before == after:
+            if covering:
+                errors.append((position, 'unchanged but listed'))
+        elif len(covering) != 1:
+            errors.append((position, f"changed but covered {len(covering)} times"))
+        elif (covering[0].old_replicas, covering[0].new_replicas) != (before, after):
+            errors.append((position, 'wrong replicas'))
+    return transfers, errors
+
+
+def test_token_ring_diffs():
+    """diff_rings lists exactly the token ranges whose replicas changed"""
+
+    print_section("🧪 TOKEN RING DIFF TEST")
+    rng = random.Random(11)
+    ring = ConsistentHash(0, 20, REPLICATION_FACTOR)
+    results = []
+    errors = []
+    wrapping = 0
+
+    def record(change):
+        nonlocal wrapping
+        old = ring.snapshot
+        change()
+        transfers, found = token_diff_errors(old, ring.snapshot)
+        wrapping += sum(1 for t in transfers if t.start >= t.end)
+        errors.extend(found)
+
+    for i in range(5):
+        record(lambda: ring.add_worker(f"worker_{i}", rng.choice([0.5, 1.0, 2.0])))
+    for _ in range(20):
+        workers = sorted(ring.weights)
+        op = rng.choice(['weight', 'move', 'remove', 'add'])
+        if op == 'weight':
+            record(lambda: ring.set_weight(rng.choice(workers), rng.choice([0.5, 1.0, 1.5])))
+        elif op == 'move':
+            record(lambda: ring.move_vnode(rng.choice(ring.snapshot.tokens), rng.choice(workers)))
+        elif op == 'remove' and len(workers) > 2:
+            record(lambda: ring.remove_worker(rng.choice(workers)))
+        else:
+            record(lambda: ring.add_worker(f"worker_{ring.version}"))
+
+    # A vnode at the top of the hash space: its range wraps from the last token
+    old = ring.snapshot
+    ring.move_vnode(old.tokens[0], next(w for w in sorted(ring.weights) if w != old.owners[0]))
+    transfers, found = token_diff_errors(old, ring.snapshot)
+    errors.extend(found)
+    wraps = [t for t in transfers if t.start >= t.end]
+    print(f"Moving the first vnode produced {len(transfers)} transfers, {len(wraps)} wrapping")
+
+    print(f"Checked {ring.version} ring changes; {wrapping} wrapping transfers; errors: {errors[:5]}")
+    results.append(("Transfers match the replica changes at every probed position", not errors))
+    results.append(("A range around the top of the ring is reported as (start, end] with start >= end",
+                    len(wraps) == 1))
+    results.append(("Identical rings have no transfers", diff_rings(old, old) == []))
+    results.append(("Transfers list what each worker gains and loses",
+                    all(set(t.gained).isdisjoint(t.old_replicas) and
+                        set(t.lost).isdisjoint(t.new_replicas) for t in transfers)))
+
+    print_section("TOKEN RING DIFF TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+def test_range_map_diffs():
+    """diff_rings over range maps covers [start, end) key ranges and merges neighbours"""
+
+    print_section("🧪 RANGE MAP DIFF TEST")
+    ranges = RangePartitioner(REPLICATION_FACTOR)
+    results = []
+    for i in range(4):
+        ranges.add_worker(f"worker_{i}")
+    ranges.split_range('', 'm')
+    ranges.split_range('m', 't')
+
+    old = ranges.snapshot
+    ranges.split_range('', 'f')
+    results.append(("Splits move no data", diff_rings(old, ranges.snapshot) == []))
+
+    old = ranges.snapshot
+    start = 'm'
+    replicas = old.replica_sets[old.range_index(start)]
+    target = next(w for w in sorted(ranges.weights) if w not in replicas)
+    ranges.move_replica(start, replicas[0], target)
+    transfers = diff_rings(old, ranges.snapshot)
+    print(f"Move of [{start}, t): {[t.to_dict() for t in transfers]}")
+    results.append(("A move is one [start, end) transfer",
+                    [(t.kind, t.start, t.end, t.gained, t.lost) for t in transfers] ==
+                    [('key', 'm', 't', (target,), (replicas[0],))]))
+
+    old = ranges.snapshot
+    ranges.remove_worker(target)
+    transfers = diff_rings(old, ranges.snapshot)
+    keys = ['', 'a', 'f', 'g', 'm', 'p', 't', 'z', '~']
+    mismatches = [key for key in keys
+                  if (old.get_replicas(key, REPLICATION_FACTOR) !=
+                      ranges.snapshot.get_replicas(key, REPLICATION_FACTOR)) !=
+                  any(t.start <= key and (t.end is None or key < t.end) for t in transfers)]
+    results.append(("Removal transfers cover exactly the changed keys", not mismatches))
+    results.append(("Adjacent changed ranges are merged",
+                    all(a.end != b.start or (a.old_replicas, a.new_replicas) !=
+                        (b.old_replicas, b.new_replicas)
+                        for a, b in zip(transfers, transfers[1:]))))
+
+    try:
+        diff_rings(old, ConsistentHash(0).snapshot)
+        results.append(("Hash rings and range maps cannot be diffed", False))
+    except ValueError:
+        results.append(("Hash rings and range maps cannot be diffed", True))
+
+    print_section("RANGE MAP DIFF TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+def test_join_diffs():
+    """A joining worker is handed exactly the ranges it gains, from replicas that hold them"""
+
+    print_section("🧪 JOIN DIFF TEST")
+    ring = ConsistentHash(0, 20, REPLICATION_FACTOR)
+    for i in range(4):
+        ring.add_worker(f"worker_{i}")
+    results = []
+
+    # A restarted worker comes off the ring, then joins again
+    before = ring.snapshot
+    ring.remove_worker('worker_0')
+    removal = diff_rings(before, ring.snapshot)
+    results.append(("Every range the restarted worker held keeps a surviving replica",
+                    all(set(t.old_replicas) - {'worker_0'} for t in removal)))
+
+    old = ring.snapshot
+    preview = ring.preview_add('worker_0', 1.5)
+    handed = diff_rings(old, preview)
+    results.append(("preview_add publishes nothing", ring.snapshot is old))
+    ring.add_worker('worker_0', 1.5)
+    results.append(("preview_add predicts the ring add_worker publishes",
+                    list(preview.tokens) == list(ring.snapshot.tokens) and
+                    preview.owners == ring.snapshot.owners))
+    results.append(("The streamed ranges are the ones the join moves",
+                    [t.to_dict() for t in handed] ==
+                    [t.to_dict() for t in diff_rings(old, ring.snapshot)]))
+    results.append(("Only the joining worker gains ranges",
+                    all(t.gained == ('worker_0',) for t in handed)))
+
+    # stream_transfers skips ranges nobody held yet and streams the rest
+    controller.worker_registry = WorkerRegistry()
+    for i in range(4):
+        controller.worker_registry.register_worker(f"worker_{i}", 'localhost', 6000 + i)
+    streamed = []
+    transfer_range = controller.transfer_range
+
+    def record_stream(source_url, target_url, ranges, kind, max_keys_per_sec):
+        streamed.append((source_url, target_url, len(ranges)))
+        return 0
+
+    controller.transfer_range = record_stream
+    try:
+        first = diff_rings(ConsistentHash(0, 20, REPLICATION_FACTOR).snapshot, old)
+        skipped = controller.stream_transfers(first, 0) and not streamed
+        complete = controller.stream_transfers(handed, 0)
+    finally:
+        controller.transfer_range = transfer_range
+    results.append(("Ranges without old replicas are not streamed", skipped))
+    results.append(("Every handed range is streamed to the joining worker",
+                    complete and streamed and
+                    all(target == 'http://localhost:6000' for _, target, _ in streamed) and
+                    sum(count for _, _, count in streamed) == len(handed)))
+
+    print_section("JOIN DIFF TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_token_ring_diffs()
+    test_range_map_diffs()
+    test_join_diffs()
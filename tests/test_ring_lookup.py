@@ -0,0 +1,99 @@
+import bisect
+import hashlib
+import random
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+from routing import RingFormatError, decode_ring, encode_ring
+from utils import ConsistentHash
+
+VIRTUAL_NODES = 50
+REPLICATION_FACTOR = 3
+NUM_KEYS = 20000
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def full_digest(value):
+    """Ring position with the whole 128-bit MD5 digest (the original token width)"""
+    return int(hashlib.md5(value.encode()).hexdigest(), 16)
+
+
+def baseline_replicas(workers, key):
+    """Replica set on a ring of full-digest tokens"""
+    vnodes = sorted((full_digest(f"{worker_id}:vnode{i}"), worker_id)
+                    for worker_id in workers for i in range(VIRTUAL_NODES))
+    tokens = [token for token, _ in vnodes]
+    pos = bisect.bisect_left(tokens, full_digest(key)) % len(tokens)
+    replicas = []
+    for step in range(len(vnodes)):
+        owner = vnodes[(pos + step) % len(vnodes)][1]
+        if owner not in replicas:
+            replicas.append(owner)
+            if len(replicas) == REPLICATION_FACTOR:
+                break
+    return tuple(replicas)
+
+
+def test_prefix_tokens():
+    """64-bit prefix tokens place keys where full 128-bit digests did"""
+
+    print_section("🧪 RING LOOKUP TEST")
+    rng = random.Random(11)
+    workers = [f"worker_{i}" for i in range(5)]
+    ring = ConsistentHash(0, VIRTUAL_NODES, REPLICATION_FACTOR)
+    for worker_id in workers:
+        ring.add_worker(worker_id)
+    results = []
+
+    keys = [f"key_{rng.getrandbits(48)}" for _ in range(NUM_KEYS)]
+    expected = [baseline_replicas(workers, key) for key in keys[:2000]]
+    moved = sum(ring.get_replicas(key, REPLICATION_FACTOR) != replicas
+                for key, replicas in zip(keys, expected))
+    print(f"{moved}/{len(expected)} keys placed differently than with 128-bit tokens")
+    results.append(("Keys keep their 128-bit placement", moved == 0))
+
+    payload = encode_ring(ring.snapshot, {worker_id: '' for worker_id in workers})
+    decoded, _ = decode_ring(payload)
+    results.append(("Ring survives an encode/decode round trip",
+                    list(decoded.tokens) == list(ring.snapshot.tokens) and
+                    decoded.get_replicas_many(keys, REPLICATION_FACTOR) ==
+                    ring.get_replicas_many(keys, REPLICATION_FACTOR)))
+
+    legacy = dict(payload)
+    del legacy['token_bits']
+    try:
+        decode_ring(legacy)
+        rejected = False
+    except RingFormatError:
+        rejected = True
+    results.append(("A ring without token_bits is rejected", rejected))
+
+    state = ring.to_state()
+    state['ring'] = legacy
+    restored = ConsistentHash(0, VIRTUAL_NODES, REPLICATION_FACTOR)
+    restored.restore(state)
+    results.append(("Restoring a legacy ring rebuilds it under a new version",
+                    restored.version == ring.version + 1 and
+                    list(restored.snapshot.tokens) == list(ring.snapshot.tokens) and
+                    restored.snapshot.replica_table == ring.snapshot.replica_table))
+
+    print_section("RING LOOKUP TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_prefix_tokens()
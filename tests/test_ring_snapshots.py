@@ -0,0 +1,83 @@
+import random
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+from routing import RingSnapshot
+from utils import ConsistentHash
+
+VIRTUAL_NODES = 50
+REPLICATION_FACTOR = 3
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def matches_rebuild(ring):
+    """Whether an incrementally patched ring equals one built from scratch"""
+    built = RingSnapshot.build(ring.version, ring.snapshot.tokens, ring.snapshot.owners,
+                               REPLICATION_FACTOR)
+    return (list(ring.snapshot.tokens) == sorted(ring.snapshot.tokens) and
+            ring.snapshot.replica_table == built.replica_table)
+
+
+def test_incremental_ring():
+    """Every patched ring snapshot matches RingSnapshot.build over the same tokens"""
+
+    print_section("🧪 INCREMENTAL RING TEST")
+    rng = random.Random(7)
+    ring = ConsistentHash(0, VIRTUAL_NODES, REPLICATION_FACTOR)
+    results = []
+    mismatches = []
+
+    def check(step):
+        if not matches_rebuild(ring):
+            mismatches.append(step)
+
+    # Growing from one worker crosses every replica-table width
+    for i in range(6):
+        ring.add_worker(f"worker_{i}", rng.choice([0.5, 1.0, 2.0]))
+        check(f"add worker_{i}")
+    print(f"Ring after adds: {len(ring.snapshot)} tokens, v{ring.version}")
+
+    for step in range(40):
+        workers = sorted(ring.weights)
+        op = rng.choice(['weight', 'move', 'remove', 'add'])
+        if op == 'weight':
+            worker_id = rng.choice(workers)
+            ring.set_weight(worker_id, rng.choice([0.25, 0.5, 1.0, 1.5, 3.0]))
+        elif op == 'move':
+            token = rng.choice(ring.snapshot.tokens)
+            ring.move_vnode(token, rng.choice(workers))
+        elif op == 'remove' and len(workers) > 2:
+            ring.remove_worker(rng.choice(workers))
+        else:
+            ring.add_worker(f"worker_{len(workers) + step + 10}", rng.choice([0.5, 1.0]))
+        check(f"step {step} ({op})")
+
+    # Shrink back down to one worker and then to an empty ring
+    for worker_id in sorted(ring.weights):
+        ring.remove_worker(worker_id)
+        check(f"remove {worker_id}")
+
+    print(f"Checked {ring.version} ring versions; mismatches: {mismatches[:5]}")
+    results.append(("Patched rings match full rebuilds", not mismatches))
+    results.append(("Removing every worker empties the ring", len(ring.snapshot) == 0))
+
+    print_section("INCREMENTAL RING TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_incremental_ring()
@@ -0,0 +1,146 @@
+import requests
+import time
+import subprocess
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (CONTROLLER_URLS, HEARTBEAT_INTERVAL, STANDBY_CONTROLLER_PORT,
+                    STANDBY_TAKEOVER_TIMEOUT)
+from client.client import KVStoreClient
+
+PRIMARY_URL, STANDBY_URL = CONTROLLER_URLS[0], CONTROLLER_URLS[1]
+TEST_KEYS = ['user:alice', 'user:bob', 'product:laptop', 'product:phone', 'order:1001']
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def get_status(url):
+    """Controller /status, or None if it is unreachable"""
+    try:
+        response = requests.get(f"{url}/status", timeout=2)
+        return response.json()
+    except:
+        return None
+
+
+def start_standby():
+    """Start a standby controller following the primary, unless one is running"""
+    status = get_status(STANDBY_URL)
+    if status:
+        print(f"Standby already running (role: {status.get('role')})")
+        return
+    
+    print(f"Starting standby controller on port {STANDBY_CONTROLLER_PORT}...")
+    subprocess.Popen([
+        'python', 'controller/controller.py', '--standby', PRIMARY_URL
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(3)
+
+
+def test_standby():
+    """Hot standby: mirrored metadata, read-only routing, takeover"""
+    
+    print_section("🧪 HOT STANDBY TEST")
+    print("This test will:")
+    print("  1. Start a standby controller following the primary")
+    print("  2. Check the standby serves the same routing, read-only")
+    print("  3. Kill the primary controller")
+    print("  4. Verify the standby takes over and workers follow it")
+    print("  5. Restart the old primary and check it steps down to standby")
+    
+    input("\nPress Enter to start...")
+    
+    results = []
+    
+    # Step 1: Standby
+    print_section("Step 1: Starting Standby")
+    start_standby()
+    status = get_status(STANDBY_URL)
+    results.append(("Standby running", bool(status) and status.get('role') == 'standby'))
+    print(f"Standby status: {status}")
+    
+    # Step 2: Same ring, same answers, no writes
+    print_section("Step 2: Read-only Routing on the Standby")
+    client = KVStoreClient()
+    for key in TEST_KEYS:
+        client.put(key, f"value_of_{key}")
+    time.sleep(1)
+    
+    primary_ring = requests.get(f"{PRIMARY_URL}/ring", timeout=5)
+    standby_ring = requests.get(f"{STANDBY_URL}/ring", timeout=5)
+    same_ring = primary_ring.headers.get('ETag') == standby_ring.headers.get('ETag')
+    print(f"Primary ring ETag: {primary_ring.headers.get('ETag')}")
+    print(f"Standby ring ETag: {standby_ring.headers.get('ETag')}")
+    results.append(("Standby ring matches primary", same_ring))
+    
+    same_routing = True
+    for key in TEST_KEYS:
+        primary = requests.get(f"{PRIMARY_URL}/query?key={key}", timeout=5).json()
+        standby = requests.get(f"{STANDBY_URL}/query?key={key}", timeout=5).json()
+        match = primary.get('replicas') == standby.get('replicas')
+        same_routing = same_routing and match
+        print(f"  {'✓' if match else '✗'} {key}: {standby.get('replicas')}")
+    results.append(("Standby /query matches primary", same_routing))
+    
+    refused = requests.post(f"{STANDBY_URL}/weight",
+                            json={'worker_id': 'worker_1', 'weight': 2.0}, timeout=5)
+    print(f"POST /weight on standby: {refused.status_code} {refused.json().get('error')}")
+    results.append(("Standby refuses changes", refused.status_code == 503))
+    
+    # Step 3: Kill the primary
+    print_section("Step 3: Killing the Primary Controller")
+    subprocess.run(['pkill', '-f', 'controller/controller.py$'], check=False)
+    print("✓ Primary killed")
+    
+    wait = STANDBY_TAKEOVER_TIMEOUT + 2 * HEARTBEAT_INTERVAL + 2
+    print(f"Waiting {wait}s for takeover and worker heartbeats...")
+    time.sleep(wait)
+    
+    # Step 4: Takeover
+    print_section("Step 4: Verifying Takeover")
+    status = get_status(STANDBY_URL)
+    print(f"Former standby status: {status}")
+    results.append(("Standby promoted", bool(status) and status.get('role') == 'primary'))
+    new_term = (status or {}).get('term', 0)
+    results.append(("Promotion started a new term", new_term > 0))
+    
+    # Load reports only arrive with heartbeats, so they show who followed
+    load = requests.get(f"{STANDBY_URL}/cluster/load", timeout=5).json()
+    reporting = sorted(load.get('workers', {}))
+    print(f"Workers heartbeating to the new primary: {reporting}")
+    results.append(("Workers heartbeat to new primary", len(reporting) >= 4))
+    
+    # Existing clients keep working with their cached ring; new ones fail over
+    fresh_client = KVStoreClient()
+    readable = all(fresh_client.get(key) == f"value_of_{key}" for key in TEST_KEYS)
+    results.append(("Data readable after failover", readable))
+    
+    # Step 5: The old primary comes back in an older term
+    print_section("Step 5: Restarting the Old Primary")
+    subprocess.Popen(['python', 'controller/controller.py'],
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(3)
+    status = get_status(PRIMARY_URL)
+    print(f"Restarted controller status: {status}")
+    results.append(("Old primary restarts as a standby",
+                    bool(status) and status.get('role') == 'standby' and
+                    status.get('primary') == STANDBY_URL and status.get('term') == new_term))
+    readable = all(KVStoreClient().get(key) == f"value_of_{key}" for key in TEST_KEYS)
+    results.append(("Data readable with the old primary back", readable))
+    
+    # Summary
+    print_section("HOT STANDBY TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+    
+    return all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_standby()
@@ -0,0 +1,99 @@
+import sys
+import os
+
+# Add parent directory (and the controller's) to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'controller'))
+
+from routing import RingSnapshot
+from utils import ConsistentHash
+
+VIRTUAL_NODES = 50
+REPLICATION_FACTOR = 3
+
+
+def print_section(title):
+    print("\n" + "="*70)
+    print(title)
+    print("="*70)
+
+
+def matches_rebuild(ring):
+    """Whether an incrementally patched ring equals one built from scratch"""
+    built = RingSnapshot.build(ring.version, ring.snapshot.tokens, ring.snapshot.owners,
+                               REPLICATION_FACTOR)
+    return (list(ring.snapshot.tokens) == sorted(ring.snapshot.tokens) and
+            ring.snapshot.replica_table == built.replica_table)
+
+
+def test_weighted_vnodes():
+    """Vnode counts follow weights, and weight changes only move the vnodes above the smaller count"""
+
+    print_section("🧪 WEIGHTED VNODES TEST")
+    ring = ConsistentHash(0, VIRTUAL_NODES, REPLICATION_FACTOR)
+    results = []
+
+    weights = {'small': 0.5, 'normal': 1.0, 'large': 2.0}
+    for worker_id, weight in weights.items():
+        ring.add_worker(worker_id, weight)
+
+    counts = {worker_id: ring.snapshot.owners.count(worker_id) for worker_id in weights}
+    print(f"Vnodes per worker: {counts}")
+    results.append(("Vnode counts are proportional to weight",
+                    all(counts[w] == ring.vnode_count(weights[w]) for w in weights)))
+    results.append(("Tiny weights still get one vnode", ring.vnode_count(0.001) == 1))
+
+    before = dict(zip(ring.snapshot.tokens, ring.snapshot.owners))
+    ring.set_weight('large', 1.0)
+    after = dict(zip(ring.snapshot.tokens, ring.snapshot.owners))
+    removed = set(before) - set(after)
+    print(f"Lowering 'large' to 1.0 removed {len(removed)} vnodes")
+    results.append(("Lowering a weight only drops that worker's top vnodes",
+                    len(removed) == VIRTUAL_NODES and
+                    all(before[token] == 'large' for token in removed) and
+                    all(before[token] == owner for token, owner in after.items())))
+
+    ring.set_weight('small', 2.0)
+    grown = dict(zip(ring.snapshot.tokens, ring.snapshot.owners))
+    added = set(grown) - set(after)
+    results.append(("Raising a weight only adds vnodes for that worker",
+                    all(grown[token] == 'small' for token in added) and
+                    ring.snapshot.owners.count('small') == ring.vnode_count(2.0)))
+    results.append(("Unknown workers are not reweighted", not ring.set_weight('missing', 1.0)))
+
+    version = ring.version
+    preview = ring.preview_set_weight('normal', 1.5)
+    results.append(("preview_set_weight publishes nothing", ring.version == version))
+    results.append(("A reweight streamed for an older ring is refused",
+                    not ring.set_weight('normal', 1.5, if_version=version - 1) and
+                    ring.get_weight('normal') == 1.0))
+    ring.set_weight('normal', 1.5, if_version=version)
+    results.append(("preview_set_weight predicts the ring set_weight publishes",
+                    list(preview.tokens) == list(ring.snapshot.tokens) and
+                    preview.owners == ring.snapshot.owners))
+    results.append(("Workers off the ring have no reweighted preview",
+                    ring.preview_set_weight('missing', 1.0) is None))
+    ring.set_weight('normal', 1.0)
+
+    version = ring.version
+    rejected = 0
+    for weight in (float('inf'), float('nan'), 0.0, -1.0):
+        try:
+            ring.set_weight('normal', weight)
+        except ValueError:
+            rejected += 1
+    results.append(("Non-finite and non-positive weights are rejected without a new ring",
+                    rejected == 4 and ring.version == version and ring.get_weight('normal') == 1.0))
+    results.append(("Weighted ring matches a full rebuild", matches_rebuild(ring)))
+
+    print_section("WEIGHTED VNODES TEST SUMMARY")
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{status}: {test_name}")
+
+    assert all(result for _, result in results)
+
+
+if __name__ == '__main__':
+    test_weighted_vnodes()
@@ -0,0 +1,249 @@
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+ALIVE = 'alive'
+SUSPECT = 'suspect'
+DEAD = 'dead'
+
+
+class SwimMembership:
+    """
+    SWIM-style membership among workers. Each protocol period a worker
+    pings one peer, going round-robin through a shuffled member list. If
+    the ack doesn't arrive, a few other peers are asked to ping it
+    (ping_req); only when none of them gets an ack is it marked suspect.
+    A suspect that doesn't refute (by gossiping a higher incarnation)
+    within the suspicion timeout is declared dead.
+    
+    Membership updates ride on pings and acks, each retransmitted about
+    retransmit_mult × log2(cluster size) times, so failure detection costs
+    every worker one probe per period whatever the cluster size.
+    """
+    
+    def __init__(self, worker_id: str, url: str, ping_timeout: float = 0.5,
+                 indirect_probes: int = 3, suspect_timeout: float = 5.0,
+                 piggyback: int = 8, retransmit_mult: int = 3):
+        self.worker_id = worker_id
+        self.url = url
+        self.ping_timeout = ping_timeout
+        self.indirect_probes = indirect_probes
+        self.suspect_timeout = suspect_timeout
+        self.piggyback = piggyback
+        self.retransmit_mult = retransmit_mult
+        self.incarnation = 0  # bumped to refute suspicion of this worker
+        self.ring_version = -1  # this worker's ring version, sent with every message
+        self.seen_ring_version = -1  # newest ring version a peer has sent us
+        self.members = {}  # worker_id -> {'url', 'status', 'incarnation', 'since'}
+        self.updates = {}  # worker_id -> [update, transmissions left]
+        self._probe_order = []
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(indirect_probes, 1),
+                                        thread_name_prefix='gossip')
+    
+    def add_peers(self, worker_urls: Dict[str, str]):
+        """Start probing workers we have not heard of (e.g. new ring members)"""
+        now = time.time()
+        with self._lock:
+            for worker_id, url in worker_urls.items():
+                if worker_id != self.worker_id and url and worker_id not in self.members:
+                    self.members[worker_id] = {'url': url, 'status': ALIVE, 'incarnation': 0,
+                                               'since': now}
+    
+    def _queue(self, update: Dict):
+        """Gossip an update on the next messages (caller holds _lock)"""
+        transmissions = self.retransmit_mult * max(1, math.ceil(math.log2(len(self.members) + 2)))
+        self.updates[update['id']] = [update, transmissions]
+    
+    def _piggyback(self) -> List[Dict]:
+        """Updates for one outgoing message, least-transmitted first"""
+        with self._lock:
+            chosen = sorted(self.updates.items(), key=lambda item: item[1][1],
+                            reverse=True)[:self.piggyback]
+            for worker_id, entry in chosen:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self.updates[worker_id]
+            return [entry[0] for _, entry in chosen]
+    
+    def message(self, recipient: Optional[str] = None) -> Dict:
+        """
+        Ping or ack body: who we are plus piggybacked updates. A recipient
+        we suspect (or buried) is always told, so it can refute right away.
+        """
+        updates = self._piggyback()
+        with self._lock:
+            member = self.members.get(recipient)
+            if member is not None and member['status'] != ALIVE:
+                updates = [update for update in updates if update['id'] != recipient]
+                updates.append({'id': recipient, 'url': member['url'],
+                                'status': member['status'], 'incarnation': member['incarnation']})
+        return {
+            'from': self.worker_id,
+            'url': self.url,
+            'incarnation': self.incarnation,
+            'ring_version': self.ring_version,
+            'updates': updates
+        }
+    
+    def merge(self, message: Dict):
+        """Apply a peer's message: the sender is alive, then its updates"""
+        updates = list(message.get('updates') or ())
+        if message.get('from'):
+            updates.append({'id': message['from'], 'url': message.get('url'),
+                            'status': ALIVE, 'incarnation': message.get('incarnation', 0)})
+        self.seen_ring_version = max(self.seen_ring_version, message.get('ring_version', -1))
+        with self._lock:
+            for update in updates:
+                self._apply(update)
+    
+    def _apply(self, update: Dict):
+        """SWIM precedence: higher incarnations win; suspect beats alive and dead beats both (caller holds _lock)"""
+        worker_id, status, incarnation = update['id'], update['status'], update['incarnation']
+        if worker_id == self.worker_id:
+            if status != ALIVE and incarnation >= self.incarnation:
+                # Someone thinks we are gone: refute under a newer incarnation
+                self.incarnation = incarnation + 1
+                self._queue({'id': self.worker_id, 'url': self.url, 'status': ALIVE,
+                             'incarnation': self.incarnation})
+                print(f"⚠ Refuting {status} rumour (incarnation {self.incarnation})")
+            return
+        
+        member = self.members.get(worker_id)
+        if member is None:
+            if status == DEAD or not update.get('url'):
+                return
+            self.members[worker_id] = {'url': update['url'], 'status': status,
+                                       'incarnation': incarnation, 'since': time.time()}
+            self._queue(update)
+            return
+        
+        if status == ALIVE:
+            newer = incarnation > member['incarnation']
+        elif status == SUSPECT:
+            newer = (incarnation > member['incarnation'] or
+                     (incarnation == member['incarnation'] and member['status'] == ALIVE))
+        else:
+            newer = incarnation >= member['incarnation'] and member['status'] != DEAD
+        if not newer:
+            return
+        member.update(status=status, incarnation=incarnation, since=time.time())
+        if update.get('url'):
+            member['url'] = update['url']
+        self._queue(update)
+    
+    def _next_target(self) -> Optional[Tuple[str, str]]:
+        """Next live member in the shuffled round-robin order"""
+        with self._lock:
+            while True:
+                if not self._probe_order:
+                    self._probe_order = [worker_id for worker_id, member in self.members.items()
+                                         if member['status'] != DEAD]
+                    random.shuffle(self._probe_order)
+                    if not self._probe_order:
+                        return None
+                worker_id = self._probe_order.pop()
+                member = self.members.get(worker_id)
+                if member is not None and member['status'] != DEAD:
+                    return worker_id, member['url']
+    
+    def ping(self, target_id: str, url: str) -> bool:
+        """Direct probe; True if the peer acked"""
+        try:
+            response = requests.post(f"{url}/gossip/ping", json=self.message(target_id),
+                                     timeout=self.ping_timeout)
+            if response.status_code == 200:
+                self.merge(response.json())
+                return True
+        except (requests.RequestException, ValueError):
+            pass
+        return False
+    
+    def _ping_req(self, helper_id: str, helper_url: str, target_id: str,
+                  target_url: str) -> bool:
+        """Ask a helper to probe the target for us; True if it got an ack"""
+        try:
+            response = requests.post(f"{helper_url}/gossip/ping_req",
+                                     json=dict(self.message(helper_id), target=target_id,
+                                               target_url=target_url),
+                                     timeout=2 * self.ping_timeout + 0.5)
+            if response.status_code == 200:
+                data = response.json()
+                self.merge(data)
+                return bool(data.get('ack'))
+        except (requests.RequestException, ValueError):
+            pass
+        return False
+    
+    def _indirect_probe(self, target_id: str, target_url: str) -> bool:
+        """Probe the target through up to indirect_probes other live members"""
+        with self._lock:
+            helpers = [(worker_id, member['url']) for worker_id, member in self.members.items()
+                       if worker_id != target_id and member['status'] == ALIVE]
+        helpers = random.sample(helpers, min(self.indirect_probes, len(helpers)))
+        futures = [self._pool.submit(self._ping_req, helper_id, helper_url, target_id, target_url)
+                   for helper_id, helper_url in helpers]
+        return any(future.result() for future in as_completed(futures))
+    
+    def probe(self):
+        """Run one protocol period's probe; a target nobody can reach becomes a suspect"""
+        target = self._next_target()
+        if target is None:
+            return
+        target_id, target_url = target
+        if self.ping(target_id, target_url) or self._indirect_probe(target_id, target_url):
+            return
+        
+        with self._lock:
+            member = self.members.get(target_id)
+            if member is None or member['status'] != ALIVE:
+                return
+            member.update(status=SUSPECT, since=time.time())
+            self._queue({'id': target_id, 'url': member['url'], 'status': SUSPECT,
+                         'incarnation': member['incarnation']})
+        print(f"⚠ Suspecting {target_id}: no direct or indirect ack")
+    
+    def expire_suspects(self) -> List[Tuple[str, int]]:
+        """
+        Declare dead the suspects whose timeout ran out, returning their
+        (worker_id, incarnation) to report. Workers that hear of a death
+        through gossip first don't declare it themselves.
+        """
+        now = time.time()
+        declared = []
+        with self._lock:
+            for worker_id, member in self.members.items():
+                if member['status'] == SUSPECT and now - member['since'] >= self.suspect_timeout:
+                    member.update(status=DEAD, since=now)
+                    self._queue({'id': worker_id, 'url': member['url'], 'status': DEAD,
+                                 'incarnation': member['incarnation']})
+                    declared.append((worker_id, member['incarnation']))
+        return declared
+    
+    def handle_ping(self, message: Dict) -> Dict:
+        """Ack a probe"""
+        self.merge(message)
+        return self.message(message.get('from'))
+    
+    def handle_ping_req(self, message: Dict) -> Dict:
+        """Probe a target on a peer's behalf and say whether it acked"""
+        self.merge(message)
+        ack = self.ping(message.get('target'), message['target_url'])
+        return dict(self.message(message.get('from')), ack=ack)
+    
+    def to_dict(self) -> Dict:
+        """Membership view for GET /gossip/members"""
+        with self._lock:
+            return {
+                'worker_id': self.worker_id,
+                'incarnation': self.incarnation,
+                'members': {worker_id: {'status': member['status'],
+                                        'incarnation': member['incarnation']}
+                            for worker_id, member in self.members.items()},
+                'pending_updates': len(self.updates)
+            }
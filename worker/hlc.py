@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import List, Optional, Sequence
+
+
+class HybridLogicalClock:
+    """
+    Hybrid logical clock. A timestamp is [wall_ms, logical, node_id]: the
+    wall-clock milliseconds of the newest event seen, a counter ordering
+    events within that millisecond, and the node that made it, which
+    breaks ties so two writers never produce equal versions.
+    
+    Timestamps only move forward. Observing a peer's timestamp pulls the
+    clock past it, so a write made after seeing another is always newer,
+    whatever the two machines' wall clocks say. Peers more than max_drift_ms
+    ahead of our wall clock are not followed, so one bad clock can't drag
+    the cluster into the future.
+    """
+    
+    def __init__(self, node_id: str, max_drift_ms: int = 60000):
+        self.node_id = node_id
+        self.max_drift_ms = max_drift_ms
+        self.wall_ms = 0
+        self.logical = 0
+        self._lock = threading.Lock()
+    
+    def now(self) -> List:
+        """Timestamp for a local write, newer than anything seen so far"""
+        wall_ms = int(time.time() * 1000)
+        with self._lock:
+            if wall_ms > self.wall_ms:
+                self.wall_ms, self.logical = wall_ms, 0
+            else:
+                self.logical += 1
+            return [self.wall_ms, self.logical, self.node_id]
+    
+    def now_after(self, version: Optional[Sequence]) -> List:
+        """
+        Timestamp for a local write that must also supersede `version` (the
+        stored version of the key it overwrites). A version from a drifted
+        peer is stepped past for this write only; the clock is not moved.
+        """
+        stamp = self.now()
+        if is_newer(stamp, version):
+            return stamp
+        return [version[0], version[1] + 1, self.node_id]
+    
+    def observe(self, version: Optional[Sequence]):
+        """Move past a timestamp received from a peer"""
+        if not version:
+            return
+        remote_ms, remote_logical = version[0], version[1]
+        if remote_ms - time.time() * 1000 > self.max_drift_ms:
+            print(f"⚠ Ignoring clock {remote_ms - int(time.time() * 1000)}ms ahead of ours")
+            return
+        with self._lock:
+            if remote_ms > self.wall_ms:
+                self.wall_ms, self.logical = remote_ms, remote_logical
+            elif remote_ms == self.wall_ms:
+                self.logical = max(self.logical, remote_logical)
+
+
+def is_newer(version: Sequence, current: Optional[Sequence]) -> bool:
+    """Last writer wins: whether version supersedes current (None = absent)"""
+    return current is None or list(version) > list(current)
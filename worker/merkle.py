@@ -0,0 +1,134 @@
+import bisect
+import sys
+import os
+from array import array
+from typing import Iterable, List, Optional, Sequence
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from routing import hash_key
+
+RING_MAX = 2 ** 64 - 1
+
+FULL = 'full'
+PARTIAL = 'partial'
+OUT = 'out'
+
+
+def entry_digest(key: str, version: Sequence) -> int:
+    """64-bit digest of one stored entry (key and version)"""
+    return hash_key(f"{key}\x00{version[0]}.{version[1]}.{version[2]}")
+
+
+class TokenCoverage:
+    """
+    Token ranges (start, end] on the hash ring, wrapping when start >= end,
+    normalised to sorted, merged inclusive spans for classifying tree nodes
+    """
+    
+    def __init__(self, ranges: Iterable[Sequence[int]]):
+        spans = []
+        for start, end in ranges:
+            if start >= end:
+                if start < RING_MAX:
+                    spans.append([start + 1, RING_MAX])
+                spans.append([0, end])
+            else:
+                spans.append([start + 1, end])
+        spans.sort()
+        merged = []
+        for lo, hi in spans:
+            if merged and lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        self.starts = [lo for lo, _ in merged]
+        self.ends = [hi for _, hi in merged]
+    
+    def classify(self, lo: int, hi: int) -> str:
+        """Whether the tokens [lo, hi] are all, partly or not covered"""
+        i = bisect.bisect_right(self.starts, lo) - 1
+        if i >= 0 and self.ends[i] >= lo:
+            return FULL if self.ends[i] >= hi else PARTIAL
+        if i + 1 < len(self.starts) and self.starts[i + 1] <= hi:
+            return PARTIAL
+        return OUT
+    
+    def __contains__(self, token: int) -> bool:
+        i = bisect.bisect_right(self.starts, token) - 1
+        return i >= 0 and token <= self.ends[i]
+
+
+class MerkleTree:
+    """
+    Hash tree over a worker's data, kept up to date on every write. Leaves
+    are the 2^leaf_bits buckets of the hash ring; each leaf is the XOR of
+    the digests of its entries and each inner node the XOR of its
+    2^fanout_bits children, so a write updates one node per level.
+    
+    Two replicas share only some token ranges, so hashes are computed for
+    a TokenCoverage: nodes inside it use the maintained hash, nodes on its
+    boundary are recomputed from their children, down to the entries of
+    boundary leaves.
+    """
+    
+    def __init__(self, leaf_bits: int = 16, fanout_bits: int = 4):
+        if leaf_bits % fanout_bits:
+            raise ValueError("leaf_bits must be a multiple of fanout_bits")
+        self.leaf_bits = leaf_bits
+        self.fanout_bits = fanout_bits
+        self.depth = leaf_bits // fanout_bits
+        self.levels = [array('Q', bytes(8 << (fanout_bits * level)))
+                       for level in range(self.depth + 1)]
+        self.buckets = {}  # leaf -> {key: (token, digest)}
+    
+    def update(self, key: str, version: Sequence):
+        """Record a key's new version"""
+        token = hash_key(key)
+        leaf = token >> (64 - self.leaf_bits)
+        bucket = self.buckets.setdefault(leaf, {})
+        old = bucket.get(key)
+        digest = entry_digest(key, version)
+        bucket[key] = (token, digest)
+        delta = digest ^ (old[1] if old else 0)
+        for level in range(self.depth, -1, -1):
+            self.levels[level][leaf >> (self.fanout_bits * (self.depth - level))] ^= delta
+    
+    def span(self, level: int, index: int):
+        """Tokens [lo, hi] under a node"""
+        shift = 64 - self.fanout_bits * level
+        return index << shift, ((index + 1) << shift) - 1
+    
+    def node_hash(self, level: int, index: int, coverage: Optional[TokenCoverage]) -> int:
+        """Hash of a node, counting only entries inside the coverage"""
+        if coverage is None:
+            return self.levels[level][index]
+        where = coverage.classify(*self.span(level, index))
+        if where == FULL:
+            return self.levels[level][index]
+        if where == OUT:
+            return 0
+        if level == self.depth:
+            result = 0
+            for token, digest in self.buckets.get(index, {}).values():
+                if token in coverage:
+                    result ^= digest
+            return result
+        result = 0
+        first = index << self.fanout_bits
+        for child in range(first, first + (1 << self.fanout_bits)):
+            result ^= self.node_hash(level + 1, child, coverage)
+        return result
+    
+    def children(self, index: int) -> List[int]:
+        """Indexes of a node's children on the next level"""
+        first = index << self.fanout_bits
+        return list(range(first, first + (1 << self.fanout_bits)))
+    
+    def leaf_keys(self, leaves: Iterable[int], coverage: Optional[TokenCoverage]) -> List[str]:
+        """Keys stored under some leaves, inside the coverage"""
+        keys = []
+        for leaf in leaves:
+            for key, (token, _) in self.buckets.get(leaf, {}).items():
+                if coverage is None or token in coverage:
+                    keys.append(key)
+        return keys
@@ -0,0 +1,320 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+
+class PeerQueue:
+    """Pending writes for one peer, sent in order by a single sender thread"""
+    
+    def __init__(self, url: str):
+        self.url = url
+        self.pending = deque()  # [seq, item, enqueued_at, future or None]
+        self.cond = threading.Condition()
+        self.sent = 0  # writes the peer acknowledged
+        self.batches = 0  # /replicate_batch requests the peer acknowledged
+        self.last_batch = 0  # writes in the last batch sent
+        self.failures = 0  # consecutive failed batches
+        self.last_error = None
+    
+    def to_dict(self, now: float) -> Dict:
+        with self.cond:
+            oldest = self.pending[0][2] if self.pending else None
+            return {
+                'pending': len(self.pending),
+                'lag': round(now - oldest, 3) if oldest is not None else 0.0,
+                'sent': self.sent,
+                'batches': self.batches,
+                'failures': self.failures,
+                'last_error': self.last_error
+            }
+
+
+class Replicator:
+    """
+    Per-peer replication queues. Every replica write is queued for its
+    peer and a sender thread per peer ships the queue in order as
+    /replicate_batch requests. A batch takes whatever queued up while the
+    previous one was in flight, up to batch_max writes or batch_bytes of
+    keys and values, and while writes keep arriving together it lingers up
+    to `linger` seconds for more; repeated writes of a key in one batch are
+    coalesced to the newest version. A PUT waits only for the writes it needs for
+    its quorum; the rest stay queued and are retried with exponential
+    backoff until the peer takes them or leaves the ring.
+    
+    With a backlog path, queued writes are also appended to a log and
+    replayed on restart, so a worker that goes down with writes still
+    queued sends them when it comes back.
+    
+    Writes this worker coordinates are also numbered and kept in a bounded
+    in-memory log (the last log_size of them). Each write carries its
+    origin [worker_id, epoch, seq], so a peer knows how far into our log it
+    has applied; a peer that was away asks for the writes after that point
+    (since()) instead of a full copy of its ranges. The epoch changes when
+    the worker restarts, since the log does not survive a restart.
+    
+    With hold set, writes for a peer that left the ring are kept until it
+    is back instead of dropped (hinted handoff); max_age, if set, bounds
+    how long any write stays queued.
+    """
+    
+    def __init__(self, backlog_path: Optional[str] = None, batch_max: int = 500,
+                 batch_bytes: int = 1 << 20, linger: float = 0.002, retry_base: float = 0.1, retry_max: float = 10.0, timeout: float = 5.0,
+                 is_peer: Callable[[str], bool] = lambda url: True, origin_id: str = '', log_size: int = 100000,
+                 hold: bool = False, max_age: Optional[float] = None, fsync: bool = False):
+        self.backlog_path = backlog_path
+        self.batch_max = batch_max
+        self.batch_bytes = batch_bytes
+        self.linger = linger
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.timeout = timeout
+        self.is_peer = is_peer  # False once a peer has left the ring
+        self.hold = hold
+        self.max_age = max_age
+        self.fsync = fsync  # fsync every backlog record, for writes acknowledged on the log's strength
+        self.queues = {}  # peer url -> PeerQueue
+        self.seq = 0  # sequence number of the last write queued
+        self.origin_id = origin_id
+        self.epoch = int(time.time() * 1000)
+        self.origin_seq = 0  # sequence number of the last write coordinated
+        self.history = deque(maxlen=log_size)  # the newest coordinated writes, in order
+        self._log = None
+        self._log_records = 0  # records in the backlog log since it was last compacted
+        self._log_lock = threading.RLock()  # taken before any PeerQueue.cond
+    
+    def load(self) -> int:
+        """Replay the backlog log and start sending what is still pending; returns its size"""
+        if not self.backlog_path:
+            return 0
+        
+        pending = {}  # url -> {seq: item}
+        if os.path.exists(self.backlog_path):
+            with open(self.backlog_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn final record
+                    writes = pending.setdefault(record['p'], {})
+                    if 'a' in record:
+                        for seq in [seq for seq in writes if seq <= record['a']]:
+                            del writes[seq]
+                    else:
+                        writes[record['s']] = (record['i'], record.get('t', time.time()))
+                    self.seq = max(self.seq, record.get('s', record.get('a', 0)))
+        
+        with self._log_lock:
+            for url, writes in pending.items():
+                queue = self._queue(url)
+                with queue.cond:
+                    queue.pending.extend([seq, item, enqueued_at, None]
+                                         for seq, (item, enqueued_at) in sorted(writes.items()))
+                    queue.cond.notify()
+            self._compact()
+        return sum(len(writes) for writes in pending.values())
+    
+    def _queue(self, url: str) -> PeerQueue:
+        """The queue for a peer, starting its sender on first use (caller holds _log_lock)"""
+        queue = self.queues.get(url)
+        if queue is None:
+            queue = self.queues[url] = PeerQueue(url)
+            threading.Thread(target=self._send_loop, args=(queue,), daemon=True).start()
+        return queue
+    
+    def _write(self, record: Dict):
+        """Append to the backlog log (caller holds _log_lock)"""
+        if self._log is not None:
+            self._log.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._log_records += 1
+    
+    def _compact(self):
+        """Rewrite the backlog log with only the pending writes (caller holds _log_lock)"""
+        if not self.backlog_path:
+            return
+        if self._log is not None:
+            self._log.close()
+        tmp_path = self.backlog_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for url, queue in self.queues.items():
+                with queue.cond:
+                    for seq, item, enqueued_at, _ in queue.pending:
+                        f.write(json.dumps({'p': url, 's': seq, 'i': item, 't': enqueued_at},
+                                           separators=(',', ':')) + '\n')
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.backlog_path)
+        self._log = open(self.backlog_path, 'a')
+        self._log_records = 0
+    
+    def enqueue(self, url: str, item: Dict) -> Future:
+        """
+        Queue a write ({"key", "value", "version"}) for a peer; the future
+        resolves once the peer has it
+        """
+        future = Future()
+        now = time.time()
+        with self._log_lock:  # re-entrant: replicate() holds it while queueing
+            self.seq += 1
+            self._write({'p': url, 's': self.seq, 'i': item, 't': round(now, 3)})
+            queue = self._queue(url)
+            with queue.cond:
+                queue.pending.append([self.seq, item, now, future])
+                queue.cond.notify()
+        return future
+    
+    def replicate(self, item: Dict, urls: List[str]) -> List[Future]:
+        """
+        Number a write this worker coordinated, keep it in the log and queue
+        it for its replicas; one future per url
+        """
+        with self._log_lock:
+            self.origin_seq += 1
+            item = dict(item, origin=[self.origin_id, self.epoch, self.origin_seq])
+            self.history.append(item)
+            return [self.enqueue(url, item) for url in urls]
+    
+    def since(self, epoch: int, seq: int,
+              wanted: Callable[[str], bool]) -> Optional[Tuple[List[Dict], int]]:
+        """
+        Logged writes after seq whose key is wanted, oldest first, and the
+        sequence number they run up to; None if the log no longer reaches
+        back that far (or is from another epoch)
+        """
+        with self._log_lock:
+            first = self.history[0]['origin'][2] if self.history else self.origin_seq + 1
+            if epoch != self.epoch or seq < first - 1 or seq > self.origin_seq:
+                return None
+            items = [item for item in self.history
+                     if item['origin'][2] > seq and wanted(item['key'])]
+            return items, self.origin_seq
+    
+    def _send_loop(self, queue: PeerQueue):
+        """Sender thread: ship a peer's queue in order, backing off while it fails"""
+        session = requests.Session()
+        while True:
+            with queue.cond:
+                while not queue.pending:
+                    queue.cond.wait()
+                # Under concurrent load (the last batch carried several
+                # writes) linger so more can join; a lone write goes at once
+                deadline = queue.pending[0][2] + self.linger
+                while queue.last_batch > 1 and len(queue.pending) < self.batch_max:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    queue.cond.wait(remaining)
+                batch = self._take(queue)
+            
+            if self.max_age is not None:
+                cutoff = time.time() - self.max_age
+                expired = next((i for i, entry in enumerate(batch) if entry[2] >= cutoff), len(batch))
+                if expired:
+                    self._drop(queue, expired, f"older than {self.max_age}s")
+                    continue
+            
+            if not self.is_peer(queue.url):
+                if self.hold:
+                    time.sleep(self.retry_base)  # wait for it to rejoin
+                else:
+                    self._drop(queue, len(batch), "no longer in the ring")
+                continue
+            
+            # Only the newest version of each key (and hint target) in the batch is sent
+            items = {}
+            for _, item, _, _ in batch:
+                current = items.get((item['key'], item.get('hint')))
+                if current is None or item['version'] > current['version']:
+                    items[(item['key'], item.get('hint'))] = item
+            try:
+                response = session.post(f"{queue.url}/replicate_batch", json={
+                    'items': list(items.values()),
+                    'live': True
+                }, timeout=self.timeout)
+                error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            
+            if error is None:
+                self._acknowledge(queue, batch)
+            else:
+                queue.failures += 1
+                queue.last_error = error
+                delay = min(self.retry_base * 2 ** (queue.failures - 1), self.retry_max)
+                if queue.failures == 1:
+                    print(f"⚠ Replication to {queue.url} failed ({error}); retrying with backoff")
+                time.sleep(delay)
+    
+    def _take(self, queue: PeerQueue) -> List:
+        """The next batch from the front of the queue (caller holds queue.cond)"""
+        batch = []
+        size = 0
+        for entry in queue.pending:
+            size += len(entry[1]['key']) + len(str(entry[1]['value']))
+            if batch and (len(batch) >= self.batch_max or size > self.batch_bytes):
+                break
+            batch.append(entry)
+        return batch
+    
+    def _acknowledge(self, queue: PeerQueue, batch: List):
+        """Drop a delivered batch from the queue and the backlog log"""
+        with self._log_lock:
+            self._write({'p': queue.url, 'a': batch[-1][0]})
+            with queue.cond:
+                for _ in batch:
+                    queue.pending.popleft()
+                queue.sent += len(batch)
+                queue.batches += 1
+                queue.last_batch = len(batch)
+                queue.failures = 0
+                queue.last_error = None
+            if self._log_records > 10000 and self._log_records > 4 * self.backlog_size():
+                self._compact()
+        for _, _, _, future in batch:
+            if future is not None:
+                future.set_result(True)
+    
+    def _drop(self, queue: PeerQueue, count: int, reason: str):
+        """
+        Discard the writes at the front of a peer's queue. Re-replication
+        and catch-up cover peers that left the ring.
+        """
+        with self._log_lock:
+            with queue.cond:
+                dropped = [queue.pending.popleft() for _ in range(count)]
+            self._write({'p': queue.url, 'a': dropped[-1][0]})
+        print(f"⚠ Dropped {count} queued writes for {queue.url}: {reason}")
+        for _, _, _, future in dropped:
+            if future is not None:
+                future.set_result(False)
+    
+    def failing(self, url: str) -> bool:
+        """Whether the last batch sent to a peer failed"""
+        queue = self.queues.get(url)
+        return queue is not None and queue.failures > 0
+    
+    def backlog_size(self) -> int:
+        """Writes queued across all peers"""
+        return sum(len(queue.pending) for queue in list(self.queues.values()))
+    
+    def stats(self) -> Dict:
+        """Backlog and lag (age of the oldest queued write) per peer"""
+        now = time.time()
+        peers = {url: queue.to_dict(now) for url, queue in list(self.queues.items())}
+        return {
+            'pending': sum(peer['pending'] for peer in peers.values()),
+            'lag': max([peer['lag'] for peer in peers.values()] + [0.0]),
+            'epoch': self.epoch,
+            'seq': self.origin_seq,
+            'log_size': len(self.history),
+            'peers': peers
+        }
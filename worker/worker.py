@@ -1,22 +1,155 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 import requests
 import threading
 import time
+import bisect
+import heapq
+import random
 import sys
 import os
+from concurrent.futures import FIRST_COMPLETED, wait
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import *
+from routing import (CONTROLLER_TERM_HEADER, RangeSet, RingRouter, RING_VERSION_HEADER,
+                     controller_term, hash_key, partition_of)
+from gossip import SwimMembership
+from replication import Replicator
+from hlc import HybridLogicalClock, is_newer
+from merkle import MerkleTree, TokenCoverage
 
 app = Flask(__name__)
 
 # Worker state
 worker_id = None
 worker_port = None
+worker_weight = 1.0  # Capacity weight; scales this worker's share of the ring
 storage = {}  # Simple dictionary to store key-value pairs
+versions = {}  # key -> HLC version [wall_ms, logical, worker_id] of the stored value
+storage_bytes = 0  # Approximate size of the stored keys and values
+partition_counts = [0] * PARTITION_COUNT  # Stored keys per hash partition
 lock = threading.Lock()
+clock = None  # HybridLogicalClock stamping this worker's writes (set up by start_worker)
+merkle = MerkleTree(MERKLE_LEAF_BITS, MERKLE_FANOUT_BITS)  # Hash tree of the stored versions
+
+# Controllers in failover order; the one that last answered comes first
+controller_urls = list(CONTROLLER_URLS)
+
+# Local copy of the controller's ring, used to route replication
+router = RingRouter(CONTROLLER_URLS)
+
+# Per-peer replication queues (set up by start_worker)
+replicator = None
+hints = None  # Writes held for replicas that were unreachable, delivered when they are back
+applied_origins = {}  # worker_id -> [epoch, seq] of the last write applied from its replication log
+catch_up_stats = {'sessions': 0, 'delta_keys': 0, 'snapshots': 0, 'failed': 0, 'last': None}
+
+# Anti-entropy sessions with replica peers (hash partitioning only)
+anti_entropy_stats = {'sessions': 0, 'keys_pushed': 0, 'keys_pulled': 0, 'last': None}
+anti_entropy_lock = threading.Lock()  # one session at a time
+
+# Peer failure detection (MEMBERSHIP = 'gossip'; set up by start_worker)
+membership = None
+pending_failures = {}  # worker_id -> incarnation, declared dead but not yet reported
+
+# Load since the last heartbeat, reported to the controller
+range_ops = {}  # range start key -> request count (range partitioning only)
+partition_ops = [0] * PARTITION_COUNT  # requests per hash partition
+vnode_ops = {}  # ring token -> requests to its vnode (hash partitioning only)
+request_counts = {}  # endpoint -> request count
+latency_samples = []  # reservoir of GET/PUT latencies in seconds
+latency_seen = 0  # GET/PUT requests offered to the reservoir
+stats_lock = threading.Lock()
+
+# Endpoints counted in the request rates, and those whose latency is sampled
+COUNTED_ENDPOINTS = {'get_key': 'get', 'put_key': 'put', 'replicate': 'replicate'}
+TIMED_ENDPOINTS = ('get_key', 'put_key')
+
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def add_ring_version(response):
+    """Tell callers which ring version this worker routes with"""
+    response.headers[RING_VERSION_HEADER] = str(router.version)
+    record_request(request.endpoint, time.perf_counter() - g.started)
+    return response
+
+
+def record_request(endpoint, latency):
+    """Count a request and sample its latency for the next heartbeat"""
+    global latency_seen
+    name = COUNTED_ENDPOINTS.get(endpoint)
+    if name is None:
+        return
+    with stats_lock:
+        request_counts[name] = request_counts.get(name, 0) + 1
+        if endpoint in TIMED_ENDPOINTS:
+            latency_seen += 1
+            if len(latency_samples) < LATENCY_SAMPLE_SIZE:
+                latency_samples.append(latency)
+            else:
+                slot = random.randrange(latency_seen)
+                if slot < LATENCY_SAMPLE_SIZE:
+                    latency_samples[slot] = latency
+
+
+def entry_size(key, value):
+    """Approximate bytes held by one stored entry"""
+    return len(key) + len(value if isinstance(value, str) else str(value))
+
+
+def store(key, value, version):
+    """
+    Write a key to local storage and count it against its partition, unless
+    we already hold a newer version (last writer wins). Returns whether
+    the write was applied (caller holds lock)
+    """
+    global storage_bytes
+    if not is_newer(version, versions.get(key)):
+        return False
+    old = storage.get(key)
+    if old is None:
+        partition_counts[partition_of(key, PARTITION_BITS)] += 1
+    else:
+        storage_bytes -= entry_size(key, old)
+    storage[key] = value
+    versions[key] = list(version)
+    storage_bytes += entry_size(key, value)
+    merkle.update(key, version)
+    return True
+
+
+def valid_version(version):
+    """Whether a replicated write carries an HLC version [wall_ms, logical, worker_id]"""
+    return (isinstance(version, list) and len(version) == 3 and
+            all(isinstance(part, int) for part in version[:2]) and isinstance(version[2], str))
+
+
+def misrouted_response(key):
+    """
+    Reject a request routed with an older ring when this worker no longer
+    owns the key. Refreshes our own ring if the caller has a newer one.
+    """
+    client_version = request.headers.get(RING_VERSION_HEADER, type=int)
+    if client_version is None:
+        return None
+    
+    router.observe_version(client_version)
+    
+    if (client_version < router.version and
+            worker_id not in router.get_replicas(key, REPLICATION_FACTOR)):
+        return jsonify({
+            'success': False,
+            'error': 'Stale ring: key is not owned by this worker',
+            'ring_version': router.version
+        }), 421
+    return None
 
 
 @app.route('/get', methods=['GET'])
@@ -34,6 +167,12 @@ def get_key():
                 'error': 'Missing key parameter'
             }), 400
         
+        misrouted = misrouted_response(key)
+        if misrouted:
+            return misrouted
+        
+        record_op(key)
+        
         with lock:
             if key in storage:
                 value = storage[key]
@@ -41,7 +180,8 @@ def get_key():
                 return jsonify({
                     'success': True,
                     'key': key,
-                    'value': value
+                    'value': value,
+                    'version': versions[key]
                 }), 200
             else:
                 print(f"✗ GET: {key} not found")
@@ -76,65 +216,51 @@ def put_key():
                 'error': 'Missing key or value'
             }), 400
         
-        # Store locally
+        misrouted = misrouted_response(key)
+        if misrouted:
+            return misrouted
+        
+        record_op(key)
+        
+        # Store locally under a fresh version, newer than any we have seen and
+        # than the stored one (which a peer past HLC_MAX_DRIFT_MS may have stamped)
         with lock:
-            storage[key] = value
+            version = clock.now_after(versions.get(key))
+            store(key, value, version)
         
         print(f"✓ PUT: {key} = {value}")
         
-        # Get replica workers from controller
-        replicas_response = requests.get(
-            f"http://{CONTROLLER_HOST}:{CONTROLLER_PORT}/query?key={key}",
-            timeout=5
-        )
-        
-        if replicas_response.status_code != 200:
+        # Route replication locally from the cached ring
+        try:
+            replica_ids = router.get_replicas(key, REPLICATION_FACTOR)
+        except requests.RequestException:
             return jsonify({
                 'success': True,
+                'version': version,
                 'replicas_written': 1,
                 'warning': 'Could not contact controller for replication'
             }), 200
         
-        replica_data = replicas_response.json()
-        replica_urls = replica_data.get('replicas', [])
-        
         # Replicate to other workers (excluding self)
-        my_url = f"http://localhost:{worker_port}"
-        other_replicas = [url for url in replica_urls if url != my_url]
-        
-        replicas_written = 1  # Count self
-        
-        # Synchronous replication - write to first replica
-        if len(other_replicas) >= 1:
-            if replicate_to_worker(other_replicas[0], key, value):
-                replicas_written += 1
+        other_replicas = [router.get_worker_url(replica_id) for replica_id in replica_ids
+                          if replica_id != worker_id]
+        other_replicas = [url for url in other_replicas if url]
         
-        # Synchronous replication - write to second replica
-        if len(other_replicas) >= 2:
-            if replicate_to_worker(other_replicas[1], key, value):
-                replicas_written += 1
-        
-        # Notify controller about the PUT operation
-        try:
-            notify_response = requests.post(
-                f"http://{CONTROLLER_HOST}:{CONTROLLER_PORT}/notify_put",
-                json={
-                    'worker_id': worker_id,
-                    'key': key,
-                    'replicas': replica_data.get('replica_ids', [])
-                },
-                timeout=2
-            )
-        except:
-            pass  # Don't fail PUT if notification fails
+        # Count self, plus the replicas (or hint holders) that acknowledged before we answer
+        acked, hinted = replicate_put(other_replicas,
+                                      {'key': key, 'value': value, 'version': version})
+        replicas_written = 1 + acked
         
         # Check if we have enough replicas
         if replicas_written >= SYNC_REPLICAS:
-            print(f"✓ PUT successful: {replicas_written}/{REPLICATION_FACTOR} replicas written")
+            print(f"✓ PUT successful: {replicas_written}/{REPLICATION_FACTOR} replicas written"
+                  + (f" ({hinted} as hints)" if hinted else ""))
             return jsonify({
                 'success': True,
                 'key': key,
-                'replicas_written': replicas_written
+                'version': version,
+                'replicas_written': replicas_written,
+                'hinted': hinted
             }), 200
         else:
             print(f"⚠ PUT warning: Only {replicas_written}/{SYNC_REPLICAS} replicas written")
@@ -157,12 +283,14 @@ def replicate():
     """
     Replicate operation - receive data from primary worker
     POST /replicate
-    Body: {"key": "mykey", "value": "myvalue"}
+    Body: {"key": "mykey", "value": "myvalue", "version": [1700000000000, 0, "worker_1"]}
+    Applied only if the version is newer than the one stored.
     """
     try:
         data = request.get_json()
         key = data.get('key')
         value = data.get('value')
+        version = data.get('version')
         
         if not key or value is None:
             return jsonify({
@@ -170,14 +298,24 @@ def replicate():
                 'error': 'Missing key or value'
             }), 400
         
-        # Store the replicated data
+        if not valid_version(version):
+            return jsonify({
+                'success': False,
+                'error': 'Missing or malformed version'
+            }), 400
+        
+        record_op(key)
+        clock.observe(version)
+        
+        # Store the replicated data unless we hold something newer
         with lock:
-            storage[key] = value
+            applied = store(key, value, version)
         
-        print(f"✓ REPLICATE: {key} = {value}")
+        print(f"✓ REPLICATE: {key} = {value}" + ("" if applied else " (stale, ignored)"))
         
         return jsonify({
             'success': True,
+            'applied': applied,
             'message': 'Replication successful'
         }), 200
         
@@ -189,9 +327,151 @@ def replicate():
         }), 500
 
 
+@app.route('/replicate_batch', methods=['POST'])
+def replicate_batch():
+    """
+    Batch replicate operation - receive many key-value pairs at once
+    POST /replicate_batch
+    Body: {"items": [{"key": "k1", "value": "v1", "version": [...], "origin": [...]}, ...], "live": true}
+    Items older than the stored version are skipped. "live" marks client writes from a peer's replication queue, which
+    count towards this worker's load; range transfers leave it out. "origin" ([worker_id, epoch, seq],
+    optional) is the item's place in the sending worker's replication log. Items with a "hint" (a
+    replica's URL) are not stored here but held for that replica until it is back.
+    """
+    try:
+        data = request.get_json()
+        items = data.get('items') if data else None
+        
+        if not isinstance(items, list):
+            return jsonify({
+                'success': False,
+                'error': 'Missing items list'
+            }), 400
+        
+        if any(not item.get('key') or item.get('value') is None or
+               not valid_version(item.get('version')) for item in items):
+            return jsonify({
+                'success': False,
+                'error': 'Every item needs a key, a value and a version'
+            }), 400
+        
+        held = [item for item in items if item.get('hint')]
+        if held:
+            # Hinted handoff: keep these for their replica; its catch-up
+            # tracks the coordinator's log, so the origin is left behind
+            items = [item for item in items if not item.get('hint')]
+            for item in held:
+                hints.enqueue(item['hint'], {'key': item['key'], 'value': item['value'],
+                                             'version': item['version']})
+            print(f"✓ HINTS: holding {len(held)} writes for unreachable replicas")
+        
+        if data.get('live'):
+            for item in items:
+                record_op(item['key'])
+            with stats_lock:
+                request_counts['replicate'] = request_counts.get('replicate', 0) + len(items)
+        
+        if items:
+            clock.observe(max(item['version'] for item in items))
+        with lock:
+            applied = sum(store(item['key'], item['value'], item['version']) for item in items)
+            for item in items:
+                if data.get('live') and item.get('origin'):
+                    note_origin(item['origin'])
+        
+        if items:
+            print(f"✓ REPLICATE BATCH: {applied}/{len(items)} keys applied")
+        
+        return jsonify({
+            'success': True,
+            'applied': applied,
+            'held': len(held)
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error in REPLICATE BATCH: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/transfer_range', methods=['POST'])
+def transfer_range():
+    """
+    Push every locally stored key in a set of ranges to another worker
+    POST /transfer_range
+    Body: {"target": "http://localhost:6001", "kind": "key", "ranges": [["a", "m"]],
+           "max_keys_per_sec": 5000}   (max_keys_per_sec optional, 0 = unlimited)
+    Key ranges are [start, end) (end null = unbounded); token ranges are
+    (start, end] on the hash ring, wrapping when start >= end.
+    """
+    try:
+        data = request.get_json()
+        target = data.get('target')
+        kind = data.get('kind', 'key')
+        ranges = data.get('ranges')
+        max_keys_per_sec = data.get('max_keys_per_sec') or 0
+        if ranges is None:
+            ranges = [[data.get('start', ''), data.get('end')]]
+        
+        if not target:
+            return jsonify({
+                'success': False,
+                'error': 'Missing target'
+            }), 400
+        
+        if kind not in ('key', 'token'):
+            return jsonify({
+                'success': False,
+                'error': f'Unknown range kind: {kind}'
+            }), 400
+        
+        wanted = RangeSet(kind, ranges)
+        with lock:
+            items = [{'key': key, 'value': value, 'version': versions[key]}
+                     for key, value in storage.items() if key in wanted]
+        
+        sent = 0
+        started = time.time()
+        for i in range(0, len(items), TRANSFER_BATCH_SIZE):
+            batch = items[i:i + TRANSFER_BATCH_SIZE]
+            response = requests.post(f"{target}/replicate_batch",
+                                     json={'items': batch}, timeout=30)
+            if response.status_code != 200:
+                return jsonify({
+                    'success': False,
+                    'error': f'Target rejected batch: {response.status_code}',
+                    'keys_sent': sent
+                }), 502
+            sent += len(batch)
+            if max_keys_per_sec:
+                # Throttle so repair traffic doesn't starve client requests
+                delay = started + sent / max_keys_per_sec - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        
+        print(f"✓ TRANSFER: {sent} keys in {len(ranges)} {kind} range(s) to {target}")
+        
+        return jsonify({
+            'success': True,
+            'keys_sent': sent
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error in TRANSFER: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/status', methods=['GET'])
 def status():
     """Get worker status"""
+    # A caller with a newer ring (the controller after a cutover) makes us fetch it now
+    router.observe_version(request.headers.get(RING_VERSION_HEADER, type=int))
+    
     with lock:
         num_keys = len(storage)
     
@@ -203,53 +483,731 @@ def status():
     }), 200
 
 
-def replicate_to_worker(worker_url, key, value):
-    """Helper function to replicate data to another worker"""
+@app.route('/replication', methods=['GET'])
+def replication_status():
+    """Replication queues: writes still owed to each peer and how far behind it is"""
+    with lock:
+        applied = {peer_id: list(origin) for peer_id, origin in applied_origins.items()}
+    return jsonify(dict(replicator.stats(), applied=applied, catch_up=catch_up_stats,
+                        hints=hints.stats(), success=True)), 200
+
+
+@app.route('/replication/since', methods=['POST'])
+def replication_since():
+    """
+    Writes this worker coordinated after a point in its replication log, for a peer catching up
+    POST /replication/since
+    Body: {"epoch": 1700000000000, "seq": 1234, "kind": "token", "ranges": [[start, end], ...]}
+    Returns the writes with keys in the ranges ("complete": true), or "complete": false when the
+    log no longer reaches back to seq; "epoch" and "seq" are where the log stands now.
+    """
+    try:
+        data = request.get_json()
+        epoch = data.get('epoch')
+        seq = data.get('seq')
+        kind = data.get('kind', 'token')
+        ranges = data.get('ranges')
+        
+        if not isinstance(epoch, int) or not isinstance(seq, int) or not isinstance(ranges, list):
+            return jsonify({
+                'success': False,
+                'error': 'Missing epoch, seq or ranges'
+            }), 400
+        
+        if kind not in ('key', 'token'):
+            return jsonify({
+                'success': False,
+                'error': f'Unknown range kind: {kind}'
+            }), 400
+        
+        wanted = RangeSet(kind, ranges)
+        delta = replicator.since(epoch, seq, wanted.__contains__)
+        items, latest = delta if delta is not None else (None, replicator.origin_seq)
+        
+        return jsonify({
+            'success': True,
+            'complete': items is not None,
+            'items': items or [],
+            'epoch': replicator.epoch,
+            'seq': latest
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error in REPLICATION SINCE: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/merkle/hashes', methods=['POST'])
+def merkle_hashes():
+    """
+    Hashes of Merkle tree nodes, counting only keys in some token ranges
+    POST /merkle/hashes
+    Body: {"ranges": [[start, end], ...], "level": 2, "nodes": [17, 18]}
+    """
     try:
-        response = requests.post(
-            f"{worker_url}/replicate",
-            json={'key': key, 'value': value},
-            timeout=5
-        )
-        return response.status_code == 200
+        data = request.get_json()
+        level = data.get('level')
+        nodes = data.get('nodes')
+        
+        if not isinstance(level, int) or not 0 <= level <= merkle.depth or \
+                not isinstance(nodes, list):
+            return jsonify({
+                'success': False,
+                'error': f'Need a level (0-{merkle.depth}) and a nodes list'
+            }), 400
+        
+        coverage = TokenCoverage(data.get('ranges') or [])
+        with lock:
+            hashes = [merkle.node_hash(level, index, coverage) for index in nodes]
+        
+        return jsonify({
+            'success': True,
+            'hashes': hashes
+        }), 200
+        
     except Exception as e:
-        print(f"✗ Replication failed to {worker_url}: {str(e)}")
-        return False
+        print(f"✗ Error in MERKLE HASHES: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/merkle/versions', methods=['POST'])
+def merkle_versions():
+    """
+    Versions of the keys under some Merkle leaves, in some token ranges
+    POST /merkle/versions
+    Body: {"ranges": [[start, end], ...], "leaves": [4711, 4712]}
+    """
+    try:
+        data = request.get_json()
+        leaves = data.get('leaves')
+        
+        if not isinstance(leaves, list):
+            return jsonify({
+                'success': False,
+                'error': 'Missing leaves list'
+            }), 400
+        
+        coverage = TokenCoverage(data.get('ranges') or [])
+        with lock:
+            found = {key: versions[key] for key in merkle.leaf_keys(leaves, coverage)}
+        
+        return jsonify({
+            'success': True,
+            'versions': found
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error in MERKLE VERSIONS: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/merkle/items', methods=['POST'])
+def merkle_items():
+    """
+    Values and versions of some keys, for a peer pulling newer entries
+    POST /merkle/items
+    Body: {"keys": ["k1", "k2"]}
+    """
+    try:
+        data = request.get_json()
+        keys = data.get('keys')
+        
+        if not isinstance(keys, list):
+            return jsonify({
+                'success': False,
+                'error': 'Missing keys list'
+            }), 400
+        
+        with lock:
+            items = [{'key': key, 'value': storage[key], 'version': versions[key]}
+                     for key in keys if key in storage]
+        
+        return jsonify({
+            'success': True,
+            'items': items
+        }), 200
+        
+    except Exception as e:
+        print(f"✗ Error in MERKLE ITEMS: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/anti_entropy', methods=['GET', 'POST'])
+def anti_entropy():
+    """
+    GET: anti-entropy totals and the last session
+    POST: reconcile with a replica peer now
+    Body: {"peer": "worker_2"}
+    """
+    if request.method == 'GET':
+        with stats_lock:
+            return jsonify(dict(anti_entropy_stats, success=True)), 200
+    
+    data = request.get_json() or {}
+    peer_id = data.get('peer')
+    if not peer_id or not router.get_worker_url(peer_id) or peer_id == worker_id:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown peer: {peer_id}'
+        }), 400
+    
+    try:
+        session = anti_entropy_session(peer_id)
+        return jsonify(dict(session, success=True)), 200
+    except Exception as e:
+        print(f"✗ Error in ANTI-ENTROPY: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/catch_up', methods=['POST'])
+def catch_up_endpoint():
+    """
+    Fetch the writes missed in some ranges from the peers holding them
+    POST /catch_up
+    Body: {"sources": [{"worker_id": "worker_2", "url": "...", "kind": "token",
+                        "ranges": [[start, end], ...]}, ...], "copy": true}
+    """
+    data = request.get_json() or {}
+    sources = data.get('sources')
+    if not isinstance(sources, list) or \
+            not all(isinstance(s, dict) and s.get('worker_id') and s.get('url') and
+                    isinstance(s.get('ranges'), list) for s in sources):
+        return jsonify({
+            'success': False,
+            'error': 'Need a sources list of worker_id, url and ranges'
+        }), 400
+    
+    try:
+        session = catch_up(sources, copy=data.get('copy', True))
+        return jsonify(dict(session, success=True)), 200
+    except Exception as e:
+        print(f"✗ Error in CATCH-UP: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/gossip/ping', methods=['POST'])
+def gossip_ping():
+    """
+    SWIM probe from a peer; the ack carries our membership updates
+    POST /gossip/ping
+    Body: {"from": "worker_2", "url": "...", "incarnation": 0, "ring_version": 7, "updates": [...]}
+    """
+    if membership is None:
+        return jsonify({
+            'success': False,
+            'error': 'Gossip membership is disabled'
+        }), 404
+    
+    return jsonify(dict(membership.handle_ping(request.get_json()), success=True)), 200
+
+
+@app.route('/gossip/ping_req', methods=['POST'])
+def gossip_ping_req():
+    """
+    Probe another worker on a peer's behalf (SWIM indirect probe)
+    POST /gossip/ping_req
+    Body: same as /gossip/ping plus {"target": "worker_4", "target_url": "..."}
+    """
+    if membership is None:
+        return jsonify({
+            'success': False,
+            'error': 'Gossip membership is disabled'
+        }), 404
+    
+    data = request.get_json()
+    if not data or not data.get('target_url'):
+        return jsonify({
+            'success': False,
+            'error': 'Missing target_url'
+        }), 400
+    
+    return jsonify(dict(membership.handle_ping_req(data), success=True)), 200
+
+
+@app.route('/gossip/members', methods=['GET'])
+def gossip_members():
+    """This worker's view of the membership"""
+    if membership is None:
+        return jsonify({
+            'success': False,
+            'error': 'Gossip membership is disabled'
+        }), 404
+    
+    return jsonify(dict(membership.to_dict(), success=True)), 200
+
+
+def replicate_put(replica_urls, item):
+    """
+    Queue a versioned write for every other replica and wait until SYNC_REPLICAS - 1
+    of them have it (or REPLICATION_SYNC_TIMEOUT passes); the other replicas get it
+    from their queues later.
+    
+    With HINTED_HANDOFF, a replica whose queue is failing is stood in for by the
+    next healthy worker on the ring, which holds the write as a hint and delivers
+    it once the replica is back; its ack counts towards the quorum. Returns
+    (acknowledged, of which hints).
+    """
+    needed = SYNC_REPLICAS - 1
+    waiting = set(replicator.replicate(item, replica_urls))
+    hint_futures = set()
+    hinted_for = set()  # replica urls a hint was sent for
+    holders = set()  # hint holder urls
+    acked = hinted = 0
+    if needed <= 0:
+        return acked, hinted
+    
+    deadline = time.time() + REPLICATION_SYNC_TIMEOUT
+    while acked < needed and waiting:
+        if HINTED_HANDOFF:
+            for url in replica_urls:
+                if url not in hinted_for and replicator.failing(url):
+                    hinted_for.add(url)
+                    holder = hint_holder(item['key'], set(replica_urls) | holders)
+                    if holder:
+                        holders.add(holder)
+                        future = replicator.enqueue(holder, dict(item, hint=url))
+                        waiting.add(future)
+                        hint_futures.add(future)
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            print(f"⚠ Replication of {item['key']}: {acked}/{needed} acks within {REPLICATION_SYNC_TIMEOUT}s")
+            break
+        # Wake up now and then to notice replicas whose queues started failing
+        done, waiting = wait(waiting, timeout=min(remaining, 0.05), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.result():
+                acked += 1
+                hinted += future in hint_futures
+    return acked, hinted
+
+
+def hint_holder(key, skip):
+    """URL of the first worker after a key's replicas on the ring that is reachable, to hold a hint"""
+    ring = router.ring
+    if ring is None:
+        return None
+    candidates = list(ring.get_replicas(key, len(ring.workers)))
+    candidates += sorted(ring.workers - set(candidates))
+    for candidate in candidates:
+        url = router.get_worker_url(candidate)
+        if candidate != worker_id and url and url not in skip and not replicator.failing(url):
+            return url
+    return None
+
+
+def note_origin(origin):
+    """Record how far into a peer's replication log we have applied (caller holds lock)"""
+    source, epoch, seq = origin
+    current = applied_origins.get(source)
+    if current is None or epoch > current[0] or (epoch == current[0] and seq > current[1]):
+        applied_origins[source] = [epoch, seq]
+
+
+def in_ring(worker_url):
+    """Whether a peer URL belongs to the cached ring (queues for departed peers are dropped)"""
+    return router.ring is None or worker_url in router.worker_urls.values()
+
+
+def record_op(key):
+    """Count a request against its hash partition and its vnode or range"""
+    key_hash = hash_key(key)
+    partition = key_hash >> (64 - PARTITION_BITS)
+    ring = router.ring
+    token = start = None
+    if ring is not None and len(ring):
+        if PARTITION_METHOD == 'range':
+            start = ring.bounds[ring.range_index(key)]
+        else:
+            token = ring.tokens[ring.token_index(key_hash)]
+    with stats_lock:
+        partition_ops[partition] += 1
+        if token is not None:
+            vnode_ops[token] = vnode_ops.get(token, 0) + 1
+        if start is not None:
+            range_ops[start] = range_ops.get(start, 0) + 1
+
+
+def collect_load_stats(elapsed):
+    """
+    Compact load summary for a heartbeat: data size, request rates, p99
+    GET/PUT latency, replication backlog and the busiest hash partitions
+    """
+    global latency_seen
+    with stats_lock:
+        counts = dict(request_counts)
+        request_counts.clear()
+        samples = sorted(latency_samples)
+        latency_samples.clear()
+        latency_seen = 0
+        ops = partition_ops[:]
+        partition_ops[:] = [0] * PARTITION_COUNT
+        vnodes = dict(vnode_ops)
+        vnode_ops.clear()
+    with lock:
+        keys = len(storage)
+        size = storage_bytes
+    replication = replicator.stats()
+    
+    hot = heapq.nlargest(HOT_PARTITIONS_REPORTED,
+                         (p for p in range(PARTITION_COUNT) if ops[p]),
+                         key=ops.__getitem__)
+    hot_vnodes = heapq.nlargest(HOT_PARTITIONS_REPORTED, vnodes, key=vnodes.get)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else None
+    
+    return {
+        'keys': keys,
+        'bytes': size,
+        'get_qps': round(counts.get('get', 0) / elapsed, 2),
+        'put_qps': round(counts.get('put', 0) / elapsed, 2),
+        'replicate_qps': round(counts.get('replicate', 0) / elapsed, 2),
+        'p99_ms': round(p99 * 1000, 3) if p99 is not None else None,
+        'replication_backlog': replication['pending'],
+        'replication_lag': replication['lag'],
+        'hints_pending': hints.backlog_size(),
+        'replication_lags': {url: peer['lag'] for url, peer in replication['peers'].items()
+                             if peer['lag']},
+        'hot_partitions': [[p, round(ops[p] / elapsed, 2)] for p in hot],
+        'hot_vnodes': [[token, round(vnodes[token] / elapsed, 2)] for token in hot_vnodes]
+    }
+
+
+def collect_range_stats(elapsed):
+    """
+    Per-range key counts, request rates and median keys (split points)
+    for the data held on this worker
+    """
+    ring = router.ring
+    with lock:
+        keys = sorted(storage)
+    with stats_lock:
+        ops = dict(range_ops)
+        range_ops.clear()
+    
+    stats = []
+    i = 0
+    while i < len(keys):
+        index = ring.range_index(keys[i])
+        start = ring.bounds[index]
+        end = ring.range_end(index)
+        # Keys are sorted, so each range is one contiguous run
+        j = bisect.bisect_left(keys, end, i) if end is not None else len(keys)
+        stats.append({
+            'start': start,
+            'keys': j - i,
+            'qps': ops.pop(start, 0) / elapsed,
+            'split_key': keys[(i + j) // 2]
+        })
+        i = j
+    for start, count in ops.items():
+        stats.append({'start': start, 'keys': 0, 'qps': count / elapsed, 'split_key': None})
+    
+    return {'ring_version': ring.version, 'ranges': stats}
+
+
+def shared_token_ranges(peer_id):
+    """Token ranges (start, end] that both this worker and a peer replicate"""
+    ring = router.ring
+    if ring is None or PARTITION_METHOD != 'hash' or not len(ring):
+        return []
+    ranges = []
+    for i, replicas in enumerate(ring.replica_table):
+        if worker_id in replicas and peer_id in replicas:
+            start = ring.tokens[i - 1]  # tokens[-1] for i = 0: the wrapping range
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = ring.tokens[i]
+            else:
+                ranges.append([start, ring.tokens[i]])
+    return ranges
+
+
+def catch_up(sources, copy=True):
+    """
+    Catch up on the ranges the controller is handing us as we join the
+    ring. Ask every source peer for the writes it coordinated after the
+    last one we applied from it, in its ranges; when its log no longer
+    reaches back that far (or we have never heard from it) have it copy
+    those ranges to us instead. With copy=False only note where each log
+    stands, so the next session fetches just the writes made after it.
+    """
+    session = {'started': time.time(), 'peers': 0, 'delta_keys': 0, 'snapshots': 0,
+               'snapshot_keys': 0, 'marked': 0, 'failed': 0}
+    for source in sources:
+        peer_id, peer_url = source['worker_id'], source['url']
+        kind, ranges = source.get('kind', 'token'), source['ranges']
+        if not ranges or peer_id == worker_id:
+            continue
+        session['peers'] += 1
+        try:
+            with lock:
+                epoch, seq = applied_origins.get(peer_id, (0, 0))
+            response = requests.post(f"{peer_url}/replication/since", json={
+                'epoch': epoch, 'seq': seq, 'kind': kind, 'ranges': ranges
+            }, timeout=30)
+            response.raise_for_status()
+            delta = response.json()
+            if delta['complete']:
+                items = delta['items']
+                if items:
+                    clock.observe(max(item['version'] for item in items))
+                with lock:
+                    session['delta_keys'] += sum(store(item['key'], item['value'], item['version'])
+                                                 for item in items)
+            elif not copy:
+                session['marked'] += 1
+            else:
+                # Our place in its log is gone: copy the ranges instead
+                response = requests.post(f"{peer_url}/transfer_range", json={
+                    'target': f"http://localhost:{worker_port}", 'kind': kind, 'ranges': ranges
+                }, timeout=600)
+                response.raise_for_status()
+                session['snapshots'] += 1
+                session['snapshot_keys'] += response.json()['keys_sent']
+            with lock:
+                note_origin([peer_id, delta['epoch'], delta['seq']])
+        except (requests.RequestException, KeyError, ValueError) as e:
+            session['failed'] += 1
+            print(f"✗ Catch-up from {peer_id} failed: {str(e)}")
+    
+    session['elapsed'] = round(time.time() - session['started'], 3)
+    with stats_lock:
+        catch_up_stats['sessions'] += 1
+        for field in ('delta_keys', 'snapshots', 'failed'):
+            catch_up_stats[field] += session[field]
+        catch_up_stats['last'] = session
+    print(f"✓ CATCH-UP from {session['peers']} peers: {session['delta_keys']} keys from logs, "
+          f"{session['snapshot_keys']} keys in {session['snapshots']} range copies, "
+          f"{session['marked']} log positions noted "
+          f"({session['failed']} failed, {session['elapsed']}s)")
+    return session
+
+
+def anti_entropy_session(peer_id):
+    """
+    Reconcile the token ranges shared with one peer. Walk both Merkle trees
+    top down, descending only into nodes whose hashes differ, then compare
+    versions under the differing leaves and send each side the entries it
+    is missing or holds an older version of. Traffic grows with the number
+    of differences, not with the data held.
+    """
+    peer_url = router.get_worker_url(peer_id)
+    ranges = shared_token_ranges(peer_id)
+    session = {'peer': peer_id, 'ranges': len(ranges), 'nodes_compared': 0,
+               'leaves_differing': 0, 'keys_pushed': 0, 'keys_pulled': 0}
+    if not ranges or not peer_url:
+        return session
+    
+    with anti_entropy_lock:
+        started = time.time()
+        coverage = TokenCoverage(ranges)
+        http = requests.Session()
+        
+        def post(path, payload):
+            response = http.post(f"{peer_url}{path}", json=payload, timeout=30)
+            response.raise_for_status()
+            return response.json()
+        
+        # Descend to the leaves whose hashes differ
+        nodes = [0]
+        for level in range(merkle.depth + 1):
+            differing = []
+            for i in range(0, len(nodes), ANTI_ENTROPY_BATCH_SIZE):
+                chunk = nodes[i:i + ANTI_ENTROPY_BATCH_SIZE]
+                remote = post('/merkle/hashes', {'ranges': ranges, 'level': level,
+                                                 'nodes': chunk})['hashes']
+                with lock:
+                    local = [merkle.node_hash(level, index, coverage) for index in chunk]
+                differing.extend(index for index, mine, theirs in zip(chunk, local, remote)
+                                 if mine != theirs)
+            session['nodes_compared'] += len(nodes)
+            if level == merkle.depth or not differing:
+                break
+            nodes = [child for index in differing for child in merkle.children(index)]
+        leaves = differing if level == merkle.depth else []
+        session['leaves_differing'] = len(leaves)
+        
+        # Compare versions under those leaves and exchange what differs
+        push, pull = [], []
+        for i in range(0, len(leaves), ANTI_ENTROPY_BATCH_SIZE):
+            chunk = leaves[i:i + ANTI_ENTROPY_BATCH_SIZE]
+            remote = post('/merkle/versions', {'ranges': ranges, 'leaves': chunk})['versions']
+            with lock:
+                local = {key: versions[key] for key in merkle.leaf_keys(chunk, coverage)}
+                for key, version in local.items():
+                    if is_newer(version, remote.get(key)):
+                        push.append({'key': key, 'value': storage[key], 'version': version})
+            pull.extend(key for key, version in remote.items()
+                        if is_newer(version, local.get(key)))
+        
+        for i in range(0, len(push), TRANSFER_BATCH_SIZE):
+            session['keys_pushed'] += post('/replicate_batch',
+                                           {'items': push[i:i + TRANSFER_BATCH_SIZE]})['applied']
+        for i in range(0, len(pull), TRANSFER_BATCH_SIZE):
+            items = post('/merkle/items', {'keys': pull[i:i + TRANSFER_BATCH_SIZE]})['items']
+            if items:
+                clock.observe(max(item['version'] for item in items))
+            with lock:
+                session['keys_pulled'] += sum(store(item['key'], item['value'], item['version'])
+                                              for item in items)
+        
+        session['duration_ms'] = round((time.time() - started) * 1000, 1)
+    
+    with stats_lock:
+        anti_entropy_stats['sessions'] += 1
+        anti_entropy_stats['keys_pushed'] += session['keys_pushed']
+        anti_entropy_stats['keys_pulled'] += session['keys_pulled']
+        anti_entropy_stats['last'] = session
+    if session['keys_pushed'] or session['keys_pulled']:
+        print(f"✓ ANTI-ENTROPY with {peer_id}: pushed {session['keys_pushed']}, "
+              f"pulled {session['keys_pulled']} ({session['leaves_differing']} leaves differed)")
+    return session
+
+
+def run_anti_entropy():
+    """Background thread reconciling with one replica peer every ANTI_ENTROPY_INTERVAL"""
+    print(f"✓ Anti-entropy started")
+    peers = []
+    while True:
+        time.sleep(ANTI_ENTROPY_INTERVAL)
+        try:
+            if not peers:
+                ring = router.ring
+                peers = sorted(ring.workers - {worker_id}) if ring is not None else []
+                random.shuffle(peers)
+            if peers:
+                anti_entropy_session(peers.pop())
+        except Exception as e:
+            print(f"✗ Anti-entropy error: {str(e)}")
 
 
 def send_heartbeat():
-    """Send periodic heartbeat to controller"""
+    """
+    Send periodic heartbeat to controller. With gossip membership peers
+    detect failures, so this only reports load, every GOSSIP_REPORT_INTERVAL
+    """
+    interval = HEARTBEAT_INTERVAL if membership is None else GOSSIP_REPORT_INTERVAL
+    last_sent = time.time()
     while True:
         try:
-            time.sleep(HEARTBEAT_INTERVAL)
-            response = requests.post(
-                f"http://{CONTROLLER_HOST}:{CONTROLLER_PORT}/heartbeat",
-                json={'worker_id': worker_id},
-                timeout=2
-            )
+            time.sleep(interval)
+            now = time.time()
+            elapsed = max(now - last_sent, 1e-3)
+            last_sent = now
+            with lock:
+                payload = {'worker_id': worker_id, 'partition_counts': list(partition_counts)}
+            payload['load'] = collect_load_stats(elapsed)
+            if PARTITION_METHOD == 'range' and router.ring is not None:
+                payload['range_stats'] = collect_range_stats(elapsed)
+            response = post_to_controller(CONTROLLER_HEARTBEAT_ENDPOINT, payload, timeout=2)
             if response.status_code == 200:
                 print(f"💓 Heartbeat sent")
+                router.observe_version(response.json().get('ring_version'))
+                if response.json().get('rejoined'):
+                    # We were marked failed: the controller catches us up (POST /catch_up)
+                    print(f"⚠ Marked failed while away; rejoining the ring once caught up")
+            elif response.status_code == 404:
+                # The controller doesn't know us (e.g. restarted without our registration)
+                print(f"⚠ Controller does not know this worker; re-registering")
+                register_with_controller()
             else:
                 print(f"⚠ Heartbeat failed: {response.status_code}")
         except Exception as e:
             print(f"✗ Heartbeat error: {str(e)}")
 
 
+def run_gossip():
+    """Background thread running one SWIM protocol period per GOSSIP_INTERVAL"""
+    print(f"✓ Gossip membership started")
+    while True:
+        started = time.time()
+        try:
+            # Peers spread ring versions too, so ring changes arrive between load reports
+            router.observe_version(membership.seen_ring_version)
+            membership.ring_version = router.version
+            membership.add_peers(router.worker_urls)
+            membership.probe()
+            pending_failures.update(membership.expire_suspects())
+            for dead_id, incarnation in list(pending_failures.items()):
+                if report_failure(dead_id, incarnation):
+                    del pending_failures[dead_id]
+        except Exception as e:
+            print(f"✗ Gossip error: {str(e)}")
+        time.sleep(max(GOSSIP_INTERVAL - (time.time() - started), 0))
+
+
+def report_failure(dead_id, incarnation):
+    """
+    Tell the controller about a worker gossip declared dead. Returns False
+    if the report should be retried next period.
+    """
+    print(f"⚠ Worker {dead_id} declared dead; reporting to controller")
+    try:
+        response = post_to_controller(CONTROLLER_MEMBERSHIP_ENDPOINT, {
+            'reporter': worker_id,
+            'worker_id': dead_id,
+            'status': 'failed',
+            'incarnation': incarnation
+        }, timeout=5)
+        if response.status_code not in (200, 404):
+            print(f"⚠ Failure report rejected: {response.status_code}")
+        return response.status_code in (200, 404)
+    except Exception as e:
+        print(f"✗ Failure report error: {str(e)}")
+        return False
+
+
+def post_to_controller(path, payload, timeout):
+    """
+    POST to the primary controller. Moves on to the next controller in
+    CONTROLLER_URLS when one is unreachable, answers as a standby, or is
+    in a lower failover term than one already seen (it was deposed), and
+    keeps using whichever accepted the request.
+    """
+    response = None
+    for attempt in range(len(controller_urls)):
+        try:
+            response = requests.post(f"{controller_urls[0]}{path}", json=payload,
+                                     headers={CONTROLLER_TERM_HEADER: str(router.term)},
+                                     timeout=timeout)
+            if response.status_code != 503 and router.observe_term(controller_term(response)):
+                return response
+        except requests.RequestException:
+            if attempt == len(controller_urls) - 1:
+                raise
+        controller_urls.append(controller_urls.pop(0))
+    return response
+
+
 def register_with_controller():
     """Register this worker with the controller"""
     try:
-        response = requests.post(
-            f"http://{CONTROLLER_HOST}:{CONTROLLER_PORT}/register",
-            json={
-                'worker_id': worker_id,
-                'host': 'localhost',
-                'port': worker_port
-            },
-            timeout=5
-        )
+        response = post_to_controller(CONTROLLER_REGISTER_ENDPOINT, {
+            'worker_id': worker_id,
+            'host': 'localhost',
+            'port': worker_port,
+            'weight': worker_weight
+        }, timeout=5)
         
         if response.status_code == 201:
             print(f"✓ Registered with controller")
+            router.observe_version(response.json().get('ring_version'))
             return True
         else:
             print(f"✗ Registration failed: {response.status_code}")
@@ -259,21 +1217,60 @@ def register_with_controller():
         return False
 
 
-def start_worker(w_id, port):
+def start_worker(w_id, port, weight=1.0):
     """Start the worker server"""
-    global worker_id, worker_port
+    global worker_id, worker_port, worker_weight, membership, replicator, hints, clock
     worker_id = w_id
     worker_port = port
+    worker_weight = weight
+    clock = HybridLogicalClock(worker_id, HLC_MAX_DRIFT_MS)
     
     print("=" * 60)
     print(f"🚀 Starting Worker: {worker_id}")
     print("=" * 60)
     print(f"Worker URL: http://localhost:{worker_port}")
-    print(f"Controller: http://{CONTROLLER_HOST}:{CONTROLLER_PORT}")
+    print(f"Capacity weight: {worker_weight}")
+    print(f"Controllers: {', '.join(CONTROLLER_URLS)}")
+    print(f"Membership: {MEMBERSHIP}")
     print("=" * 60)
     
+    # Resume replication and hints left queued by a previous run
+    backlog_path = hints_path = None
+    if REPLICATION_BACKLOG_DIR:
+        backlog_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   REPLICATION_BACKLOG_DIR)
+        os.makedirs(backlog_dir, exist_ok=True)
+        backlog_path = os.path.join(backlog_dir, f"{worker_id}.replication.log")
+        hints_path = os.path.join(backlog_dir, f"{worker_id}.hints.log")
+    replicator = Replicator(backlog_path, REPLICATION_BATCH_MAX, REPLICATION_BATCH_MAX_BYTES,
+                            REPLICATION_LINGER, REPLICATION_RETRY_BASE, REPLICATION_RETRY_MAX,
+                            REPLICATION_SEND_TIMEOUT, is_peer=in_ring, origin_id=worker_id,
+                            log_size=REPLICATION_LOG_SIZE)
+    replayed = replicator.load()
+    if replayed:
+        print(f"✓ Resuming {replayed} queued replica writes")
+    hints = Replicator(hints_path, REPLICATION_BATCH_MAX, REPLICATION_BATCH_MAX_BYTES,
+                       REPLICATION_LINGER, REPLICATION_RETRY_BASE, REPLICATION_RETRY_MAX,
+                       REPLICATION_SEND_TIMEOUT, is_peer=in_ring, hold=True,
+                       max_age=HINTED_HANDOFF_TTL, fsync=True)
+    replayed = hints.load()
+    if replayed:
+        print(f"✓ Resuming {replayed} hinted writes")
+    
     # Register with controller
     if register_with_controller():
+        if MEMBERSHIP == 'gossip':
+            membership = SwimMembership(worker_id, f"http://localhost:{worker_port}",
+                                        GOSSIP_PING_TIMEOUT, GOSSIP_INDIRECT_PROBES,
+                                        GOSSIP_SUSPECT_TIMEOUT, GOSSIP_PIGGYBACK,
+                                        GOSSIP_RETRANSMIT_MULT)
+            gossip_thread = threading.Thread(target=run_gossip, daemon=True)
+            gossip_thread.start()
+        
+        if ANTI_ENTROPY_INTERVAL and PARTITION_METHOD == 'hash':
+            anti_entropy_thread = threading.Thread(target=run_anti_entropy, daemon=True)
+            anti_entropy_thread.start()
+        
         # Start heartbeat thread
         heartbeat_thread = threading.Thread(target=send_heartbeat, daemon=True)
         heartbeat_thread.start()
@@ -286,11 +1283,12 @@ def start_worker(w_id, port):
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print("Usage: python worker.py <worker_id> <port>")
-        print("Example: python worker.py worker_1 6000")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python worker.py <worker_id> <port> [weight]")
+        print("Example: python worker.py worker_1 6000 2.0")
         sys.exit(1)
     
     w_id = sys.argv[1]
     port = int(sys.argv[2])
-    start_worker(w_id, port)
\ No newline at end of file
+    weight = float(sys.argv[3]) if len(sys.argv) == 4 else 1.0
+    start_worker(w_id, port, weight)
\ No newline at end of file